@@ -76,24 +76,22 @@ import whisper
 # Load the small English language model
 model = whisper.load_model("small.en")
 
-# NLTK helps to split the transcription sentence by sentence
+# sentutils splits the transcription sentence by sentence using Whisper's own segments
 # and shows it in a neat manner one below another. You will see it in the output below.
-
-import nltk
-nltk.download('punkt')
-from nltk import sent_tokenize
+# sentutils.py ships next to this notebook, nothing is downloaded (in Colab, upload it to the working directory)
+from sentutils import iter_sentences
 
 # Transcribe the mono audio file
 result = model.transcribe(mono_file)
 print("Transcription of mono_file:")
-for sent in sent_tokenize(result['text']):
-  print(sent)
+for sent in iter_sentences(result['segments']):
+  print(sent.text)
 
 # Transcribe the stereo audio file
 result = model.transcribe(stereo_file)
 print("Transcription of stereo_file:")
-for sent in sent_tokenize(result['text']):
-  print(sent)
+for sent in iter_sentences(result['segments']):
+  print(sent.text)
 
 """# **The following blocks are examples from Chapter 1 that showcase other functionalities of Whisper**"""
 
@@ -0,0 +1,182 @@
+from collections import namedtuple
+import re
+
+
+Sentence = namedtuple('Sentence', ['text', 'start', 'end'])
+
+# Characters that can end a sentence, including the CJK full-width forms Whisper emits
+SENTENCE_TERMINATORS = '.!?…。！？'
+# Full-width terminators end a sentence without a space after them, as CJK text has none
+FULL_WIDTH_TERMINATORS = '。！？'
+# Closing quotes and brackets that may follow a terminator and still belong to the sentence
+SENTENCE_CLOSERS = '"\'”’)]»」』'
+
+# Abbreviations that end with a period but never end a sentence
+ABBREVIATIONS = {
+    'mr', 'mrs', 'ms', 'dr', 'prof', 'mt', 'vs', 'e.g', 'i.e', 'approx', 'dept',
+    'sra', 'srta', 'ud', 'uds', 'mme', 'mlle',
+}
+# Capitalized titles that are only abbreviations in front of a name: "St. Louis", "Gen. Patton"
+NAME_TITLES = {'St', 'Gen', 'Gov', 'Sen', 'Rep', 'Sr', 'Av'}
+# Ordinary sentence-final words as well ("The answer is no."), only abbreviations when
+# a number or a lowercase word follows: "No. 5", "fig. 3", "pears, etc. and apples"
+CONTEXT_ABBREVIATIONS = {'no', 'vol', 'fig', 'etc', 'inc', 'ltd', 'co', 'corp', 'jr'}
+
+_boundary_pattern = re.compile(
+    f"[{re.escape(SENTENCE_TERMINATORS)}]+[{re.escape(SENTENCE_CLOSERS)}]*(?=\\s|$)"
+    f"|[{re.escape(FULL_WIDTH_TERMINATORS)}]+[{re.escape(SENTENCE_CLOSERS)}]*"
+)
+_word_gap_pattern = re.compile('[\\s"\'“‘(¿¡\\[]*')
+# Letters joined by periods, the last period being the terminator: "U.S", "a.m", "e.g"
+_initialism_pattern = re.compile(r'(?:[^\W\d_]\.)+[^\W\d_]')
+
+
+def _segment_fields(segment):
+    """
+    Extract text, start and end from a Whisper segment.
+
+    Accepts the dictionaries found in `model.transcribe(...)["segments"]`, the
+    `Segment` tuples yielded by faster-whisper, or plain strings (no timestamps).
+    """
+    if isinstance(segment, str):
+        return segment, None, None
+    if isinstance(segment, dict):
+        return segment["text"], segment.get("start"), segment.get("end")
+    return segment.text, segment.start, segment.end
+
+
+def _next_char(text, position):
+    """
+    First character of the next word after `position`, skipping opening quotes, or None at the end of `text`.
+    """
+    match = _word_gap_pattern.match(text, position)
+    return text[match.end()] if match.end() < len(text) else None
+
+
+def _is_abbreviation(text, terminator_idx, boundary_end):
+    """
+    Check whether the period at `terminator_idx` belongs to an abbreviation or an initial.
+
+    Returns:
+      True or False, or None when that depends on the next word, which is not in `text` yet.
+    """
+    if text[terminator_idx] != '.':
+        return False
+    word_start = max(text.rfind(' ', 0, terminator_idx), text.rfind('\n', 0, terminator_idx)) + 1
+    word = text[word_start:terminator_idx].lstrip('"\'“‘(¿¡[')
+    if len(word) == 1 and word.isalpha():
+        # A single letter followed by a period is almost always an initial: "J. R. Batista"
+        return True
+    if _initialism_pattern.fullmatch(word):
+        return True
+    if word.lower() in ABBREVIATIONS:
+        return True
+    if word not in NAME_TITLES and word.lower() not in CONTEXT_ABBREVIATIONS:
+        return False
+    next_char = _next_char(text, boundary_end)
+    if next_char is None:
+        return None
+    if word in NAME_TITLES:
+        return next_char.isupper()
+    return next_char.isdigit() or next_char.islower()
+
+
+class SentenceSegmenter:
+    """
+    Incremental sentence splitter driven by Whisper segment boundaries.
+
+    Text is fed one segment at a time and complete sentences are returned as soon
+    as their closing punctuation arrives. Only the unfinished tail of the current
+    sentence is kept, so the transcript is never re-tokenized as a whole and no
+    tokenizer model has to be downloaded.
+    """
+
+    def __init__(self):
+        self._pending = ''
+        self._start = None
+        self._end = None
+        # Position in `_pending` of a boundary that waits for the next word, see `_is_abbreviation`
+        self._undecided = None
+
+    def feed(self, segment):
+        """
+        Add one segment and return the sentences it completes.
+
+        Parameters:
+          segment: Whisper segment dictionary, faster-whisper `Segment` or string.
+        Returns:
+          sentences: list of `Sentence(text, start, end)` completed by this segment.
+        """
+        text, seg_start, seg_end = _segment_fields(segment)
+        if not text or not text.strip():
+            return []
+        if not self._pending.strip():
+            self._pending = ''
+            self._start = seg_start
+        previous_length, previous_end = len(self._pending), self._end
+        scan_from = previous_length if self._undecided is None else self._undecided
+        self._undecided = None
+        self._pending += text
+        self._end = seg_end
+
+        sentences = []
+        sentence_start = 0
+        for match in _boundary_pattern.finditer(self._pending, scan_from):
+            abbreviation = _is_abbreviation(self._pending, match.start(), match.end())
+            if abbreviation is None:
+                self._undecided = match.start() - sentence_start
+                break
+            if abbreviation:
+                continue
+            sentence = self._pending[sentence_start:match.end()].strip()
+            if sentence:
+                # A boundary that waited for this segment closed a sentence of the previous one
+                end = previous_end if match.end() <= previous_length else seg_end
+                sentences.append(Sentence(sentence, self._start, end))
+                # Any text after the boundary started inside this segment
+                self._start = seg_start
+            sentence_start = match.end()
+        self._pending = self._pending[sentence_start:]
+        return sentences
+
+    def flush(self):
+        """
+        Return the trailing text that never received closing punctuation.
+
+        Returns:
+          sentences: empty list, or a one-element list with the remaining `Sentence`.
+        """
+        sentence = self._pending.strip()
+        self._pending = ''
+        self._undecided = None
+        if not sentence:
+            return []
+        return [Sentence(sentence, self._start, self._end)]
+
+
+def iter_sentences(segments):
+    """
+    Yield sentences from Whisper segments as they arrive.
+
+    Works with a finished `result["segments"]` list as well as the lazy segment
+    generator returned by faster-whisper, in which case sentences are printed
+    while decoding is still running.
+
+    Parameters:
+      segments: iterable of Whisper segments, or a single transcript string.
+    Returns:
+      generator of `Sentence(text, start, end)`; timestamps are None for plain text.
+    """
+    if isinstance(segments, str):
+        segments = [segments]
+    segmenter = SentenceSegmenter()
+    for segment in segments:
+        yield from segmenter.feed(segment)
+    yield from segmenter.flush()
+
+
+def split_sentences(text):
+    """
+    Split a plain transcript string into a list of sentence strings.
+    """
+    return [sentence.text for sentence in iter_sentences(text)]
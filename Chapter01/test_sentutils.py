@@ -0,0 +1,76 @@
+from collections import namedtuple
+
+import pytest
+
+from sentutils import Sentence, SentenceSegmenter, iter_sentences, split_sentences
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Hello there. How are you? Fine!", ["Hello there.", "How are you?", "Fine!"]),
+    ("I am a U.S. citizen.", ["I am a U.S. citizen."]),
+    ("Meet me at 9 a.m. tomorrow. Bring Dr. Smith.", ["Meet me at 9 a.m. tomorrow.", "Bring Dr. Smith."]),
+    ("Ask J. R. Batista, e.g. by mail. He knows.", ["Ask J. R. Batista, e.g. by mail.", "He knows."]),
+    ("It costs 3.5 dollars. Ok.", ["It costs 3.5 dollars.", "Ok."]),
+    ('He said "Stop." Then he left.', ['He said "Stop."', "Then he left."]),
+    ("No trailing punctuation", ["No trailing punctuation"]),
+])
+def test_split_sentences(text, expected):
+    assert split_sentences(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    # Name titles are abbreviations in front of a name only
+    ("He lives in St. Louis. It is nice.", ["He lives in St. Louis.", "It is nice."]),
+    ("Ask Gen. Patton.", ["Ask Gen. Patton."]),
+    # Ordinary words are abbreviations only before a number or a lowercase word
+    ("The answer is no. We went home.", ["The answer is no.", "We went home."]),
+    ("Room No. 5 is free. See fig. 3 for details.", ["Room No. 5 is free.", "See fig. 3 for details."]),
+    ("Apples, pears, etc. and more. Done.", ["Apples, pears, etc. and more.", "Done."]),
+    ("We bought it from Acme Co. It broke.", ["We bought it from Acme Co.", "It broke."]),
+])
+def test_context_dependent_abbreviations(text, expected):
+    assert split_sentences(text) == expected
+
+
+def test_full_width_terminators_need_no_space():
+    assert split_sentences("你好。我很好！你呢？") == ["你好。", "我很好！", "你呢？"]
+
+
+def test_sentences_keep_segment_timestamps():
+    segments = [
+        {"text": " Hello there. How", "start": 0.0, "end": 2.0},
+        {"text": " are you? I am", "start": 2.0, "end": 4.0},
+        {"text": " fine", "start": 4.0, "end": 5.0},
+    ]
+    assert list(iter_sentences(segments)) == [
+        Sentence("Hello there.", 0.0, 2.0),
+        Sentence("How are you?", 0.0, 4.0),
+        Sentence("I am fine", 2.0, 5.0),
+    ]
+
+
+def test_boundary_waits_for_the_next_segment():
+    segmenter = SentenceSegmenter()
+    # "no." may be "No. 5" or the end of a sentence, so nothing is returned yet
+    assert segmenter.feed({"text": " The answer is no.", "start": 0.0, "end": 1.0}) == []
+    assert segmenter.feed({"text": " We went home.", "start": 1.0, "end": 2.0}) == [
+        Sentence("The answer is no.", 0.0, 1.0),
+        Sentence("We went home.", 1.0, 2.0),
+    ]
+
+    segmenter = SentenceSegmenter()
+    assert segmenter.feed({"text": " I met Dr.", "start": 0.0, "end": 1.0}) == []
+    assert segmenter.feed({"text": " Smith.", "start": 1.0, "end": 2.0}) == [Sentence("I met Dr. Smith.", 0.0, 2.0)]
+
+
+def test_undecided_boundary_is_flushed():
+    segmenter = SentenceSegmenter()
+    assert segmenter.feed("The answer is no.") == []
+    assert segmenter.flush() == [Sentence("The answer is no.", None, None)]
+    assert segmenter.flush() == []
+
+
+def test_accepts_faster_whisper_segments():
+    Segment = namedtuple("Segment", ["text", "start", "end"])
+    segments = (Segment(text, i, i + 1.0) for i, text in enumerate([" One.", " Two."]))
+    assert list(iter_sentences(segments)) == [Sentence("One.", 0, 1.0), Sentence("Two.", 1, 2.0)]
@@ -42,9 +42,12 @@ import matplotlib.pyplot as plt
 import numpy as np
 import wave
 import librosa
-import nltk
-nltk.download('punkt')
-from nltk import sent_tokenize
+# sentutils.py ships in this repository's Chapter01 folder and is imported from there, nothing is
+# downloaded (in Colab, upload it to the working directory)
+import os
+import sys
+sys.path.append(os.path.join(os.pardir, "Chapter01"))
+from sentutils import iter_sentences
 
 """# Loading sample audio files"""
 
@@ -100,14 +103,14 @@ model = whisper.load_model("small")
 # Transcribe the mono audio file
 result = model.transcribe(mono_file)
 print("Transcription of mono_file:")
-for sent in sent_tokenize(result['text']):
-  print(sent)
+for sent in iter_sentences(result['segments']):
+  print(sent.text)
 
 # Transcribe the stereo audio file
 result = model.transcribe(stereo_file)
 print("Transcription of stereo_file:")
-for sent in sent_tokenize(result['text']):
-  print(sent)
+for sent in iter_sentences(result['segments']):
+  print(sent.text)
 
 """## Audio sampling
 
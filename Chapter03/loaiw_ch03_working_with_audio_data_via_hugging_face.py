@@ -304,12 +304,15 @@ Audio(data=wav_array, rate=sampling_rate)
 
 In this example, audio data is converted to float32 before passing it to the model.transcribe() function. Here's how you can do it:"""
 
-# NLTK helps to split the transcription sentence by sentence
+# sentutils splits the transcription sentence by sentence using Whisper's own segments
 # and shows it in a neat manner one below another. You will see it in the output below.
 
-import nltk
-nltk.download('punkt')
-from nltk import sent_tokenize
+# sentutils.py ships in this repository's Chapter01 folder and is imported from there, nothing is
+# downloaded (in Colab, upload it to the working directory)
+import os
+import sys
+sys.path.append(os.path.join(os.pardir, "Chapter01"))
+from sentutils import iter_sentences
 
 import whisper
 import numpy as np
@@ -327,8 +330,8 @@ result = model.transcribe(audio=wav_array)
 
 # Display the transcription
 print("Transcription:")
-for sent in sent_tokenize(result['text']):
-  print(sent)
+for sent in iter_sentences(result['segments']):
+  print(sent.text)
 
 """### Step 3b: Transcribe Audio to Text using WAV file
 
@@ -345,8 +348,8 @@ result = model.transcribe('temp_audio.wav')
 
 # Print the transcription
 print("Transcription:")
-for sent in sent_tokenize(result['text']):
-  print(sent)
+for sent in iter_sentences(result['segments']):
+  print(sent.text)
 
 """# Gratitude
 
@@ -401,16 +401,21 @@ trainer.train()
 
 Having fine-tuned our model, we're now ready to demonstrate its ASR prowess through a demo. We'll employ the 🤗 Transformers `pipeline` function, which seamlessly manages the entire ASR process, from preprocessing the audio inputs to decoding the model's predictions.
 
-Executing the code below will create a Gradio demo. This demo allows us to capture speech using our computer's microphone and submit it to our fine-tuned Whisper model for text transcription:
+Executing the code below will create a Gradio demo. This demo allows us to capture speech using our computer's microphone and submit it to our fine-tuned Whisper model for text transcription.
+
+To make the demo snappier on modest hardware, we load the pipeline with `load_transcriber` from the Chapter 7 `speculative.py` helper module. It pairs our fine-tuned model with `openai/whisper-tiny` as a *draft* model: the draft proposes several tokens at a time and our model verifies them in a single forward pass. Because both models share the same multilingual tokenizer, the greedy transcription is identical to using our model alone, only faster. Set `draft_model` to `None` to disable it:
 """
 
 !pip install git+https://github.com/huggingface/transformers
 !pip install gradio
 
-from transformers import pipeline
+!wget -nv https://github.com/PacktPublishing/Learn-OpenAI-Whisper/raw/main/Chapter07/speculative.py -O speculative.py
+
+from speculative import load_transcriber
 import gradio as gr
 
-pipe = pipeline(model="jbatista79/20240410-small-hindi")  # change to "your-username/the-name-you-picked"
+draft_model = "openai/whisper-tiny"
+pipe = load_transcriber("jbatista79/20240410-small-hindi", draft_model_id=draft_model)  # change to "your-username/the-name-you-picked"
 
 def transcribe(audio):
     text = pipe(audio)["text"]
@@ -21,7 +21,7 @@ Here's a high-level summary of its contents, along with suggested titles for cod
 2. **Downloading audio files**
 3. **Verifying of compute resources**
 4. **Loading the Whisper model**
-5. **Setting the Natural Language Toolkit (NLTK) library**
+5. **Setting up sentence segmentation**
 6. **Transcribing and language detection**
 7. **Defining a transcription function**
 8. **Transcribing non-English audio with optional translation**
@@ -80,15 +80,18 @@ print(
     f"and has {sum(np.prod(p.shape) for p in model.parameters()):,} parameters."
 )
 
-"""5. **Setting the Natural Language Toolkit (NLTK) library**
+"""5. **Setting up sentence segmentation**
 
-    Before processing transcriptions, this part includes setup steps for NLTK, a toolkit in Python for working with human language data. It's used here to enhance the readability of transcriptions by sentence segmentation.
+    Before processing transcriptions, this part imports `sentutils`, a small helper module that ships in the repository's `Chapter01` folder, so nothing is downloaded. It enhances the readability of transcriptions by splitting them sentence by sentence, using the segments Whisper already produces instead of re-tokenizing the whole transcript.
 
 """
 
-import nltk
-nltk.download('punkt')
-from nltk import sent_tokenize
+# sentutils.py ships in this repository's Chapter01 folder and is imported from there, nothing is
+# downloaded (in Colab, upload it to the working directory)
+import os
+import sys
+sys.path.append(os.path.join(os.pardir, "Chapter01"))
+from sentutils import iter_sentences, split_sentences
 
 """6. **Transcribing and language detection**
 
@@ -116,7 +119,7 @@ for audiofile in audiofiles:
     # Decode the audio and print the recognized text
     result = whisper.decode(model, mel, options)
     print("Transcription of file '" + audiofile + "':")
-    for sent in sent_tokenize(result.text):
+    for sent in split_sentences(result.text):
         print(sent)
 
 """7. **Defining a transcription function**
@@ -129,10 +132,10 @@ def process_file(audiofile, model, w_options, w_translate=False):
     audio = whisper.load_audio(audiofile)
     transcribe_options = dict(task="transcribe", **w_options)
     translate_options = dict(task="translate", **w_options)
-    transcription = model.transcribe(audiofile, **transcribe_options)["text"]
+    transcription = model.transcribe(audiofile, **transcribe_options)["segments"]
     # Evaluates whether a translation is requested
     if w_translate:
-        translation = model.transcribe(audiofile, **translate_options)["text"]
+        translation = model.transcribe(audiofile, **translate_options)["segments"]
     else:
         translation = "N/A"
 
@@ -150,11 +153,11 @@ audiofile = 'Learn_OAI_Whisper_Spanish_Sample_Audio01.mp3'
 transcription, translation = process_file(audiofile, model, w_options, True)
 
 print("------\nTranscription of file '" + audiofile + "':")
-for sent in sent_tokenize(transcription):
-    print(sent)
+for sent in iter_sentences(transcription):
+    print(sent.text)
 print("------\nTranslation of file '" + audiofile + "':")
-for sent in sent_tokenize(translation):
-    print(sent)
+for sent in iter_sentences(translation):
+    print(sent.text)
 
 import ipywidgets as widgets
 widgets.Audio.from_file(audiofile, autoplay=False, loop=False)
@@ -173,8 +176,8 @@ audiofile = 'product_names.wav'
 transcription, translation = process_file(audiofile, model, w_options)
 
 print("------\nTranscription of file '" + audiofile + "':")
-for sent in sent_tokenize(transcription):
-    print(sent)
+for sent in iter_sentences(transcription):
+    print(sent.text)
 
 import ipywidgets as widgets
 widgets.Audio.from_file(audiofile, autoplay=False, loop=False)
@@ -186,8 +189,8 @@ audiofile = 'product_names.wav'
 transcription, translation = process_file(audiofile, model, w_options)
 
 print("------\nTranscription of file '" + audiofile + "':")
-for sent in sent_tokenize(transcription):
-  print(sent)
+for sent in iter_sentences(transcription):
+  print(sent.text)
 
 """**9.2 Prompting for transcript generation**
 
@@ -199,8 +202,8 @@ audiofile = 'bbq_plans.wav'
 transcription, translation = process_file(audiofile, model, w_options)
 
 print("------\nTranscription of file '" + audiofile + "':")
-for sent in sent_tokenize(transcription):
-    print(sent)
+for sent in iter_sentences(transcription):
+    print(sent.text)
 
 import ipywidgets as widgets
 widgets.Audio.from_file(audiofile, autoplay=False, loop=False)
@@ -212,8 +215,8 @@ audiofile = 'bbq_plans.wav'
 transcription, translation = process_file(audiofile, model, w_options)
 
 print("------\nTranscription of file '" + audiofile + "':")
-for sent in sent_tokenize(transcription):
-    print(sent)
+for sent in iter_sentences(transcription):
+    print(sent.text)
 
 """Now, let's apply "prompting for transcript generation" convert instructions into fictitious transcripts for Whisper to emulate. Using that technique to other words with tricky spellings, we ensure our transcript is as accurate as possible in every detail."""
 
@@ -222,8 +225,8 @@ audiofile = 'bbq_plans.wav'
 transcription, translation = process_file(audiofile, model, w_options)
 
 print("------\nTranscription of file '" + audiofile + "':")
-for sent in sent_tokenize(transcription):
-    print(sent)
+for sent in iter_sentences(transcription):
+    print(sent.text)
 
 """# Gratitude
 
@@ -128,9 +128,12 @@ USER: <image>\n<prompt>\nASSISTANT:
 ```
 """
 
-import nltk
-nltk.download('punkt')
-from nltk import sent_tokenize
+# sentutils.py ships in this repository's Chapter01 folder and is imported from there, nothing is
+# downloaded (in Colab, upload it to the working directory)
+import os
+import sys
+sys.path.append(os.path.join(os.pardir, "Chapter01"))
+from sentutils import split_sentences
 
 max_new_tokens = 200
 
@@ -143,7 +146,7 @@ prompt = "USER: <image>\n" + prompt_instructions + "\nASSISTANT:"
 outputs = pipe(image, prompt=prompt, generate_kwargs={"max_new_tokens": 200})
 # outputs
 # print(outputs[0]["generated_text"])
-for sent in sent_tokenize(outputs[0]["generated_text"]):
+for sent in split_sentences(outputs[0]["generated_text"]):
     print(sent)
 
 """6. **Processing speech-to-text**
@@ -201,7 +204,7 @@ if match:
 else:
     print("No match found.")
 
-for sent in sent_tokenize(outputs[0]["generated_text"]):
+for sent in split_sentences(outputs[0]["generated_text"]):
     print(sent)
 
 """7. **Defining supporting functions**
@@ -63,12 +63,15 @@ _, probs = model.detect_language(mel)
 audio_lang = max(probs, key=probs.get)
 print(f"Detected language: {audio_lang}")
 
-# NLTK helps to split the transcription sentence by sentence
+# sentutils splits the transcription sentence by sentence
 # and shows it in a neat manner one below another. You will see it in the output below.
 
-import nltk
-nltk.download('punkt')
-from nltk import sent_tokenize
+# sentutils.py ships in this repository's Chapter01 folder and is imported from there, nothing is
+# downloaded (in Colab, upload it to the working directory)
+import os
+import sys
+sys.path.append(os.path.join(os.pardir, "Chapter01"))
+from sentutils import split_sentences
 
 # decode the audio
 options = whisper.DecodingOptions(fp16=torch.cuda.is_available(), language=audio_lang, task='transcribe')
@@ -76,7 +79,7 @@ result = whisper.decode(model, mel, options)
 
 # print the recognized text
 print("----\nTranscription from audio:")
-for sent in sent_tokenize(result.text):
+for sent in split_sentences(result.text):
   print(sent)
 
 # decode the audio
@@ -85,5 +88,5 @@ result = whisper.decode(model, mel, options)
 
 # print the recognized text
 print("----\nTranslation from audio:")
-for sent in sent_tokenize(result.text):
+for sent in split_sentences(result.text):
   print(sent)
\ No newline at end of file
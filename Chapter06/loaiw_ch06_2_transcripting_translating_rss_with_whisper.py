@@ -173,10 +173,13 @@ widgets.Audio.from_file(audio_file, autoplay=False, loop=False)
 
 import whisper
 import torch
-# NLTK helps to split the transcription sentence by sentence
-import nltk
-nltk.download('punkt')
-from nltk import sent_tokenize
+# sentutils splits the transcription sentence by sentence
+# sentutils.py ships in this repository's Chapter01 folder and is imported from there, nothing is
+# downloaded (in Colab, upload it to the working directory)
+import os
+import sys
+sys.path.append(os.path.join(os.pardir, "Chapter01"))
+from sentutils import split_sentences
 
 model = whisper.load_model("small")
 
@@ -197,7 +200,7 @@ result = whisper.decode(model, mel, options)
 
 # print the recognized text
 print("----\nTranscription from audio:")
-for sent in sent_tokenize(result.text):
+for sent in split_sentences(result.text):
   print(sent)
 
 # decode the audio
@@ -206,5 +209,5 @@ result = whisper.decode(model, mel, options)
 
 # print the recognized text
 print("----\nTranslation from audio:")
-for sent in sent_tokenize(result.text):
+for sent in split_sentences(result.text):
   print(sent)
\ No newline at end of file
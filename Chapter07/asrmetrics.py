@@ -0,0 +1,303 @@
+"""
+Latency and real-time factor telemetry for the streaming ASR demo.
+
+`StreamingTelemetry` wraps a `LocalAgreementStreamer` and records, for every
+chunk, the queueing delay before processing starts, the time spent inside the
+model, the latency until the partial result is available and the rolling
+real-time factor (processing time divided by audio duration). The
+numbers are kept as histograms that can be exported in the Prometheus text
+format or as JSON. Both delays are measured from `arrived_at`, the moment the
+chunk reached the server, so they are server-side: capturing the audio, the
+network and any queueing in front of the caller are not included. A server keeps one `StreamingTelemetry` per session, labelled
+with the session id, and exports all of them with `combined_prometheus`.
+
+The command line replays a WAV file as a simulated live microphone stream:
+  python asrmetrics.py speech.wav --model openai/whisper-base.en --format prometheus
+"""
+import argparse
+import bisect
+import json
+import time
+import wave
+from collections import deque
+
+import numpy as np
+
+from streamutils import EnergyEndpointer, LocalAgreementStreamer
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RTF_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 5.0)
+
+
+def format_labels(labels: dict, **extra):
+    """
+    Prometheus label set such as `{session="a1",le="0.5"}`, or an empty string without labels.
+    """
+    labels = {**labels, **extra}
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with the same semantics as a Prometheus histogram.
+    """
+
+    def __init__(self, name: str, description: str, buckets=LATENCY_BUCKETS, labels: dict = None):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self.labels = dict(labels or {})
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        total, cumulative = 0, []
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+        return cumulative
+
+    def header(self):
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+
+    def samples(self):
+        bounds = [repr(float(b)) for b in self.buckets] + ["+Inf"]
+        lines = [
+            f"{self.name}_bucket{format_labels(self.labels, le=bound)} {count}"
+            for bound, count in zip(bounds, self.cumulative_counts())
+        ]
+        lines.append(f"{self.name}_sum{format_labels(self.labels)} {self.sum}")
+        lines.append(f"{self.name}_count{format_labels(self.labels)} {self.count}")
+        return lines
+
+    def to_prometheus(self):
+        return "\n".join(self.header() + self.samples())
+
+    def to_dict(self):
+        return {
+            "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.cumulative_counts())),
+            "sum": self.sum,
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else 0.0,
+        }
+
+
+class StreamingTelemetry:
+    """
+    Instrumentation surface around the streaming `transcribe` callback.
+
+    Call `instrument(streamer)` once so model calls are timed, then route every
+    chunk through `process_chunk` instead of `streamer.process_chunk`. Use one
+    instance per stream, e.g. with `labels={"session": session_id}`, so the
+    rolling real-time factor of one user is not mixed with another's.
+    """
+
+    def __init__(self, rtf_window_seconds: float = 30.0, prefix: str = "asr", labels: dict = None):
+        self.labels = dict(labels or {})
+        self.queue_delay = Histogram(
+            f"{prefix}_queue_delay_seconds", "Server-side delay between chunk arrival and the start of processing.",
+            labels=self.labels)
+        self.model_time = Histogram(
+            f"{prefix}_model_seconds", "Time spent inside the ASR model per call.", labels=self.labels)
+        self.partial_latency = Histogram(
+            f"{prefix}_partial_latency_seconds", "Server-side latency from chunk arrival to partial result available.",
+            labels=self.labels)
+        self.rtf = Histogram(
+            f"{prefix}_real_time_factor", "Rolling processing time divided by audio duration.", RTF_BUCKETS,
+            labels=self.labels)
+        self.rtf_window_seconds = rtf_window_seconds
+        self.prefix = prefix
+        self.audio_seconds = 0.0
+        self._rolling = deque()
+        self._rolling_audio = 0.0
+        self._rolling_compute = 0.0
+
+    def wrap_transcriber(self, transcriber):
+        """
+        Return a callable that forwards to `transcriber` and records its duration.
+        """
+        def timed_transcriber(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return transcriber(*args, **kwargs)
+            finally:
+                self.model_time.observe(time.perf_counter() - start)
+
+        return timed_transcriber
+
+    def instrument(self, streamer: LocalAgreementStreamer):
+        streamer.transcriber = self.wrap_transcriber(streamer.transcriber)
+        if streamer.feature_cache is not None:
+            cache = streamer.feature_cache
+            cache.transcribe_from = self.wrap_transcriber(cache.transcribe_from)
+        return streamer
+
+    @property
+    def rolling_rtf(self):
+        return self._rolling_compute / self._rolling_audio if self._rolling_audio else 0.0
+
+    def _update_rtf(self, audio_seconds: float, compute_seconds: float):
+        self._rolling.append((audio_seconds, compute_seconds))
+        self._rolling_audio += audio_seconds
+        self._rolling_compute += compute_seconds
+        while len(self._rolling) > 1 and self._rolling_audio - self._rolling[0][0] >= self.rtf_window_seconds:
+            old_audio, old_compute = self._rolling.popleft()
+            self._rolling_audio -= old_audio
+            self._rolling_compute -= old_compute
+        self.rtf.observe(self.rolling_rtf)
+
+    def process_chunk(self, streamer: LocalAgreementStreamer, chunk: np.ndarray, arrived_at: float = None):
+        """
+        Process a chunk through the streamer and record its timings.
+
+        Parameters:
+          streamer: an instrumented `LocalAgreementStreamer`
+          chunk: raw microphone samples
+          arrived_at: `time.perf_counter()` value when the chunk reached the server;
+            defaults to now, i.e. no queueing delay. Time before it is not measured
+        Returns:
+          committed_text, tentative_text: as returned by `streamer.process_chunk`
+        """
+        start = time.perf_counter()
+        arrived_at = start if arrived_at is None else arrived_at
+        self.queue_delay.observe(max(0.0, start - arrived_at))
+        result = streamer.process_chunk(chunk)
+        end = time.perf_counter()
+        self.partial_latency.observe(end - arrived_at)
+        audio_seconds = len(chunk) / streamer.sampling_rate
+        self.audio_seconds += audio_seconds
+        self._update_rtf(audio_seconds, end - start)
+        return result
+
+    def histograms(self):
+        return [self.queue_delay, self.model_time, self.partial_latency, self.rtf]
+
+    def metric_families(self):
+        """
+        (header lines, sample lines) of every exported metric, in a fixed order.
+        """
+        gauge = f"{self.prefix}_rolling_real_time_factor"
+        families = [(histogram.header(), histogram.samples()) for histogram in self.histograms()]
+        families.append((
+            [f"# HELP {gauge} Current rolling real-time factor.", f"# TYPE {gauge} gauge"],
+            [f"{gauge}{format_labels(self.labels)} {self.rolling_rtf}"],
+        ))
+        return families
+
+    def to_prometheus(self):
+        return combined_prometheus([self])
+
+    def to_json(self):
+        report = {histogram.name: histogram.to_dict() for histogram in self.histograms()}
+        report["rolling_real_time_factor"] = self.rolling_rtf
+        report["audio_seconds"] = self.audio_seconds
+        return json.dumps(report, indent=2)
+
+
+def combined_prometheus(telemetries):
+    """
+    Prometheus text for several telemetry objects with distinct labels, e.g. one
+    per session, describing every metric only once.
+    """
+    telemetries = list(telemetries)
+    if not telemetries:
+        return ""
+    lines = []
+    for families in zip(*(telemetry.metric_families() for telemetry in telemetries)):
+        lines.extend(families[0][0])
+        for _, samples in families:
+            lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+def read_wav(path):
+    """
+    Read a 16-bit PCM WAV file as a mono int16 array.
+
+    Returns:
+      audio: mono int16 samples
+      sampling_rate: sampling rate of the file
+    """
+    with wave.open(str(path), "rb") as wav_file:
+        if wav_file.getsampwidth() != 2:
+            raise ValueError(f"{path} must be 16-bit PCM")
+        channels = wav_file.getnchannels()
+        sampling_rate = wav_file.getframerate()
+        audio = np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype="<i2")
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return audio, sampling_rate
+
+
+def replay(streamer, telemetry: StreamingTelemetry, audio: np.ndarray, sampling_rate: int,
+           chunk_seconds: float = 0.5, realtime: bool = True):
+    """
+    Feed audio to the streamer as if it came from a live microphone.
+
+    Chunk `i` becomes available `(i + 1) * chunk_seconds` after the start, so when
+    processing falls behind the stream, the backlog shows up as queueing delay.
+    With `realtime=False` chunks are fed back to back as fast as possible.
+    """
+    chunk_length = int(chunk_seconds * sampling_rate)
+    started = time.perf_counter()
+    for start in range(0, len(audio), chunk_length):
+        chunk = audio[start:start + chunk_length]
+        arrived_at = None
+        if realtime:
+            arrived_at = started + (start + len(chunk)) / sampling_rate
+            delay = arrived_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        telemetry.process_chunk(streamer, chunk, arrived_at)
+    streamer.finish()
+    return streamer.committed_text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("wav", help="16-bit PCM WAV file to replay, e.g. converted with "
+                                    "`ffmpeg -i speech.mp3 -ac 1 -ar 16000 -c:a pcm_s16le speech.wav`")
+    parser.add_argument("--model", default="openai/whisper-base.en")
+    parser.add_argument("--chunk-seconds", type=float, default=0.5)
+    parser.add_argument("--max-window-seconds", type=float, default=15.0)
+    parser.add_argument("--no-realtime", action="store_true", help="feed chunks as fast as possible")
+    parser.add_argument("--no-vad", action="store_true", help="decode every chunk, including silence")
+    parser.add_argument("--format", choices=["prometheus", "json"], default="prometheus")
+    parser.add_argument("--output", help="write the metrics to this file instead of stdout")
+    args = parser.parse_args()
+
+    from transformers import pipeline
+
+    audio, sampling_rate = read_wav(args.wav)
+    transcriber = pipeline("automatic-speech-recognition", model=args.model)
+    endpointer = None if args.no_vad else EnergyEndpointer(sampling_rate)
+    streamer = LocalAgreementStreamer(
+        transcriber, sampling_rate, max_window_seconds=args.max_window_seconds, endpointer=endpointer
+    )
+    telemetry = StreamingTelemetry()
+    telemetry.instrument(streamer)
+
+    text = replay(streamer, telemetry, audio, sampling_rate, args.chunk_seconds, not args.no_realtime)
+    metrics = telemetry.to_prometheus() if args.format == "prometheus" else telemetry.to_json()
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(metrics)
+        print(text)
+    else:
+        print(metrics)
+
+
+if __name__ == "__main__":
+    main()
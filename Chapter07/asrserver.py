@@ -0,0 +1,328 @@
+"""
+Multi-session streaming ASR server with cross-session micro-batching.
+
+Clients connect over a plain TCP socket, send a one-line JSON handshake such as
+`{"sampling_rate": 16000}` and then stream frames made of a 4-byte big-endian
+length followed by that many bytes of 16-bit little-endian PCM. A zero-length
+frame ends the stream. After every frame the server answers with one JSON line
+holding the committed and tentative text and the latency of that frame. A
+malformed handshake is answered with an `{"error": ...}` line before the
+connection is closed.
+
+Windows that are waiting to be decoded are collected from all sessions and sent
+through the Transformers pipeline as a single batch every `batch_interval_ms`.
+
+Usage:
+  python asrserver.py --model openai/whisper-base.en --port 8765
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import struct
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from streamutils import FINALIZE, EnergyEndpointer, LocalAgreementStreamer
+
+FRAME_HEADER = struct.Struct(">I")
+
+
+class MicroBatcher:
+    """
+    Collects decode requests from many sessions and runs them as one pipeline batch.
+
+    Every `batch_interval_ms` the pending windows (up to `max_batch_size`) are
+    passed to the transcriber together in a worker thread, so the event loop keeps
+    reading audio while the model runs. The ticks are fixed deadlines, so the time
+    spent decoding counts towards the next interval; when a batch overruns it, the
+    windows queued in the meantime are batched right away.
+    """
+
+    def __init__(self, transcriber, batch_interval_ms: float = 50, max_batch_size: int = 16):
+        self.transcriber = transcriber
+        self.batch_interval = batch_interval_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.batch_sizes = deque(maxlen=1000)
+        self._pending = []
+        self._in_flight = []
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._task = None
+        self._stopped = False
+
+    def start(self):
+        self._stopped = False
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """
+        Stop batching and fail every request that is queued or being decoded, so no client waits forever.
+        """
+        self._stopped = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for _, future in self._in_flight + self._pending:
+            if not future.done():
+                future.set_exception(ConnectionAbortedError("ASR server is shutting down"))
+        self._in_flight, self._pending = [], []
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, window: np.ndarray, sampling_rate: int):
+        """
+        Queue a window for the next batch and wait for its word-level output.
+        """
+        if self._stopped:
+            raise ConnectionAbortedError("ASR server is shutting down")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(({"sampling_rate": sampling_rate, "raw": window}, future))
+        return await future
+
+    def _transcribe_batch(self, inputs):
+        return self.transcriber(inputs, batch_size=len(inputs), return_timestamps="word")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            deadline += self.batch_interval
+            delay = deadline - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                # Behind schedule: do not try to catch up on the missed ticks
+                deadline = loop.time()
+                await asyncio.sleep(0)
+            if not self._pending:
+                continue
+            batch = self._in_flight = self._pending[:self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size:]
+            self.batch_sizes.append(len(batch))
+            try:
+                outputs = await loop.run_in_executor(
+                    self._executor, self._transcribe_batch, [inputs for inputs, _ in batch]
+                )
+            except Exception as exc:
+                self._in_flight = []
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            # On cancellation the batch stays in _in_flight, for stop() to fail
+            self._in_flight = []
+            for (_, future), output in zip(batch, outputs):
+                if not future.done():
+                    future.set_result(output)
+
+
+class SessionStats:
+    """
+    Per-session latency bookkeeping, from frame arrival to response.
+    """
+
+    def __init__(self, session_id, window: int = 1000):
+        self.session_id = session_id
+        self.frames = 0
+        self.decoded_frames = 0
+        self.latencies_ms = deque(maxlen=window)
+
+    def record(self, latency_ms: float, decoded: bool):
+        self.frames += 1
+        self.decoded_frames += int(decoded)
+        self.latencies_ms.append(latency_ms)
+
+    def summary(self):
+        latencies = np.array(self.latencies_ms) if self.latencies_ms else np.zeros(1)
+        return {
+            "session": self.session_id,
+            "frames": self.frames,
+            "decoded_frames": self.decoded_frames,
+            "latency_ms_mean": float(latencies.mean()),
+            "latency_ms_p50": float(np.percentile(latencies, 50)),
+            "latency_ms_p95": float(np.percentile(latencies, 95)),
+            "latency_ms_max": float(latencies.max()),
+        }
+
+
+class StreamingASRServer:
+    """
+    asyncio server that runs one `LocalAgreementStreamer` per connection and
+    decodes all sessions through a shared `MicroBatcher`.
+
+    `sessions` only holds the connected sessions; the latency summaries of the
+    last `max_finished_sessions` closed ones are kept for `report`.
+    """
+
+    def __init__(
+        self,
+        transcriber,
+        batch_interval_ms: float = 50,
+        max_batch_size: int = 16,
+        max_window_seconds: float = 15.0,
+        use_endpointer: bool = True,
+        max_finished_sessions: int = 1000,
+    ):
+        self.batcher = MicroBatcher(transcriber, batch_interval_ms, max_batch_size)
+        self.max_window_seconds = max_window_seconds
+        self.use_endpointer = use_endpointer
+        self.sessions = {}
+        self.finished_sessions = deque(maxlen=max_finished_sessions)
+        self._session_ids = itertools.count(1)
+        self._server = None
+
+    def create_streamer(self, sampling_rate: int):
+        endpointer = EnergyEndpointer(sampling_rate) if self.use_endpointer else None
+        return LocalAgreementStreamer(
+            None, sampling_rate, max_window_seconds=self.max_window_seconds, endpointer=endpointer
+        )
+
+    async def process_frame(self, streamer: LocalAgreementStreamer, chunk: np.ndarray):
+        """
+        Run one frame through the streamer, decoding through the shared batcher.
+
+        Returns:
+          decoded: whether the frame needed inference
+        """
+        action = streamer.plan_chunk(chunk)
+        if action is None:
+            return False
+        window = streamer.uncommitted_window()
+        if len(window):
+            # The view is only valid until the next append, so the batch gets a copy
+            output = await self.batcher.submit(window.copy(), streamer.sampling_rate)
+            streamer.apply_output(output, len(window))
+        if action == FINALIZE:
+            streamer.finish()
+        return True
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session_id = next(self._session_ids)
+        stats = self.sessions[session_id] = SessionStats(session_id)
+        try:
+            try:
+                handshake = json.loads(await reader.readline())
+                sampling_rate = int(handshake["sampling_rate"])
+                if sampling_rate <= 0:
+                    raise ValueError(f"invalid sampling rate {sampling_rate}")
+            except (ValueError, KeyError, TypeError) as exc:
+                # json.JSONDecodeError is a ValueError
+                writer.write((json.dumps({"error": f"bad handshake: {exc}"}) + "\n").encode())
+                await writer.drain()
+                return
+            streamer = self.create_streamer(sampling_rate)
+            while True:
+                (length,) = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+                if length == 0:
+                    break
+                payload = await reader.readexactly(length)
+                received = time.perf_counter()
+                chunk = np.frombuffer(payload, dtype="<i2")
+                decoded = await self.process_frame(streamer, chunk)
+                latency_ms = (time.perf_counter() - received) * 1000
+                stats.record(latency_ms, decoded)
+                message = {
+                    "committed": streamer.committed_text,
+                    "tentative": streamer.tentative_text,
+                    "latency_ms": latency_ms,
+                }
+                writer.write((json.dumps(message) + "\n").encode())
+                await writer.drain()
+            streamer.finish()
+            final = {"final": True, "committed": streamer.committed_text, "stats": stats.summary()}
+            writer.write((json.dumps(final) + "\n").encode())
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError, ConnectionAbortedError):
+            pass
+        finally:
+            del self.sessions[session_id]
+            self.finished_sessions.append(stats.summary())
+            writer.close()
+
+    def report(self):
+        """
+        Return the latency summary of the recently closed sessions and of the connected ones.
+        """
+        return list(self.finished_sessions) + [stats.summary() for stats in self.sessions.values()]
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765):
+        self.batcher.start()
+        self._server = await asyncio.start_server(self.handle_client, host, port)
+        return self._server
+
+    async def stop(self):
+        # fail the queued windows before waiting, since connections blocked on them keep wait_closed() pending
+        if self._server is not None:
+            self._server.close()
+        await self.batcher.stop()
+        if self._server is not None:
+            await self._server.wait_closed()
+
+
+async def stream_client(audio: np.ndarray, sampling_rate: int, host: str = "127.0.0.1", port: int = 8765,
+                        chunk_seconds: float = 0.5, realtime: bool = True):
+    """
+    Synthetic client that streams an int16 (or float) array to the server.
+
+    Parameters:
+      audio: mono audio to send
+      sampling_rate: sampling rate of `audio`
+      chunk_seconds: duration of each frame
+      realtime: sleep between frames to mimic a live microphone
+    Returns:
+      final: the server's final message, including the session latency summary
+    """
+    if not np.issubdtype(audio.dtype, np.integer):
+        audio = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+    audio = audio.astype("<i2", copy=False)
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write((json.dumps({"sampling_rate": sampling_rate}) + "\n").encode())
+    chunk_length = int(chunk_seconds * sampling_rate)
+    for start in range(0, len(audio), chunk_length):
+        payload = audio[start:start + chunk_length].tobytes()
+        writer.write(FRAME_HEADER.pack(len(payload)) + payload)
+        await writer.drain()
+        await reader.readline()
+        if realtime:
+            await asyncio.sleep(chunk_seconds)
+    writer.write(FRAME_HEADER.pack(0))
+    await writer.drain()
+    final = json.loads(await reader.readline())
+    writer.close()
+    return final
+
+
+async def serve(args):
+    from transformers import pipeline
+
+    transcriber = pipeline("automatic-speech-recognition", model=args.model)
+    server = StreamingASRServer(
+        transcriber, batch_interval_ms=args.batch_interval_ms, max_batch_size=args.max_batch_size
+    )
+    await server.start(args.host, args.port)
+    print(f"Listening on {args.host}:{args.port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+        for summary in server.report():
+            print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="openai/whisper-base.en")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--batch-interval-ms", type=float, default=50)
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -69,6 +69,35 @@ With just these two lines of code, we initialize a pipeline for automatic speech
 
 By utilizing a pre-trained model like "whisper", we can quickly get started with building our demo without the need for extensive model training. This allows us to focus on integrating the model into our application and creating an engaging user experience.
 
+### Speeding up decoding with a draft model
+
+On a CPU, most of the transcription time goes into autoregressive decoding: the model produces one token per forward pass. With *speculative* (or *assisted*) decoding, a small draft model such as `openai/whisper-tiny.en` proposes several tokens ahead, and the target model verifies all of them in a single forward pass. Since the target model only accepts tokens it would have produced itself, the greedy output is identical, just faster.
+
+The `speculative.py` helper module in our GitHub repository wraps this in `load_transcriber(model_id, draft_model_id)`, which returns a regular `pipeline` object, and a `benchmark` function that compares tokens per second and checks that the outputs match:
+"""
+
+!wget -nv https://github.com/PacktPublishing/Learn-OpenAI-Whisper/raw/main/Chapter07/speculative.py -O speculative.py
+!wget -nv https://github.com/PacktPublishing/Learn-OpenAI-Whisper/raw/main/Chapter01/Learn_OAI_Whisper_Sample_Audio01.mp3
+
+import librosa
+from speculative import benchmark, load_transcriber
+
+draft_model = "openai/whisper-tiny.en"  # Set to None to disable speculative decoding
+
+sample_audio, sample_sr = librosa.load("Learn_OAI_Whisper_Sample_Audio01.mp3", sr=16000)
+report = benchmark(
+    {
+        "base.en": load_transcriber("openai/whisper-base.en"),
+        "base.en + tiny.en draft": load_transcriber("openai/whisper-base.en", draft_model),
+    },
+    [sample_audio],
+    sample_sr,
+)
+for label, stats in report.items():
+    print(f"{label}: {stats['tokens_per_second']:.1f} tokens/s, speedup {stats['speedup']:.2f}x, identical output: {stats['identical_to_base.en']}")
+
+"""The streaming demos below need word-level timestamps, so they keep the plain pipeline; the full-context demo and the final re-decoding pass of the cascade use the draft model.
+
 ## Step 2: Building a Full-Context ASR Demo with Transformers
 
 Our first step in creating the speech recognition demo is to build a *full-context* ASR demo. In this demo, the user will speak the entire audio before the ASR model processes it and generates the transcription. Thanks to Gradio's intuitive interface, building this demo is a breeze.
@@ -81,10 +110,10 @@ The `transcribe` function, which is the heart of our demo, takes a single parame
 """
 
 import gradio as gr
-from transformers import pipeline
 import numpy as np
+from speculative import load_transcriber
 
-transcriber = pipeline("automatic-speech-recognition", model="openai/whisper-base.en")
+transcriber = load_transcriber("openai/whisper-base.en", draft_model_id=draft_model)
 
 def transcribe(audio):
     sr, y = audio
@@ -110,63 +139,155 @@ To create a streaming ASR demo, we need to make the following changes:
 2. Set **live=True** in the **Interface** to ensure that the interface updates dynamically as new audio data is received.
 3. Add a **state** variable to the interface to store the recorded audio and the previous transcription.
 
-In the streaming demo, we use a state variable to keep track of the audio history and the previous transcription. The **transcribe** function is called whenever a new small chunk of audio is received, and it needs to process the new chunk along with the previously recorded audio.
+In the streaming demo, we use a state variable to keep track of the audio history and the transcription so far. The **transcribe** function is called whenever a new small chunk of audio is received, and it needs to process the new chunk along with the previously recorded audio.
+
+Simply re-transcribing an overlapping window and gluing the texts together tends to both duplicate and drop words at the seams. Instead, we use the `LocalAgreementStreamer` from the `streamutils.py` helper module in our GitHub repository, which follows the *LocalAgreement* policy used by streaming Whisper systems:
+
+- The audio history lives in an `AudioRingBuffer`, a fixed-capacity float32 buffer. Each new chunk is converted and written in place, and the window we transcribe is returned as a view into the buffer, so no new array is allocated on every callback.
+- On every chunk, only the *uncommitted* tail of the audio is re-decoded, with word-level timestamps.
+- Words on which two consecutive hypotheses agree are *committed*: they are final, and the start of the decoded window moves past them. The remaining words are *tentative* and may still change as more audio arrives.
+- If the hypotheses keep disagreeing, the window is capped at `max_window_seconds`, so the compute spent per second of audio stays bounded.
+- With `use_feature_cache`, a `CachedFeatureTranscriber` computes the log-Mel frames of each chunk only once and reuses them for every later window, instead of running the feature extractor over the whole overlapping window on each callback. The feature cost per chunk then scales with the chunk length rather than the window length.
+- An `EnergyEndpointer` performs voice activity detection on every chunk. Chunks without speech skip inference entirely, and once `endpoint_silence_seconds` of trailing silence follow speech, the utterance is finalized and the window is reset. This way the server only spends CPU while someone is actually talking.
 
-To improve the accuracy and coherence of the transcription, we introduce a dynamic window size based on the duration of the new audio chunk and a small overlap between consecutive windows. Here's how the **transcribe** function works:
+Here's how the **transcribe** function works:
 
-1. If the **state** is None, initialize an empty numpy array (**stream**) to store the audio and an empty string (**previous_text**) to store the previous transcription.
+1. If the **state** is None, create a `LocalAgreementStreamer` with an `EnergyEndpointer` around our **transcriber** for the microphone's sampling rate.
 2. Extract the sampling rate (**sr**) and audio data (**y**) from the **new_chunk**.
-3. Calculate the duration of the new audio chunk and normalize the audio data.
-4. Introduce an overlap of half a second between consecutive windows to ensure continuity in the transcription.
-5. Concatenate the new audio chunk to the existing **stream**, taking into account the overlap.
-6. Transcribe the entire **stream** using the **transcriber** object.
-7. Update the **previous_text** by removing the overlap from the end of the previous transcription and concatenating it with the new transcription.
-8. Return the updated **stream** and **combined_text** as the state, and the **combined_text** as the transcription output.
-
-By using a dynamic window size and introducing an overlap between consecutive windows, we can improve the accuracy and coherence of the streaming transcription. The small overlap helps maintain continuity in the transcription and reduces the occurrence of overlapping or missing words.
+3. Call `process_chunk(y)`, which appends the audio, skips inference if the chunk is silent, and otherwise re-decodes the uncommitted window. It returns the committed and the tentative text.
+4. Return the streamer as the state, and show the committed and tentative text in two separate text boxes.
+
+To know whether the demo keeps up with the microphone, every chunk goes through a `StreamingTelemetry` object from the `asrmetrics.py` helper module. It records the queueing delay, the time spent in the model, the server-side latency of each partial result and the rolling real-time factor (processing time divided by audio duration; values below 1.0 mean we keep up). Each browser session gets its own telemetry object, labelled with the Gradio session id, so the real-time factor of one user is not mixed with another's. Gradio hands chunks over without a capture timestamp, so the callback passes the time the chunk reached it as `arrived_at`. The queueing delay therefore includes everything that happens in the callback before decoding starts, such as setting up the streamer for a new session, but the latency is server-side processing latency: recording in the browser, the network and Gradio's own queue come on top of it.
 """
 
+!wget -nv https://github.com/PacktPublishing/Learn-OpenAI-Whisper/raw/main/Chapter07/streamutils.py -O streamutils.py
+!wget -nv https://github.com/PacktPublishing/Learn-OpenAI-Whisper/raw/main/Chapter07/asrmetrics.py -O asrmetrics.py
+
+import time
 import gradio as gr
 from transformers import pipeline
-import numpy as np
+from streamutils import CachedFeatureTranscriber, EnergyEndpointer, LocalAgreementStreamer
+from asrmetrics import StreamingTelemetry, combined_prometheus
 
 transcriber = pipeline("automatic-speech-recognition", model="openai/whisper-base.en")
 
-def transcribe(state, new_chunk):
-    if state is None:
-        stream = np.array([], dtype=np.float32)
-        previous_text = ""
-    else:
-        stream, previous_text = state
+endpoint_silence_seconds = 0.8  # Trailing silence that finalizes an utterance
+use_feature_cache = True  # Reuse log-Mel frames across overlapping windows
+session_telemetry = {}  # Gradio session id -> StreamingTelemetry of that session
 
+def transcribe(state, new_chunk, request: gr.Request):
+    arrived_at = time.perf_counter()
     sr, y = new_chunk
-    duration = len(y) / sr
-    y = y.astype(np.float32)
-    y /= np.max(np.abs(y))
+    if state is None:
+        endpointer = EnergyEndpointer(sr, endpoint_silence_seconds=endpoint_silence_seconds)
+        feature_cache = CachedFeatureTranscriber(transcriber) if use_feature_cache else None
+        state = LocalAgreementStreamer(
+            transcriber, sr, max_window_seconds=15, endpointer=endpointer, feature_cache=feature_cache
+        )
+        session_telemetry[request.session_hash] = StreamingTelemetry(labels={"session": request.session_hash})
+        session_telemetry[request.session_hash].instrument(state)
+
+    telemetry = session_telemetry[request.session_hash]
+    committed_text, tentative_text = telemetry.process_chunk(state, y, arrived_at)
+
+    return state, committed_text, tentative_text
+
+demo = gr.Interface(
+    transcribe,
+    ["state", gr.Audio(sources=["microphone"], streaming=True)],
+    ["state", gr.Textbox(label="Committed"), gr.Textbox(label="Tentative")],
+    live=True,
+)
+
+demo.launch(debug=True)
+
+"""After talking to the demo for a while, stop the cell above and run the next one to print the histograms of every session in the Prometheus text format.
+"""
+
+print(combined_prometheus(session_telemetry.values()))
 
-    overlap = int(sr * 0.5)  # Half a second overlap
-    if len(stream) > 0:
-        stream = np.concatenate([stream[-overlap:], y])
-    else:
-        stream = y
+"""### Cascade mode: fast partials, accurate finals
 
-    # Transcribe the current chunk
-    new_text = transcriber({"sampling_rate": sr, "raw": stream})["text"]
+A single model is always a trade-off: `whisper-base.en` may be too slow for sub-second partial results on a busy CPU, and too inaccurate for the final transcript. The `CascadeStreamer` from `streamutils.py` splits the work:
 
-    # Update the previous text based on the overlap
-    if len(previous_text) > 0:
-        overlap_text = previous_text[-int(len(previous_text) * 0.1):]  # Last 10% of previous text
-        combined_text = previous_text[:-len(overlap_text)] + new_text
-    else:
-        combined_text = new_text
+- Partial hypotheses come from the first model in a list of increasingly faster models (here `base.en`, then `tiny.en`). When the rolling real-time factor of partial decoding exceeds `rtf_budget`, or the CPU is overloaded, it automatically downgrades to the next faster model, and moves back up when there is headroom again.
+- Each utterance finalized by the endpointer is re-decoded by a larger model (here `small.en`) in a background worker pool. Once that finishes, its text replaces the partial transcript of that utterance.
+
+This way, users see partial results quickly while the final quality is preserved, and `max_workers` caps how much CPU the background re-decoding may use.
+"""
+
+from streamutils import CascadeStreamer
+
+partial_transcribers = [
+    transcriber,
+    pipeline("automatic-speech-recognition", model="openai/whisper-tiny.en"),
+]
+final_transcriber = load_transcriber("openai/whisper-small.en", draft_model_id=draft_model)
+
+def transcribe_cascade(state, new_chunk):
+    sr, y = new_chunk
+    if state is None:
+        endpointer = EnergyEndpointer(sr, endpoint_silence_seconds=endpoint_silence_seconds)
+        state = CascadeStreamer(
+            partial_transcribers, final_transcriber, sr, rtf_budget=0.5, max_workers=1, endpointer=endpointer
+        )
 
-    return (stream, combined_text), combined_text
+    committed_text, tentative_text = state.process_chunk(y)
+
+    return state, committed_text, tentative_text, f"partial model: level {state.level}"
 
 demo = gr.Interface(
-    transcribe,
+    transcribe_cascade,
     ["state", gr.Audio(sources=["microphone"], streaming=True)],
-    ["state", "text"],
+    ["state", gr.Textbox(label="Committed"), gr.Textbox(label="Tentative"), gr.Textbox(label="Load")],
     live=True,
 )
 
-demo.launch(debug=True)
\ No newline at end of file
+demo.launch(debug=True)
+
+"""You can measure the same numbers without a microphone by replaying a WAV file as a simulated live stream, for example to size a server before deploying it:
+
+```bash
+wget -nv https://github.com/PacktPublishing/Learn-OpenAI-Whisper/raw/main/Chapter01/Learn_OAI_Whisper_Sample_Audio01.mp3
+ffmpeg -i Learn_OAI_Whisper_Sample_Audio01.mp3 -ac 1 -ar 16000 -c:a pcm_s16le Learn_OAI_Whisper_Sample_Audio01.wav
+python asrmetrics.py Learn_OAI_Whisper_Sample_Audio01.wav --model openai/whisper-base.en --format json
+```
+
+`asrmetrics.py` reads 16-bit PCM WAV files only, which is why the MP3 sample is converted with `ffmpeg` first.
+
+## Step 4: Serving many concurrent streams with micro-batching
+
+The Gradio demo runs one `transcriber(...)` call per callback per user, so concurrent users never share a forward pass. The `asrserver.py` helper module in our GitHub repository wraps the same `LocalAgreementStreamer` in an asyncio service:
+
+1. Each client connects over a local TCP socket, sends a short JSON handshake with its sampling rate, and then streams length-prefixed 16-bit PCM frames.
+2. Every session keeps its own streamer and voice activity endpointer, so silent clients cost nothing.
+3. Windows waiting to be decoded are collected from all sessions and sent through the pipeline as **one batch** every `batch_interval_ms` milliseconds.
+4. Every response carries the latency of that frame, and the server keeps a per-session latency summary.
+
+You can also run it from a terminal with `python asrserver.py --model openai/whisper-base.en --port 8765`. Below, we start it inside the notebook and drive it with a few synthetic clients that replay the same sample audio.
+"""
+
+!wget -nv https://github.com/PacktPublishing/Learn-OpenAI-Whisper/raw/main/Chapter07/asrserver.py -O asrserver.py
+!wget -nv https://github.com/PacktPublishing/Learn-OpenAI-Whisper/raw/main/Chapter01/Learn_OAI_Whisper_Sample_Audio01.mp3
+
+import asyncio
+import librosa
+from asrserver import StreamingASRServer, stream_client
+
+sample_audio, sample_sr = librosa.load("Learn_OAI_Whisper_Sample_Audio01.mp3", sr=16000)
+
+async def run_synthetic_clients(num_clients=4):
+    server = StreamingASRServer(transcriber, batch_interval_ms=50, max_batch_size=8)
+    await server.start("127.0.0.1", 8765)
+    try:
+        results = await asyncio.gather(
+            *[stream_client(sample_audio, sample_sr, port=8765) for _ in range(num_clients)]
+        )
+    finally:
+        await server.stop()
+    return results, server.batcher.batch_sizes
+
+results, batch_sizes = await run_synthetic_clients()
+for result in results:
+    print(result["stats"])
+print(f"Mean batch size: {sum(batch_sizes) / max(len(batch_sizes), 1):.2f}")
@@ -0,0 +1,161 @@
+"""
+Speculative (assisted) decoding for the Transformers ASR pipeline.
+
+A small draft model, such as `openai/whisper-tiny.en` or a distil-whisper
+checkpoint, proposes several tokens ahead and the target model verifies all of
+them in a single forward pass. With greedy decoding the output is identical to
+running the target model alone, only faster, because most draft tokens are
+accepted and the expensive model runs far fewer autoregressive steps.
+
+The command line compares both paths on audio files and reports tokens/s:
+  python speculative.py sample.mp3 --model openai/whisper-base.en --draft openai/whisper-tiny.en
+"""
+import argparse
+import json
+import time
+
+
+def default_device():
+    import torch
+
+    return "cuda:0" if torch.cuda.is_available() else "cpu"
+
+
+def load_draft_model(draft_model_id: str, device: str, torch_dtype, decoder_only: bool = False):
+    """
+    Load the assistant model used to propose tokens.
+
+    Parameters:
+      draft_model_id: Hugging Face id of the draft checkpoint
+      decoder_only: load only the decoder (`AutoModelForCausalLM`), for distil-whisper
+        drafts that share the target's encoder
+    """
+    from transformers import AutoModelForCausalLM, AutoModelForSpeechSeq2Seq
+
+    model_class = AutoModelForCausalLM if decoder_only else AutoModelForSpeechSeq2Seq
+    draft = model_class.from_pretrained(draft_model_id, torch_dtype=torch_dtype, low_cpu_mem_usage=True)
+    return draft.to(device)
+
+
+def load_transcriber(
+    model_id: str,
+    draft_model_id: str = None,
+    device: str = None,
+    torch_dtype=None,
+    decoder_only_draft: bool = False,
+    num_draft_tokens: int = None,
+):
+    """
+    Build an ASR pipeline, optionally with a draft model for speculative decoding.
+
+    The draft must share the target's tokenizer, e.g. `whisper-tiny.en` for any
+    English-only target or `whisper-tiny` for a multilingual one. Assisted
+    generation decodes one input at a time, so keep the pipeline's batch size at 1.
+
+    Parameters:
+      model_id: target (accurate) Whisper checkpoint
+      draft_model_id: small checkpoint proposing tokens; None disables speculation
+      device: torch device, defaults to the first GPU if there is one
+      torch_dtype: defaults to float16 on GPU and float32 on CPU
+      decoder_only_draft: see `load_draft_model`
+      num_draft_tokens: tokens proposed per verification step; None keeps the
+        Transformers default, which adapts to the acceptance rate
+    Returns:
+      transcriber: `pipeline("automatic-speech-recognition", ...)` ready to call
+    """
+    import torch
+    from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor, pipeline
+
+    device = device or default_device()
+    if torch_dtype is None:
+        torch_dtype = torch.float32 if device == "cpu" else torch.float16
+
+    model = AutoModelForSpeechSeq2Seq.from_pretrained(model_id, torch_dtype=torch_dtype, low_cpu_mem_usage=True)
+    model.to(device)
+    processor = AutoProcessor.from_pretrained(model_id)
+
+    generate_kwargs = {}
+    if draft_model_id is not None:
+        draft = load_draft_model(draft_model_id, device, torch_dtype, decoder_only_draft)
+        if draft.config.vocab_size != model.config.vocab_size:
+            raise ValueError(
+                f"{draft_model_id} and {model_id} use different vocabularies and cannot be paired for speculative decoding"
+            )
+        if num_draft_tokens is not None:
+            draft.generation_config.num_assistant_tokens = num_draft_tokens
+        generate_kwargs["assistant_model"] = draft
+
+    return pipeline(
+        "automatic-speech-recognition",
+        model=model,
+        tokenizer=processor.tokenizer,
+        feature_extractor=processor.feature_extractor,
+        torch_dtype=torch_dtype,
+        device=device,
+        generate_kwargs=generate_kwargs,
+    )
+
+
+def benchmark(transcribers: dict, samples, sampling_rate: int = 16000, warmup: bool = True):
+    """
+    Time several transcribers on the same audio and compare their greedy output.
+
+    Parameters:
+      transcribers: mapping of label to pipeline, the first one is the reference
+      samples: list of float32 arrays
+      sampling_rate: sampling rate of `samples`
+      warmup: run every transcriber once before timing
+    Returns:
+      report: per label, tokens/s, total seconds, and whether every output
+        matched the reference output
+    """
+    reference_label = next(iter(transcribers))
+    outputs, report = {}, {}
+    for label, transcriber in transcribers.items():
+        if warmup and samples:
+            transcriber({"sampling_rate": sampling_rate, "raw": samples[0]})
+        texts, seconds, tokens = [], 0.0, 0
+        for sample in samples:
+            start = time.perf_counter()
+            text = transcriber({"sampling_rate": sampling_rate, "raw": sample})["text"]
+            seconds += time.perf_counter() - start
+            tokens += len(transcriber.tokenizer(text, add_special_tokens=False).input_ids)
+            texts.append(text)
+        outputs[label] = texts
+        report[label] = {"tokens": tokens, "seconds": seconds, "tokens_per_second": tokens / seconds if seconds else 0.0}
+
+    for label in transcribers:
+        report[label]["identical_to_" + reference_label] = outputs[label] == outputs[reference_label]
+        report[label]["speedup"] = report[reference_label]["seconds"] / report[label]["seconds"] if report[label]["seconds"] else 0.0
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("audio", nargs="+", help="audio files to transcribe (decoded with ffmpeg)")
+    parser.add_argument("--model", default="openai/whisper-base.en")
+    parser.add_argument("--draft", default="openai/whisper-tiny.en")
+    parser.add_argument("--decoder-only-draft", action="store_true")
+    parser.add_argument("--num-draft-tokens", type=int)
+    parser.add_argument("--device")
+    args = parser.parse_args()
+
+    from transformers.pipelines.audio_utils import ffmpeg_read
+
+    samples = []
+    for path in args.audio:
+        with open(path, "rb") as f:
+            samples.append(ffmpeg_read(f.read(), 16000))
+
+    transcribers = {
+        "target": load_transcriber(args.model, device=args.device),
+        "speculative": load_transcriber(
+            args.model, args.draft, device=args.device,
+            decoder_only_draft=args.decoder_only_draft, num_draft_tokens=args.num_draft_tokens,
+        ),
+    }
+    print(json.dumps(benchmark(transcribers, samples), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,714 @@
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import os
+import time
+
+import numpy as np
+
+
+def pcm_scale(dtype):
+    """
+    Scale factor that maps samples of the given dtype into the [-1.0, 1.0] float range.
+
+    Parameters:
+      dtype: numpy dtype of the incoming audio samples
+    Returns:
+      scale: multiplier for integer PCM, 1.0 for audio that is already floating point
+    """
+    dtype = np.dtype(dtype)
+    if np.issubdtype(dtype, np.integer):
+        return 1.0 / np.iinfo(dtype).max
+    return 1.0
+
+
+class AudioRingBuffer:
+    """
+    Fixed-capacity float32 ring buffer for streaming microphone audio.
+
+    Every sample is written twice, once in the ring and once in a mirror placed
+    right after it, so the most recent `n` samples are always one contiguous
+    slice of the backing array. Appends cost O(chunk) and windows are returned
+    as views, so no new array is allocated per Gradio callback.
+    """
+
+    def __init__(self, capacity: int, sampling_rate: int):
+        self.capacity = int(capacity)
+        self.sampling_rate = sampling_rate
+        self._data = np.zeros(2 * self.capacity, dtype=np.float32)
+        self._write = 0
+        self.size = 0
+        self.total_samples = 0
+
+    @classmethod
+    def from_seconds(cls, seconds: float, sampling_rate: int):
+        """
+        Create a buffer holding `seconds` of audio at `sampling_rate`.
+        """
+        return cls(int(seconds * sampling_rate), sampling_rate)
+
+    def append(self, chunk: np.ndarray):
+        """
+        Convert a raw microphone chunk to float32 and write it into the ring.
+
+        Integer PCM is scaled by its full-scale value instead of the chunk peak, so
+        the gain stays consistent across chunks and silent chunks cannot divide by zero.
+
+        Parameters:
+          chunk: 1-D (mono) or 2-D (samples, channels) numpy array of audio samples
+        """
+        # The scale depends on the PCM dtype, so take it before the downmix turns integers into floats
+        scale = pcm_scale(chunk.dtype)
+        if chunk.ndim == 2:
+            chunk = chunk.mean(axis=1, dtype=np.float32)
+        self.total_samples += len(chunk)
+        if len(chunk) > self.capacity:
+            chunk = chunk[-self.capacity:]
+
+        n = len(chunk)
+        first = min(n, self.capacity - self._write)
+        for start, part in ((self._write, chunk[:first]), (0, chunk[first:])):
+            if len(part) == 0:
+                continue
+            end = start + len(part)
+            np.multiply(part, scale, out=self._data[start:end], casting="unsafe")
+            self._data[start + self.capacity:end + self.capacity] = self._data[start:end]
+
+        self._write = (self._write + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def latest(self, num_samples: int) -> np.ndarray:
+        """
+        Return a view over the most recent `num_samples` samples, oldest first.
+
+        The view is only valid until the next `append`; copy it if it must outlive the callback.
+        """
+        num_samples = min(int(num_samples), self.size)
+        end = self._write + self.capacity
+        return self._data[end - num_samples:end]
+
+    def window(self, seconds: float) -> np.ndarray:
+        """
+        Return a view over the most recent `seconds` of audio.
+        """
+        return self.latest(int(seconds * self.sampling_rate))
+
+    def clear(self):
+        """
+        Drop the buffered audio without releasing the backing array.
+        """
+        self._write = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+
+class EnergyEndpointer:
+    """
+    Lightweight frame-energy voice activity detector and utterance endpointer.
+
+    Each chunk is split into short frames whose energy is compared against a fixed
+    floor and an adaptive estimate of the background noise. A chunk counts as
+    speech when enough of its frames are voiced, and an utterance is finalized
+    once trailing silence reaches `endpoint_silence_seconds`.
+    """
+
+    def __init__(
+        self,
+        sampling_rate: int,
+        threshold_db: float = -45.0,
+        noise_margin_db: float = 10.0,
+        frame_seconds: float = 0.03,
+        min_speech_seconds: float = 0.09,
+        endpoint_silence_seconds: float = 0.8,
+    ):
+        self.sampling_rate = sampling_rate
+        self.threshold_db = threshold_db
+        self.noise_margin_db = noise_margin_db
+        self.frame_length = max(1, int(frame_seconds * sampling_rate))
+        self.min_speech_frames = max(1, int(round(min_speech_seconds / frame_seconds)))
+        self.endpoint_silence_seconds = endpoint_silence_seconds
+        self.noise_floor_db = threshold_db - noise_margin_db
+        self.in_utterance = False
+        self.trailing_silence = 0.0
+
+    def frame_levels(self, chunk: np.ndarray) -> np.ndarray:
+        """
+        Return the energy of each complete frame of a float chunk, in dBFS.
+        """
+        n_frames = len(chunk) // self.frame_length
+        if n_frames == 0:
+            return np.empty(0, dtype=np.float32)
+        frames = chunk[:n_frames * self.frame_length].reshape(n_frames, self.frame_length)
+        energy = np.einsum("ij,ij->i", frames, frames) / self.frame_length
+        return 10.0 * np.log10(energy + 1e-10)
+
+    def update(self, chunk: np.ndarray):
+        """
+        Classify a float32 chunk and advance the endpointing state.
+
+        Parameters:
+          chunk: mono float audio in the [-1.0, 1.0] range
+        Returns:
+          is_speech: whether the chunk contains speech
+          endpoint: whether this chunk closes the current utterance
+        """
+        levels = self.frame_levels(chunk)
+        threshold = max(self.threshold_db, self.noise_floor_db + self.noise_margin_db)
+        voiced = levels > threshold
+
+        silent_levels = levels[~voiced]
+        if len(silent_levels):
+            # Track the background level slowly so loud rooms do not look like speech
+            self.noise_floor_db = 0.95 * self.noise_floor_db + 0.05 * float(np.mean(silent_levels))
+
+        is_speech = int(np.count_nonzero(voiced)) >= self.min_speech_frames
+        if is_speech:
+            last_voiced = int(np.flatnonzero(voiced)[-1])
+            self.in_utterance = True
+            self.trailing_silence = (len(levels) - 1 - last_voiced) * self.frame_length / self.sampling_rate
+        else:
+            self.trailing_silence += len(chunk) / self.sampling_rate
+
+        endpoint = self.in_utterance and self.trailing_silence >= self.endpoint_silence_seconds
+        if endpoint:
+            self.in_utterance = False
+        return is_speech, endpoint
+
+    def reset(self):
+        self.in_utterance = False
+        self.trailing_silence = 0.0
+
+
+class StreamingResampler:
+    """
+    Linear-interpolation resampler that keeps its phase across chunks.
+
+    Like `resample` in the Chapter 6 utilities it uses `np.interp`, but the
+    position of the next output sample is carried over, so chunk boundaries do
+    not introduce gaps or duplicated samples.
+    """
+
+    def __init__(self, src_sample_rate: int, dst_sample_rate: int):
+        self.ratio = src_sample_rate / dst_sample_rate
+        self.passthrough = src_sample_rate == dst_sample_rate
+        self._next_position = 0.0  # source index of the next output sample
+        self._consumed = 0  # source samples seen so far
+        self._last = None
+
+    def process(self, chunk: np.ndarray) -> np.ndarray:
+        if self.passthrough:
+            return chunk
+        if self._last is None:
+            source, first_index = chunk, self._consumed
+        else:
+            source, first_index = np.concatenate(([self._last], chunk)), self._consumed - 1
+        last_index = self._consumed + len(chunk) - 1
+        count = int(np.floor((last_index - self._next_position) / self.ratio)) + 1 if len(chunk) else 0
+        count = max(count, 0)
+        positions = self._next_position + np.arange(count) * self.ratio
+        resampled = np.interp(positions - first_index, np.arange(len(source)), source).astype(np.float32)
+        self._next_position += count * self.ratio
+        self._consumed += len(chunk)
+        if len(chunk):
+            self._last = chunk[-1]
+        return resampled
+
+
+class StreamingFeatureCache:
+    """
+    Incremental Whisper log-mel front end for streaming windows.
+
+    Log-mel frames are computed once, as soon as the audio under them has
+    arrived, and kept in a ring of `capacity_seconds`. Building the features of a
+    new window reuses the cached frames and only computes the few trailing frames
+    that still overlap the end of the audio, so the STFT cost per chunk scales
+    with the chunk length rather than the window length.
+
+    The frames match `WhisperFeatureExtractor`: a periodic Hann window, centered
+    frames with reflect padding at the start of the stream, the extractor's own
+    mel filters and `log10` with a 1e-10 floor. Windows are zero-padded to 30
+    seconds and normalized exactly like the extractor does. A window that starts
+    later in the stream differs from the extractor run on that window alone only
+    in its first two frames, which see the audio before the window instead of
+    reflect padding.
+    """
+
+    def __init__(self, feature_extractor, capacity_seconds: float = 30.0):
+        self.sampling_rate = feature_extractor.sampling_rate
+        self.hop_length = feature_extractor.hop_length
+        self.n_fft = feature_extractor.n_fft
+        self.nb_max_frames = feature_extractor.nb_max_frames
+        self.mel_filters = np.asarray(feature_extractor.mel_filters, dtype=np.float32)
+        self.hann = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(self.n_fft) / self.n_fft)).astype(np.float32)
+        self.capacity = max(int(capacity_seconds * self.sampling_rate / self.hop_length), self.nb_max_frames)
+        self._frames = np.zeros((self.capacity, self.mel_filters.shape[1]), dtype=np.float32)
+        self.frames_done = 0
+        self.total_samples = 0
+        self._pending = np.zeros(0, dtype=np.float32)  # padded samples from frame `frames_done` onwards
+        self._started = False
+
+    def _log_mel(self, padded: np.ndarray, n_frames: int) -> np.ndarray:
+        frames = np.lib.stride_tricks.sliding_window_view(padded, self.n_fft)[::self.hop_length][:n_frames]
+        power = np.abs(np.fft.rfft(frames * self.hann, axis=-1)) ** 2
+        return np.log10(np.maximum(power.astype(np.float32) @ self.mel_filters, 1e-10))
+
+    def append(self, samples: np.ndarray):
+        """
+        Add 16 kHz float samples and compute every frame whose audio is now complete.
+        """
+        self.total_samples += len(samples)
+        self._pending = np.concatenate((self._pending, samples.astype(np.float32, copy=False)))
+        half = self.n_fft // 2
+        if not self._started:
+            if len(self._pending) <= half:
+                return
+            # Centered frames: reflect-pad the very beginning of the stream
+            self._pending = np.concatenate((self._pending[1:half + 1][::-1], self._pending))
+            self._started = True
+
+        n_frames = (len(self._pending) - self.n_fft) // self.hop_length + 1
+        if n_frames <= 0:
+            return
+        log_mel = self._log_mel(self._pending, n_frames)
+        self._frames[(self.frames_done + np.arange(n_frames)) % self.capacity] = log_mel
+        self.frames_done += n_frames
+        self._pending = self._pending[n_frames * self.hop_length:]
+
+    def features(self, start_sample: int) -> np.ndarray:
+        """
+        Return normalized input features for the window starting at `start_sample`.
+
+        Parameters:
+          start_sample: window start, in 16 kHz samples since the stream began
+        Returns:
+          input_features: float32 array of shape (n_mels, 3000)
+        """
+        half = self.n_fft // 2
+        start_frame = max(start_sample // self.hop_length, self.frames_done - self.capacity + 1, 0)
+        # Frames centered further than half an FFT past the audio only see zero padding
+        end_frame = min(start_frame + self.nb_max_frames, -(-(self.total_samples + half) // self.hop_length))
+        cached_end = min(self.frames_done, end_frame)
+
+        n_mels = self.mel_filters.shape[1]
+        log_spec = np.full((self.nb_max_frames, n_mels), np.log10(1e-10), dtype=np.float32)
+        n_cached = max(cached_end - start_frame, 0)
+        if n_cached:
+            log_spec[:n_cached] = self._frames[(start_frame + np.arange(n_cached)) % self.capacity]
+
+        first_tail = max(cached_end, start_frame)
+        n_tail = end_frame - first_tail
+        if n_tail > 0:
+            # Trailing frames still overlap the end of the audio: compute them against zero padding
+            pending = self._pending if self._started else np.concatenate((np.zeros(half, dtype=np.float32), self._pending))
+            offset = (first_tail - self.frames_done) * self.hop_length
+            needed = offset + (n_tail - 1) * self.hop_length + self.n_fft
+            padded = np.zeros(max(needed, len(pending)), dtype=np.float32)
+            padded[:len(pending)] = pending
+            position = first_tail - start_frame
+            log_spec[position:position + n_tail] = self._log_mel(padded[offset:], n_tail)
+
+        log_spec = np.maximum(log_spec, log_spec.max() - 8.0)
+        return ((log_spec + 4.0) / 4.0).T
+
+
+class CachedFeatureTranscriber:
+    """
+    Streams audio into a `StreamingFeatureCache` and decodes windows from it.
+
+    Wraps a Transformers ASR pipeline, bypassing its feature extraction: the
+    cached features go straight to `model.generate` and token timestamps are
+    grouped into words, so the output has the same shape as
+    `pipeline(..., return_timestamps="word")`.
+    """
+
+    def __init__(self, transcriber, capacity_seconds: float = 30.0):
+        self.model = transcriber.model
+        self.tokenizer = transcriber.tokenizer
+        self.cache = StreamingFeatureCache(transcriber.feature_extractor, capacity_seconds)
+        self._resampler = None
+        self._special_ids = set(self.tokenizer.all_special_ids)
+        self._timestamp_begin = self.tokenizer.convert_tokens_to_ids("<|0.00|>")
+
+    def append(self, chunk: np.ndarray, sampling_rate: int):
+        """
+        Resample a float chunk to the model's rate and extend the feature cache.
+        """
+        if self._resampler is None:
+            self._resampler = StreamingResampler(sampling_rate, self.cache.sampling_rate)
+        self.cache.append(self._resampler.process(chunk))
+
+    def transcribe_from(self, start_seconds: float):
+        """
+        Decode the window from `start_seconds` to the end of the audio seen so far.
+
+        Returns:
+          output: {"text": ..., "chunks": [{"text": word, "timestamp": (start, end)}, ...]}
+            with timestamps relative to `start_seconds`
+        """
+        import torch
+
+        start_sample = int(round(start_seconds * self.cache.sampling_rate))
+        features = torch.from_numpy(self.cache.features(start_sample))[None]
+        features = features.to(self.model.device, dtype=self.model.dtype)
+        # Frame alignment may move the window start back by a fraction of a hop
+        shift = (start_sample - start_sample // self.cache.hop_length * self.cache.hop_length) / self.cache.sampling_rate
+        with torch.no_grad():
+            generated = self.model.generate(input_features=features, return_token_timestamps=True)
+
+        tokens = generated.sequences[0].tolist()
+        times = generated.token_timestamps[0].tolist()
+        words, current = [], None
+        for i, token in enumerate(tokens):
+            if token in self._special_ids or token >= self._timestamp_begin:
+                continue
+            piece = self.tokenizer.decode([token])
+            end = times[i + 1] if i + 1 < len(times) else times[i]
+            if current is None or piece.startswith(" "):
+                current = {"text": piece.strip(), "timestamp": [times[i] - shift, end - shift]}
+                words.append(current)
+            else:
+                current["text"] += piece
+                current["timestamp"][1] = end - shift
+        chunks = [
+            {"text": " " + word["text"], "timestamp": (max(word["timestamp"][0], 0.0), max(word["timestamp"][1], 0.0))}
+            for word in words if word["text"]
+        ]
+        return {"text": "".join(chunk["text"] for chunk in chunks), "chunks": chunks}
+
+
+Word = namedtuple('Word', ['text', 'start', 'end'])
+
+# Actions returned by LocalAgreementStreamer.plan_chunk
+DECODE = "decode"
+FINALIZE = "finalize"
+
+
+def normalize_word(text):
+    """
+    Lower-case a word and strip surrounding punctuation so hypotheses can be compared.
+    """
+    return text.strip().lower().strip(".,!?;:\"'")
+
+
+class LocalAgreementStreamer:
+    """
+    Incremental streaming decoder following the LocalAgreement policy.
+
+    Only the uncommitted tail of the audio is re-decoded on each iteration. A word
+    is committed once two consecutive hypotheses agree on it, after which the
+    window start moves past it, so committed text never changes and the decoded
+    window, and therefore compute per second of audio, stays bounded.
+
+    With an `endpointer`, `process_chunk` skips inference on non-speech chunks and
+    finalizes the utterance after enough trailing silence. With a `feature_cache`,
+    log-mel frames are computed once per chunk and reused by every window.
+    """
+
+    def __init__(
+        self,
+        transcriber,
+        sampling_rate: int,
+        max_window_seconds: float = 15.0,
+        buffer_seconds: float = 30.0,
+        endpointer: EnergyEndpointer = None,
+        preroll_seconds: float = 0.3,
+        feature_cache: CachedFeatureTranscriber = None,
+    ):
+        self.transcriber = transcriber
+        self.feature_cache = feature_cache
+        self.audio = AudioRingBuffer.from_seconds(max(buffer_seconds, max_window_seconds), sampling_rate)
+        self.max_window_seconds = max_window_seconds
+        self.endpointer = endpointer
+        self.preroll_seconds = preroll_seconds
+        self.committed = []
+        self.tentative = []
+        self.utterances = []
+        self._window_start = 0  # absolute sample index where the uncommitted window starts
+        # The committed text only grows, so it is extended as words are committed instead of
+        # re-joined from all committed words on every chunk
+        self._closed_text = ""  # finalized utterances, one per line
+        self._open_text = ""  # committed words of the current utterance
+        self._committed_text = ""
+
+    @property
+    def sampling_rate(self):
+        return self.audio.sampling_rate
+
+    @property
+    def committed_text(self):
+        # Finalized utterances are shown one per line
+        return self._committed_text
+
+    def _update_committed_text(self):
+        self._committed_text = "\n".join(text for text in (self._closed_text, self._open_text) if text)
+
+    @property
+    def tentative_text(self):
+        return " ".join(word.text for word in self.tentative)
+
+    def insert_audio(self, chunk: np.ndarray):
+        """
+        Append a microphone chunk to the audio buffer.
+        """
+        self.audio.append(chunk)
+        if self.feature_cache is not None:
+            self.feature_cache.append(self.audio.latest(len(chunk)), self.sampling_rate)
+
+    def uncommitted_window(self) -> np.ndarray:
+        """
+        Return a view over the audio that has not been committed yet.
+        """
+        oldest = self.audio.total_samples - self.audio.size
+        self._window_start = max(self._window_start, oldest)
+        return self.audio.latest(self.audio.total_samples - self._window_start)
+
+    def _words_from_output(self, output, window_length: int):
+        """
+        Convert word-level pipeline output for the uncommitted window to absolute timestamps.
+        """
+        offset = self._window_start / self.sampling_rate
+        window_end = window_length / self.sampling_rate
+        words = []
+        for chunk in output.get("chunks", []):
+            start, end = chunk["timestamp"]
+            text = chunk["text"].strip()
+            if start is None or not text:
+                continue
+            end = window_end if end is None else end
+            words.append(Word(text, offset + start, offset + end))
+        return words
+
+    def _commit(self, words):
+        if not words:
+            return
+        self.committed.extend(words)
+        text = " ".join(word.text for word in words)
+        self._open_text = f"{self._open_text} {text}" if self._open_text else text
+        self._update_committed_text()
+        self._window_start = max(self._window_start, int(words[-1].end * self.sampling_rate))
+
+    def apply_output(self, output, window_length: int):
+        """
+        Merge the transcriber output for the uncommitted window into the transcript.
+
+        Commits the prefix the new hypothesis shares with the previous one. This is
+        split from `process_iter` so the window can be decoded elsewhere, e.g. in a
+        batch shared with other streams.
+
+        Parameters:
+          output: pipeline output for the window, requested with `return_timestamps="word"`
+          window_length: number of samples in the decoded window
+        Returns:
+          committed_text: text that is final and will not change
+          tentative_text: latest hypothesis for the audio after the committed text
+        """
+        hypothesis = self._words_from_output(output, window_length)
+
+        agreed = 0
+        for previous, current in zip(self.tentative, hypothesis):
+            if normalize_word(previous.text) != normalize_word(current.text):
+                break
+            agreed += 1
+        self._commit(hypothesis[:agreed])
+        self.tentative = hypothesis[agreed:]
+
+        # Keep the decoded window bounded even when hypotheses keep disagreeing
+        if window_length > self.max_window_seconds * self.sampling_rate:
+            if len(self.tentative) > 1:
+                self._commit(self.tentative[:-1])
+                self.tentative = self.tentative[-1:]
+            elif not hypothesis:
+                self._window_start = self.audio.total_samples - int(self.max_window_seconds / 2 * self.sampling_rate)
+
+        return self.committed_text, self.tentative_text
+
+    def process_iter(self):
+        """
+        Re-decode the uncommitted window and commit the prefix both hypotheses agree on.
+
+        Returns:
+          committed_text: text that is final and will not change
+          tentative_text: latest hypothesis for the audio after the committed text
+        """
+        window = self.uncommitted_window()
+        if len(window) == 0:
+            return self.committed_text, self.tentative_text
+        if self.feature_cache is not None:
+            output = self.feature_cache.transcribe_from(self._window_start / self.sampling_rate)
+        else:
+            output = self.transcriber(
+                {"sampling_rate": self.sampling_rate, "raw": window}, return_timestamps="word"
+            )
+        return self.apply_output(output, len(window))
+
+    def finish(self):
+        """
+        Commit the remaining tentative words and start a fresh window after them.
+
+        Returns:
+          committed_text: the full committed transcript
+        """
+        self._commit(self.tentative)
+        self.tentative = []
+        self._window_start = self.audio.total_samples
+        start = self.utterances[-1][1] if self.utterances else 0
+        if len(self.committed) > start:
+            self.utterances.append((start, len(self.committed)))
+            self._closed_text = "\n".join(text for text in (self._closed_text, self._open_text) if text)
+            self._open_text = ""
+        return self.committed_text
+
+    def plan_chunk(self, chunk: np.ndarray):
+        """
+        Append a chunk and decide, with the endpointer, what should happen to it.
+
+        Silence outside an utterance only moves the window start forward (keeping a
+        short pre-roll) and silence inside one is buffered without inference.
+
+        Returns:
+          action: None to skip inference, DECODE to re-decode the uncommitted window,
+            or FINALIZE to decode it once more and then call `finish`
+        """
+        self.insert_audio(chunk)
+        if self.endpointer is None:
+            return DECODE
+
+        is_speech, endpoint = self.endpointer.update(self.audio.latest(len(chunk)))
+        if endpoint:
+            return FINALIZE
+        if is_speech:
+            return DECODE
+        if not self.endpointer.in_utterance:
+            preroll = int(self.preroll_seconds * self.sampling_rate)
+            self._window_start = max(self._window_start, self.audio.total_samples - preroll)
+        return None
+
+    def process_chunk(self, chunk: np.ndarray):
+        """
+        Append a chunk and decode it only if the endpointer hears speech.
+
+        Returns:
+          committed_text: text that is final and will not change
+          tentative_text: latest hypothesis for the audio after the committed text
+        """
+        action = self.plan_chunk(chunk)
+        if action is not None:
+            self.process_iter()
+        if action == FINALIZE:
+            self.finish()
+        return self.committed_text, self.tentative_text
+
+
+class CascadeStreamer(LocalAgreementStreamer):
+    """
+    Two-tier streaming decoder: fast partials, accurate finals.
+
+    Partial hypotheses come from the first of `partial_transcribers` (ordered from
+    most accurate to fastest) that keeps up with the stream. When the rolling
+    real-time factor of partial decoding exceeds `rtf_budget`, the re-decode
+    backlog grows or the machine is overloaded, the next faster model takes over;
+    when there is headroom again it moves back up. Each finalized utterance is
+    re-decoded by `final_transcriber` in a background worker pool, and its text
+    replaces the partial transcript once ready.
+    """
+
+    def __init__(
+        self,
+        partial_transcribers,
+        final_transcriber,
+        sampling_rate: int,
+        rtf_budget: float = 0.5,
+        max_workers: int = 1,
+        utterance_padding_seconds: float = 0.2,
+        **kwargs,
+    ):
+        if kwargs.get("feature_cache") is not None:
+            raise ValueError("CascadeStreamer switches models, so it cannot share one feature cache")
+        super().__init__(self._transcribe_partial, sampling_rate, **kwargs)
+        self.partial_transcribers = list(partial_transcribers)
+        self.final_transcriber = final_transcriber
+        self.level = 0
+        self.rtf_budget = rtf_budget
+        self.max_workers = max_workers
+        self.utterance_padding_seconds = utterance_padding_seconds
+        self.finals = {}
+        self._lines = []  # text shown for each finalized utterance, partial until its final is ready
+        self._pending_finals = set()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._timings = deque(maxlen=20)
+        self._decoded_samples = 0
+
+    @property
+    def partial_rtf(self):
+        audio = sum(seconds for seconds, _ in self._timings)
+        return sum(compute for _, compute in self._timings) / audio if audio else 0.0
+
+    @property
+    def backlog(self):
+        return sum(1 for future in self.finals.values() if not future.done())
+
+    def _under_pressure(self):
+        if self.backlog > self.max_workers:
+            return True
+        if hasattr(os, "getloadavg"):
+            return os.getloadavg()[0] > (os.cpu_count() or 1)
+        return False
+
+    def _adapt(self):
+        if len(self._timings) < 5:
+            return
+        if (self.partial_rtf > self.rtf_budget or self._under_pressure()) and self.level < len(self.partial_transcribers) - 1:
+            self.level += 1
+            self._timings.clear()
+        elif self.partial_rtf < self.rtf_budget / 2 and not self._under_pressure() and self.level > 0:
+            self.level -= 1
+            self._timings.clear()
+
+    def _transcribe_partial(self, inputs, **kwargs):
+        start = time.perf_counter()
+        output = self.partial_transcribers[self.level](inputs, **kwargs)
+        new_audio = (self.audio.total_samples - self._decoded_samples) / self.sampling_rate
+        self._decoded_samples = self.audio.total_samples
+        self._timings.append((max(new_audio, 1e-3), time.perf_counter() - start))
+        self._adapt()
+        return output
+
+    def _transcribe_final(self, audio):
+        return self.final_transcriber({"sampling_rate": self.sampling_rate, "raw": audio})["text"].strip()
+
+    def finish(self):
+        """
+        Finalize the utterance and queue it for re-decoding with the final model.
+        """
+        utterance_count = len(self.utterances)
+        text = super().finish()
+        if len(self.utterances) > utterance_count:
+            # Built after finish() committed the last tentative words, so a failed final loses nothing
+            start, end = self.utterances[-1]
+            self._lines.append(" ".join(word.text for word in self.committed[start:end]))
+            padding = self.utterance_padding_seconds
+            oldest = self.audio.total_samples - self.audio.size
+            first = max(int((self.committed[start].start - padding) * self.sampling_rate), oldest)
+            last = min(int((self.committed[end - 1].end + padding) * self.sampling_rate), self.audio.total_samples)
+            if last > first:
+                audio = self.audio.latest(self.audio.total_samples - first)[:last - first].copy()
+                self.finals[len(self.utterances) - 1] = self._pool.submit(self._transcribe_final, audio)
+                self._pending_finals.add(len(self.utterances) - 1)
+        return text
+
+    @property
+    def committed_text(self):
+        # Only the finals still in flight are checked; the text is rebuilt when one of them lands
+        done = [index for index in self._pending_finals if self.finals[index].done()]
+        if done:
+            for index in done:
+                self._pending_finals.discard(index)
+                if self.finals[index].exception() is None:
+                    self._lines[index] = self.finals[index].result()
+            self._closed_text = "\n".join(line for line in self._lines if line)
+            self._update_committed_text()
+        return self._committed_text
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
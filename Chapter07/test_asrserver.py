@@ -0,0 +1,105 @@
+import asyncio
+import json
+import threading
+
+import numpy as np
+import pytest
+
+from asrserver import MicroBatcher, StreamingASRServer, stream_client
+
+
+class FakeTranscriber:
+    """
+    Stands in for the Transformers pipeline: one word per window, and a record of every batch.
+    """
+
+    def __init__(self, release: threading.Event = None):
+        self.batches = []
+        self.release = release
+
+    def __call__(self, inputs, batch_size=None, return_timestamps=None):
+        if self.release is not None:
+            self.release.wait(5)
+        self.batches.append(len(inputs))
+        return [{"chunks": [{"text": " hello", "timestamp": (0.0, 0.1)}]} for _ in inputs]
+
+
+async def start_server(transcriber, **kwargs):
+    server = StreamingASRServer(transcriber, use_endpointer=False, **kwargs)
+    tcp_server = await server.start("127.0.0.1", 0)
+    return server, tcp_server.sockets[0].getsockname()[1]
+
+
+def test_sessions_share_batches_and_keep_their_own_stats():
+    transcriber = FakeTranscriber()
+    audio = np.random.default_rng(0).uniform(-0.5, 0.5, 16000).astype(np.float32)
+
+    async def run():
+        server, port = await start_server(transcriber, batch_interval_ms=50)
+        try:
+            finals = await asyncio.gather(
+                *[stream_client(audio, 16000, port=port, chunk_seconds=0.25, realtime=False) for _ in range(4)]
+            )
+        finally:
+            await server.stop()
+        return server, finals
+
+    server, finals = asyncio.run(run())
+
+    assert max(transcriber.batches) > 1
+    assert sum(transcriber.batches) == 4 * 4
+    assert sorted(final["stats"]["session"] for final in finals) == [1, 2, 3, 4]
+    for final in finals:
+        assert final["committed"].startswith("hello")
+        assert final["stats"]["frames"] == final["stats"]["decoded_frames"] == 4
+    # Closed sessions leave the live table but stay in the report
+    assert server.sessions == {}
+    assert len(server.report()) == 4
+
+
+@pytest.mark.parametrize("handshake", [b"not json\n", b"{}\n", b"[16000]\n", b'{"sampling_rate": -1}\n'])
+def test_bad_handshake_is_answered_and_closed(handshake):
+    async def run():
+        server, port = await start_server(FakeTranscriber())
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(handshake)
+            await writer.drain()
+            reply, rest = await reader.readline(), await reader.read()
+            writer.close()
+            await asyncio.sleep(0)
+        finally:
+            await server.stop()
+        return server, json.loads(reply), rest
+
+    server, reply, rest = asyncio.run(run())
+
+    assert reply["error"].startswith("bad handshake")
+    assert rest == b""
+    assert server.sessions == {}
+    assert [summary["frames"] for summary in server.report()] == [0]
+
+
+def test_stop_fails_pending_and_in_flight_requests():
+    release = threading.Event()
+    transcriber = FakeTranscriber(release)
+
+    async def run():
+        batcher = MicroBatcher(transcriber, batch_interval_ms=10, max_batch_size=1)
+        batcher.start()
+        window = np.zeros(1600, dtype=np.float32)
+        requests = [asyncio.ensure_future(batcher.submit(window, 16000)) for _ in range(2)]
+        while not batcher._in_flight:
+            await asyncio.sleep(0.01)
+        await batcher.stop()
+        results = await asyncio.gather(*requests, return_exceptions=True)
+        with pytest.raises(ConnectionAbortedError):
+            await batcher.submit(window, 16000)
+        return results
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        release.set()
+
+    assert [type(result) for result in results] == [ConnectionAbortedError, ConnectionAbortedError]
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from streamutils import AudioRingBuffer, CascadeStreamer, StreamingFeatureCache
+
+
+def test_append_normalizes_stereo_int16():
+    buffer = AudioRingBuffer(capacity=8, sampling_rate=16000)
+    chunk = np.array([[32767, 32767], [-32767, -32767], [16384, 0], [0, 0]], dtype=np.int16)
+    buffer.append(chunk)
+
+    window = buffer.latest(4)
+    assert window.dtype == np.float32
+    np.testing.assert_allclose(window, [1.0, -1.0, 8192 / 32767, 0.0], rtol=1e-6)
+
+
+def test_append_matches_mono_int16():
+    mono, stereo = AudioRingBuffer(16, 16000), AudioRingBuffer(16, 16000)
+    samples = np.arange(-6000, 6000, 1000, dtype=np.int16)
+    mono.append(samples)
+    stereo.append(np.stack([samples, samples], axis=1))
+    np.testing.assert_allclose(stereo.latest(len(samples)), mono.latest(len(samples)), rtol=1e-6)
+
+
+def _words(*texts):
+    return {"chunks": [{"text": f" {text}", "timestamp": (0.1 * i, 0.1 * i + 0.1)} for i, text in enumerate(texts)]}
+
+
+def _cascade_utterance(final_transcriber):
+    streamer = CascadeStreamer([lambda inputs, **kwargs: None], final_transcriber, 16000)
+    streamer.insert_audio(np.zeros(16000, dtype=np.float32))
+    streamer.apply_output(_words("hello", "world"), 16000)
+    streamer.apply_output(_words("hello", "there"), 16000)  # commits "hello", "there" stays tentative
+    streamer.finish()
+    streamer.shutdown(wait=True)
+    return streamer
+
+
+def test_cascade_keeps_tentative_words_when_final_fails():
+    def failing_final(inputs):
+        raise RuntimeError("final model crashed")
+
+    streamer = _cascade_utterance(failing_final)
+    assert streamer.committed_text == "hello there"
+
+
+def test_cascade_replaces_line_with_final():
+    streamer = _cascade_utterance(lambda inputs: {"text": " Hello there."})
+    assert streamer.committed_text == "Hello there."
+
+
+def test_feature_cache_matches_whisper_feature_extractor():
+    transformers = pytest.importorskip("transformers")
+    extractor = transformers.WhisperFeatureExtractor()
+    sampling_rate = extractor.sampling_rate
+    rng = np.random.default_rng(0)
+    audio = (0.01 * rng.standard_normal(40 * sampling_rate)).astype(np.float32)
+    tone = 0.5 * np.sin(2 * np.pi * 440 * np.arange(sampling_rate) / sampling_rate)
+    for second in (5, 20, 35):
+        audio[second * sampling_rate:(second + 1) * sampling_rate] += tone
+
+    def reference(start, end):
+        return extractor(audio[start:end], sampling_rate=sampling_rate, return_tensors="np").input_features[0]
+
+    cache = StreamingFeatureCache(extractor, capacity_seconds=30.0)
+    fed = 0
+    checked_start = False
+    while fed < len(audio):
+        size = int(rng.integers(1, 8000))
+        cache.append(audio[fed:fed + size])
+        fed = min(fed + size, len(audio))
+        if not checked_start and fed > 8 * sampling_rate:
+            np.testing.assert_allclose(cache.features(0), reference(0, fed), atol=1e-4)
+            checked_start = True
+
+    # The first 10 seconds have been evicted from the 30-second ring by now
+    start = 12 * sampling_rate
+    oldest_frame = cache.frames_done - cache.capacity + 1
+    assert 0 < oldest_frame <= start // cache.hop_length
+    features = cache.features(start)
+    # Apart from the first two frames, which see the audio before the window instead of reflect padding
+    np.testing.assert_allclose(features[:, 2:], reference(start, None)[:, 2:], atol=1e-4)
@@ -0,0 +1,236 @@
+"""
+Batched wav2vec2 emissions for WhisperX forced alignment.
+
+`whisperx.align` runs the alignment model once per transcript segment, one
+segment at a time. `align` computes the emissions of all segments up front
+from the shared 16 kHz buffer instead: on a GPU, segments are sorted by length
+and grouped into batches with little padding and a bounded number of samples;
+on the CPU, the segments are spread over a thread pool. WhisperX then aligns
+the text as usual, reading the precomputed emissions through
+`PrecomputedEmissions`, so its text cleaning and word timing logic are
+unchanged.
+
+Only models with a layer-norm feature extractor are batched. Group norm, used
+by the base wav2vec2 models such as whisperx's default English aligner,
+normalizes over the whole padded input, so those models get one forward pass
+per segment and their emissions stay the same as without batching.
+
+Usage:
+  alignment_model, metadata = whisperx.load_align_model(language_code="en", device=device)
+  result = align(segments, alignment_model, metadata, load_audio_memmap("audio16k.wav"), device)
+"""
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+
+from helpers import SAMPLING_RATE
+
+# whisperx pads shorter segments itself, those are left to the model
+MIN_SEGMENT_SAMPLES = 400
+
+
+def segment_bounds(segments, n_samples: int, sampling_rate: int = SAMPLING_RATE):
+    """
+    Sample ranges (start, stop) of the segments, sliced exactly like `whisperx.align` does.
+    """
+    bounds = []
+    for segment in segments:
+        start = int(segment["start"] * sampling_rate)
+        stop = min(int(segment["end"] * sampling_rate), n_samples)
+        bounds.append((start, max(start, stop)))
+    return bounds
+
+
+def segment_key(samples):
+    """
+    Identity of a segment's samples, used to hand the right emissions to `whisperx.align`.
+    """
+    samples = np.ascontiguousarray(samples, dtype=np.float32)
+    return len(samples), hashlib.blake2b(samples.tobytes(), digest_size=16).digest()
+
+
+def length_buckets(lengths, batch_size: int, max_batch_samples: int, max_padding: float = 0.1):
+    """
+    Group item indices into batches of similar length, longest first.
+
+    A batch is closed when it holds `batch_size` items, when its padded size
+    would exceed `max_batch_samples`, or when the next item is more than
+    `max_padding` shorter than the batch's longest, so padding stays small and
+    memory per batch is bounded.
+    """
+    batches, batch = [], []
+    for i in np.argsort(lengths, kind="stable")[::-1].tolist():
+        if batch and (
+            len(batch) == batch_size
+            or (len(batch) + 1) * lengths[batch[0]] > max_batch_samples
+            or lengths[i] < (1.0 - max_padding) * lengths[batch[0]]
+        ):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def supports_padded_batches(model, model_type: str):
+    """
+    Whether zero padding leaves the emissions of the shorter segments in a batch unchanged.
+
+    Group norm in the first convolution normalizes every channel over the whole
+    padded input, layer norm only over the channels of each frame.
+    """
+    if model_type == "huggingface":
+        return getattr(model.config, "feat_extract_norm", "group") == "layer"
+    if model_type == "torchaudio":
+        import torch
+
+        first_layer = model.feature_extractor.conv_layers[0]
+        return not isinstance(getattr(first_layer, "layer_norm", None), torch.nn.GroupNorm)
+    return False
+
+
+def _batch_logits(model, model_type: str, waveforms, device: str):
+    """
+    Raw logits (frames, vocab) of each waveform in one forward pass of the batch.
+    """
+    import torch
+
+    lengths = torch.as_tensor([len(waveform) for waveform in waveforms])
+    batch = torch.zeros(len(waveforms), int(lengths.max()))
+    for row, waveform in enumerate(waveforms):
+        batch[row, :len(waveform)] = torch.from_numpy(np.asarray(waveform, dtype=np.float32))
+    batch = batch.to(device)
+
+    with torch.inference_mode():
+        if model_type == "torchaudio":
+            logits, frames = model(batch, lengths.to(device) if len(waveforms) > 1 else None)
+            frames = frames.tolist() if frames is not None else [logits.shape[1]]
+        elif model_type == "huggingface":
+            # Only layer-norm models are batched, see supports_padded_batches
+            if len(waveforms) > 1:
+                mask = (torch.arange(batch.shape[1])[None, :] < lengths[:, None]).long().to(device)
+                logits = model(batch, attention_mask=mask).logits
+            else:
+                logits = model(batch).logits
+            frames = model._get_feat_extract_output_lengths(lengths).tolist()
+        else:
+            raise NotImplementedError(f"Align model of type {model_type} not supported.")
+    logits = logits.float().cpu()
+    return [logits[row, :int(n)] for row, n in enumerate(frames)]
+
+
+def compute_emissions(model, metadata: dict, audio, segments, device: str, batch_size: int = None,
+                      max_batch_seconds: float = 240.0, max_padding: float = 0.1, cpu_workers: int = None):
+    """
+    Alignment model logits of every segment, keyed by `segment_key`.
+
+    Parameters:
+      model, metadata: from `whisperx.load_align_model`
+      audio: 16 kHz mono samples, e.g. the memory map from `load_audio_memmap`
+      segments: transcript segments with "start" and "end" in seconds
+      batch_size: segments per forward pass; defaults to 16 on GPU and 1 on
+        CPU, where unpadded single segments give exactly the per-segment emissions.
+        Always 1 for models that `supports_padded_batches` rejects
+      max_batch_seconds: upper bound of padded audio per batch, bounding memory
+      cpu_workers: concurrent batches on the CPU, sharing torch's threads;
+        defaults to half of them
+    """
+    import torch
+
+    on_gpu = str(device).startswith("cuda")
+    batch_size = batch_size or (16 if on_gpu else 1)
+    if not supports_padded_batches(model, metadata["type"]):
+        batch_size = 1
+    bounds = [
+        (start, stop) for start, stop in segment_bounds(segments, len(audio)) if stop - start >= MIN_SEGMENT_SAMPLES
+    ]
+    if not bounds:
+        return {}
+    lengths = np.array([stop - start for start, stop in bounds])
+    batches = length_buckets(lengths, batch_size, int(max_batch_seconds * SAMPLING_RATE), max_padding)
+
+    def run(batch):
+        waveforms = [audio[bounds[i][0]:bounds[i][1]] for i in batch]
+        logits = _batch_logits(model, metadata["type"], waveforms, device)
+        return {segment_key(waveform): emission for waveform, emission in zip(waveforms, logits)}
+
+    emissions = {}
+    if on_gpu:
+        for batch in batches:
+            emissions.update(run(batch))
+        return emissions
+
+    threads = torch.get_num_threads()
+    workers = min(len(batches), cpu_workers or max(1, threads // 2))
+    torch.set_num_threads(max(1, threads // workers))
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for result in executor.map(run, batches):
+                emissions.update(result)
+    finally:
+        torch.set_num_threads(threads)
+    return emissions
+
+
+class PrecomputedEmissions:
+    """
+    Stands in for the alignment model inside `whisperx.align`, returning the
+    emissions computed by `compute_emissions` for each segment it is given.
+
+    Segments that were not precomputed, e.g. those shorter than 400 samples,
+    which whisperx pads, go through the real model.
+    """
+
+    def __init__(self, model, model_type: str, emissions: dict, device: str):
+        self.model = model
+        self.model_type = model_type
+        self.emissions = emissions
+        self.device = device
+        self.hits = self.misses = 0
+
+    def __call__(self, waveform, lengths=None):
+        emission = None
+        if lengths is None:
+            emission = self.emissions.get(segment_key(waveform[0].cpu().numpy()))
+        if emission is not None:
+            self.hits += 1
+            emission = emission[None]
+        else:
+            self.misses += 1
+            waveform = waveform.to(self.device)
+            if self.model_type == "torchaudio":
+                emission, _ = self.model(waveform, lengths=None if lengths is None else lengths.to(self.device))
+            else:
+                emission = self.model(waveform).logits
+            emission = emission.cpu()
+        return (emission, None) if self.model_type == "torchaudio" else SimpleNamespace(logits=emission)
+
+
+def align(segments, model, metadata: dict, audio, device: str, batch_size: int = None,
+          max_batch_seconds: float = 240.0, cpu_workers: int = None, **align_kwargs):
+    """
+    `whisperx.align` with batched or multi-threaded emissions, reading the audio from a buffer.
+
+    Parameters:
+      segments: transcript segments
+      model, metadata: from `whisperx.load_align_model`
+      audio: 16 kHz mono float32 samples; a memory map is only read segment by segment
+      device: device the alignment model is on
+      align_kwargs: passed on to `whisperx.align`, e.g. `return_char_alignments`
+    Returns:
+      result: the `whisperx.align` output, with "segments" and "word_segments"
+    """
+    import whisperx
+
+    emissions = compute_emissions(
+        model, metadata, audio, segments, device, batch_size, max_batch_seconds, cpu_workers=cpu_workers
+    )
+    # The precomputed emissions already live on the CPU, where whisperx runs the trellis search
+    return whisperx.align(
+        segments, PrecomputedEmissions(model, metadata["type"], emissions, device), metadata, audio, "cpu",
+        **align_kwargs,
+    )
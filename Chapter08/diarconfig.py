@@ -0,0 +1,138 @@
+"""
+NeMo diarization configuration from bundled, versioned templates.
+
+The inference YAML files are shipped in `diar_configs/v<nemo version>/`, so the
+configuration always matches the installed nemo_toolkit and nothing is
+downloaded at runtime. `write_manifest` lists any number of recordings in one
+manifest, so a single `NeuralDiarizer.diarize()` call processes a whole
+directory and writes one RTTM per recording to `<out_dir>/pred_rttms/`.
+
+Usage:
+  config = create_diarization_config("temp_outputs", ["a.wav", "b.wav"])
+  NeuralDiarizer(cfg=config).diarize()
+"""
+import json
+import os
+import sys
+
+NEMO_CONFIG_VERSION = "1.22.0"
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "diar_configs")
+AUDIO_EXTENSIONS = (".wav", ".flac", ".mp3", ".m4a", ".ogg", ".opus", ".mp4", ".mkv", ".webm")
+
+
+def config_template_path(domain: str = "telephonic", version: str = NEMO_CONFIG_VERSION):
+    """
+    Path of the bundled `diar_infer_<domain>.yaml` for a NeMo version.
+    """
+    path = os.path.join(CONFIG_DIR, f"v{version}", f"diar_infer_{domain}.yaml")
+    if not os.path.exists(path):
+        available = sorted(
+            f"{version_dir}/{name}"
+            for version_dir in (os.listdir(CONFIG_DIR) if os.path.isdir(CONFIG_DIR) else [])
+            for name in os.listdir(os.path.join(CONFIG_DIR, version_dir))
+        )
+        raise FileNotFoundError(f"No bundled diarization config {path}; available: {', '.join(available) or 'none'}")
+    return path
+
+
+def in_notebook():
+    """
+    Whether this process runs inside a Jupyter or Colab kernel.
+    """
+    shell = sys.modules.get("IPython") and sys.modules["IPython"].get_ipython()
+    return shell is not None and (type(shell).__name__ == "ZMQInteractiveShell" or "google.colab" in sys.modules)
+
+
+def default_num_workers():
+    """
+    Data loader workers for NeMo: 0 in notebooks, where worker processes hang
+    with IPython, otherwise up to 4.
+    """
+    return 0 if in_notebook() else min(4, os.cpu_count() or 1)
+
+
+def list_audio_files(directory: str, extensions=AUDIO_EXTENSIONS):
+    """
+    Audio files directly in `directory`, sorted by name.
+    """
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.lower().endswith(extensions) and not name.startswith(".")
+    )
+
+
+def recording_ids(audio_paths):
+    """
+    NeMo's output name of every recording: the file name without extension.
+
+    Raises ValueError when two recordings share a name, since their outputs
+    would overwrite each other. Call it before writing any file named after them.
+    """
+    uniq_ids = [os.path.splitext(os.path.basename(path))[0] for path in audio_paths]
+    if len(set(uniq_ids)) != len(uniq_ids):
+        duplicates = sorted({uniq_id for uniq_id in uniq_ids if uniq_ids.count(uniq_id) > 1})
+        raise ValueError(f"Recordings must have unique file names, found duplicates: {', '.join(duplicates)}")
+    return uniq_ids
+
+
+def write_manifest(audio_paths, manifest_path: str, num_speakers=None):
+    """
+    Write a NeMo diarization manifest with one line per recording.
+
+    NeMo names every output after the file name without extension, so the
+    names must be unique.
+
+    Parameters:
+      audio_paths: 16 kHz mono audio files
+      num_speakers: known number of speakers, one for all files, or a list per file
+    Returns:
+      uniq_ids: output name of every recording, in order
+    """
+    audio_paths = [os.path.abspath(path) for path in audio_paths]
+    uniq_ids = recording_ids(audio_paths)
+    if num_speakers is None or isinstance(num_speakers, int):
+        num_speakers = [num_speakers] * len(audio_paths)
+
+    os.makedirs(os.path.dirname(os.path.abspath(manifest_path)), exist_ok=True)
+    with open(manifest_path, "w", encoding="utf-8") as fp:
+        for path, speakers in zip(audio_paths, num_speakers):
+            meta = {
+                "audio_filepath": path,
+                "offset": 0,
+                "duration": None,
+                "label": "infer",
+                "text": "-",
+                "num_speakers": speakers,
+                "rttm_filepath": None,
+                "uem_filepath": None,
+            }
+            fp.write(json.dumps(meta) + "\n")
+    return uniq_ids
+
+
+def create_diarization_config(output_dir: str, audio_paths, domain: str = "telephonic",
+                              version: str = NEMO_CONFIG_VERSION, num_workers: int = None, num_speakers=None):
+    """
+    Load the bundled template and point it at a manifest of `audio_paths`.
+
+    Parameters:
+      output_dir: NeMo's `out_dir`; the manifest is written to `<output_dir>/data/`
+      audio_paths: one path or a list of paths, all diarized by one `diarize()` call
+      domain: "telephonic", or another domain whose template is bundled
+      num_workers: data loader workers, defaults to `default_num_workers()`
+      num_speakers: known speaker counts, see `write_manifest`; enables oracle speaker counting
+    """
+    from omegaconf import OmegaConf
+
+    if isinstance(audio_paths, str):
+        audio_paths = [audio_paths]
+    config = OmegaConf.load(config_template_path(domain, version))
+    manifest_path = os.path.join(output_dir, "data", "input_manifest.json")
+    write_manifest(audio_paths, manifest_path, num_speakers)
+
+    config.num_workers = default_num_workers() if num_workers is None else num_workers
+    config.diarizer.manifest_filepath = manifest_path
+    config.diarizer.out_dir = output_dir
+    config.diarizer.clustering.parameters.oracle_num_speakers = num_speakers is not None
+    return config
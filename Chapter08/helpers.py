@@ -0,0 +1,670 @@
+import hashlib
+import json
+import os
+import struct
+import subprocess
+from collections import namedtuple
+
+import numpy as np
+
+SAMPLING_RATE = 16000
+# RIFF header of an IEEE float WAV: the samples start at byte 44, aligned for float32 views
+FLOAT_WAV_HEADER = struct.Struct("<4sI4s4sIHHIIHH4sI")
+NUMERAL_SYMBOLS = "0123456789%$£"
+
+
+class WordSpeakerMapping(namedtuple('WordSpeakerMapping', ['words', 'start', 'end', 'speaker', 'word_index'])):
+    """
+    Columnar word-to-speaker mapping.
+
+    `words` is a list of strings; `start` and `end` (milliseconds), `speaker` and
+    `word_index` (position in the word timestamps it was built from) are NumPy
+    arrays of the same length.
+    """
+    __slots__ = ()
+
+    def __len__(self):
+        return len(self.words)
+
+    def to_dicts(self):
+        """
+        Convert to the list-of-dicts layout used throughout the notebook.
+        """
+        return [
+            {"word": word, "start_time": start, "end_time": end, "speaker": speaker}
+            for word, start, end, speaker in zip(
+                self.words, self.start.tolist(), self.end.tolist(), self.speaker.tolist()
+            )
+        ]
+
+    @classmethod
+    def from_dicts(cls, word_speaker_mapping):
+        """
+        Build the columnar mapping from a list of word/speaker dictionaries.
+        """
+        return cls(
+            [wrd_dict["word"] for wrd_dict in word_speaker_mapping],
+            np.array([wrd_dict["start_time"] for wrd_dict in word_speaker_mapping], dtype=np.int64),
+            np.array([wrd_dict["end_time"] for wrd_dict in word_speaker_mapping], dtype=np.int64),
+            np.array([wrd_dict["speaker"] for wrd_dict in word_speaker_mapping], dtype=np.int64),
+            np.arange(len(word_speaker_mapping), dtype=np.int64),
+        )
+
+
+class WordTimestamps(namedtuple('WordTimestamps', ['words', 'start', 'end', 'word_index'])):
+    """
+    Columnar word timestamps: `words` is a list of strings, `start` and `end`
+    (seconds) are float arrays, and `word_index` is the position of each
+    word's first token in the aligner output.
+    """
+    __slots__ = ()
+
+    def __len__(self):
+        return len(self.words)
+
+    def to_dicts(self):
+        """
+        Convert to the {"word", "start", "end"} dictionaries of the alignment output.
+        """
+        return [
+            {"word": word, "start": start, "end": end}
+            for word, start, end in zip(self.words, self.start.tolist(), self.end.tolist())
+        ]
+
+
+def fill_missing_timestamps_arrays(word_timestamps, initial_timestamp=0, final_timestamp=None):
+    """
+    Give every word a start and end, merging runs of words the aligner could not place.
+
+    The aligner leaves numbers, symbols and foreign words without timestamps.
+    Each run of such words is merged into one entry that spans the gap between
+    its aligned neighbours: it starts where the previous aligned word ends and
+    ends where the next one starts. Both neighbours are found for all words at
+    once, with a running maximum (forward fill) and a reversed running minimum
+    (back fill) over the aligned positions, so the cost is linear however long
+    the runs are. The input is not modified.
+
+    Parameters:
+      word_timestamps: list of {"word", "start", "end"} dictionaries, `start`
+        missing or None for unaligned words
+      initial_timestamp: start of a run at the very beginning, defaults to 0
+      final_timestamp: end of a run at the very end; without it the run gets
+        zero duration
+    Returns:
+      timestamps: `WordTimestamps` with one entry per aligned word or merged run
+    """
+    n = len(word_timestamps)
+    if n == 0:
+        return WordTimestamps([], np.zeros(0), np.zeros(0), np.zeros(0, dtype=np.int64))
+    words = [wrd_dict.get("word") or "" for wrd_dict in word_timestamps]
+    starts = np.array(
+        [np.nan if wrd_dict.get("start") is None else wrd_dict["start"] for wrd_dict in word_timestamps],
+        dtype=np.float64,
+    )
+    ends = np.array(
+        [np.nan if wrd_dict.get("end") is None else wrd_dict["end"] for wrd_dict in word_timestamps],
+        dtype=np.float64,
+    )
+    aligned = ~np.isnan(starts)
+    ends = np.where(aligned & np.isnan(ends), starts, ends)
+
+    positions = np.arange(n)
+    previous_aligned = np.maximum.accumulate(np.where(aligned, positions, -1))
+    next_aligned = np.minimum.accumulate(np.where(aligned, positions, n)[::-1])[::-1]
+
+    # An entry starts at every aligned word and at the first word of every unaligned run
+    head = aligned.copy()
+    head[0] = True
+    head[1:] |= aligned[:-1]
+    heads = np.flatnonzero(head)
+    bounds = np.append(heads, n)
+    merged_words = [" ".join(words[a:b]) for a, b in zip(bounds[:-1].tolist(), bounds[1:].tolist())]
+
+    first = 0.0 if initial_timestamp is None else float(initial_timestamp)
+    before = previous_aligned[heads]
+    after = next_aligned[heads]
+    gap_start = np.where(before >= 0, ends[np.maximum(before, 0)], first)
+    gap_end = starts[np.minimum(after, n - 1)]
+    trailing = after == n
+    gap_end[trailing] = gap_start[trailing] if final_timestamp is None else final_timestamp
+
+    head_aligned = aligned[heads]
+    start = np.where(head_aligned, starts[heads], gap_start)
+    end = np.where(head_aligned, ends[heads], np.maximum(gap_end, gap_start))
+    return WordTimestamps(merged_words, start, end, heads)
+
+
+def filter_missing_timestamps(word_timestamps, initial_timestamp=0, final_timestamp=None):
+    """
+    List-of-dicts wrapper around `fill_missing_timestamps_arrays`.
+    """
+    return fill_missing_timestamps_arrays(word_timestamps, initial_timestamp, final_timestamp).to_dicts()
+
+
+class SpeakerTurns(namedtuple('SpeakerTurns', ['start', 'end', 'speaker'])):
+    """
+    Columnar speaker turns: `start` and `end` in milliseconds and `speaker` ids, all int64 arrays in RTTM order.
+    """
+    __slots__ = ()
+
+    def __len__(self):
+        return len(self.start)
+
+    def to_list(self):
+        """
+        Convert to the [start_ms, end_ms, speaker] list layout used throughout the notebook.
+        """
+        return np.stack([self.start, self.end, self.speaker], axis=1).tolist()
+
+    @classmethod
+    def from_list(cls, spk_ts):
+        """
+        Build the columnar turns from a list of [start_ms, end_ms, speaker] turns.
+        """
+        turns = np.asarray(spk_ts, dtype=np.int64).reshape(-1, 3)
+        return cls(turns[:, 0].copy(), turns[:, 1].copy(), turns[:, 2].copy())
+
+
+def as_speaker_turns(spk_ts):
+    return spk_ts if isinstance(spk_ts, SpeakerTurns) else SpeakerTurns.from_list(spk_ts)
+
+
+def read_rttm(rttm_path):
+    """
+    Load the SPEAKER lines of an RTTM file into `SpeakerTurns`.
+
+    Times are converted to milliseconds exactly like the notebook's original
+    parser, `start + duration` truncated separately. Labels of the form
+    `speaker_<n>`, as written by NeMo, become the id n; any other labels are
+    numbered in order of first appearance.
+    """
+    with open(rttm_path, "r", encoding="utf-8") as f:
+        fields = [line.split() for line in f if line.startswith("SPEAKER")]
+    if not fields:
+        return SpeakerTurns(*(np.zeros(0, dtype=np.int64) for _ in range(3)))
+    start_s, duration_s = np.array([(row[3], row[4]) for row in fields], dtype=np.float64).T
+    start = (start_s * 1000).astype(np.int64)
+    end = start + (duration_s * 1000).astype(np.int64)
+
+    labels = [row[7] for row in fields]
+    suffixes = [label.rsplit("_", 1)[-1] for label in labels]
+    if all(suffix.isdigit() for suffix in suffixes):
+        speaker = np.array(suffixes, dtype=np.int64)
+    else:
+        ids = {}
+        speaker = np.array([ids.setdefault(label, len(ids)) for label in labels], dtype=np.int64)
+    return SpeakerTurns(start, end, speaker)
+
+
+def write_rttm(speaker_turns, rttm_path, file_id="audio"):
+    """
+    Write speaker turns in NeMo's RTTM layout, readable by `read_rttm` and the usual scoring tools.
+    """
+    turns = as_speaker_turns(speaker_turns)
+    with open(rttm_path, "w", encoding="utf-8") as f:
+        f.writelines(
+            f"SPEAKER {file_id} 1   {start / 1000:.3f}   {(end - start) / 1000:.3f} <NA> <NA> speaker_{speaker} <NA> <NA>\n"
+            for start, end, speaker in zip(turns.start.tolist(), turns.end.tolist(), turns.speaker.tolist())
+        )
+
+
+class SpeakerTurnIndex:
+    """
+    Interval index over speaker turns for point and range queries.
+
+    Turns are sorted by start time and paired with the running maximum of their
+    end times. Every turn before the first position where that maximum passes a
+    query start has already ended, and every turn after the last start before
+    the query end has not begun, so two binary searches narrow a query down to
+    the turns that can overlap it. Diarization turns overlap only briefly, so
+    that window holds little more than the answer.
+    """
+
+    def __init__(self, speaker_turns):
+        turns = as_speaker_turns(speaker_turns)
+        order = np.argsort(turns.start, kind="stable")
+        self.order = order
+        self.start = turns.start[order]
+        self.end = turns.end[order]
+        self.speaker = turns.speaker[order]
+        self._max_end = np.maximum.accumulate(self.end) if len(order) else self.end
+
+    def __len__(self):
+        return len(self.order)
+
+    def _positions(self, start_ms, end_ms):
+        first = np.searchsorted(self._max_end, start_ms, side="right")
+        # [start_ms, end_ms) is half-open, a point query includes the turns starting at it
+        last = np.searchsorted(self.start, end_ms, side="left" if end_ms > start_ms else "right")
+        return first + np.flatnonzero(self.end[first:last] > start_ms)
+
+    def overlapping(self, start_ms, end_ms):
+        """
+        Indices, in RTTM order, of the turns overlapping [start_ms, end_ms).
+        """
+        return self.order[self._positions(start_ms, end_ms)]
+
+    def speakers_at(self, time_ms):
+        """
+        Speaker ids of every turn active at `time_ms`, several where speech overlaps.
+        """
+        return np.unique(self.speaker[self._positions(time_ms, time_ms)])
+
+    def overlap_ms(self):
+        """
+        Total time, in milliseconds, during which more than one turn is active.
+        """
+        times = np.concatenate([self.start, self.end])
+        steps = np.concatenate([np.ones(len(self), dtype=np.int64), -np.ones(len(self), dtype=np.int64)])
+        order = np.lexsort((steps, times))
+        active = np.cumsum(steps[order])
+        times = times[order]
+        return int(np.sum(np.diff(times)[active[:-1] > 1])) if len(times) else 0
+
+
+def get_word_ts_anchors(starts, ends, option="start"):
+    """
+    Vectorized `get_word_ts_anchor`: the timestamp used to place each word in a speaker turn.
+    """
+    if option == "end":
+        return ends.astype(np.float64)
+    elif option == "mid":
+        return (starts + ends) / 2
+    return starts.astype(np.float64)
+
+
+def assign_speaker_turns(anchors, turn_ends):
+    """
+    Index of the speaker turn each anchor falls into.
+
+    Reproduces the forward-only scan of the original loop: a word belongs to the
+    first turn, at or after the previous word's turn, that ends at or after its
+    anchor, and words past the last turn stay with the last speaker. Running
+    maxima make both sequences monotonic, so one `searchsorted` does the scan.
+
+    Parameters:
+      anchors: word anchor timestamps, in word order
+      turn_ends: speaker turn end timestamps, in turn order
+    Returns:
+      turn_idx: int64 array with one turn index per anchor
+    """
+    if len(turn_ends) == 0:
+        raise ValueError("At least one speaker turn is required")
+    turn_ends = np.maximum.accumulate(np.asarray(turn_ends, dtype=np.float64))
+    anchors = np.maximum.accumulate(np.asarray(anchors, dtype=np.float64)) if len(anchors) else anchors
+    turn_idx = np.searchsorted(turn_ends, anchors, side="left")
+    return np.minimum(turn_idx, len(turn_ends) - 1)
+
+
+def get_words_speaker_mapping_arrays(wrd_ts, spk_ts, word_anchor_option="start"):
+    """
+    Map every word to a speaker turn using NumPy arrays.
+
+    Parameters:
+      wrd_ts: list of {"word", "start", "end"} dictionaries, times in seconds
+      spk_ts: `SpeakerTurns` or list of [start_ms, end_ms, speaker] speaker turns
+      word_anchor_option: "start", "mid" or "end" of the word decides its turn
+    Returns:
+      mapping: `WordSpeakerMapping` with times in milliseconds
+    """
+    words = [wrd_dict["word"] for wrd_dict in wrd_ts]
+    starts = (np.array([wrd_dict["start"] for wrd_dict in wrd_ts], dtype=np.float64) * 1000).astype(np.int64)
+    ends = (np.array([wrd_dict["end"] for wrd_dict in wrd_ts], dtype=np.float64) * 1000).astype(np.int64)
+    turns = as_speaker_turns(spk_ts)
+
+    turn_idx = assign_speaker_turns(get_word_ts_anchors(starts, ends, word_anchor_option), turns.end)
+    return WordSpeakerMapping(words, starts, ends, turns.speaker[turn_idx], np.arange(len(words), dtype=np.int64))
+
+
+def get_words_speaker_mapping(wrd_ts, spk_ts, word_anchor_option="start"):
+    """
+    List-of-dicts wrapper around `get_words_speaker_mapping_arrays`, with the
+    same output as the original loop-based implementation.
+    """
+    return get_words_speaker_mapping_arrays(wrd_ts, spk_ts, word_anchor_option).to_dicts()
+
+
+sentence_ending_punctuations = ".?!"
+
+
+def sentence_end_flags(words):
+    """
+    Boolean array marking the words that end with sentence-ending punctuation.
+    """
+    return np.fromiter(
+        (bool(word) and word[-1] in sentence_ending_punctuations for word in words), dtype=bool, count=len(words)
+    )
+
+
+def sentence_bounds(is_sentence_end):
+    """
+    First and last word index of the sentence that contains each word.
+
+    The last word of the transcript closes the final sentence even without punctuation.
+    """
+    n = len(is_sentence_end)
+    idx = np.arange(n)
+    previous_end = np.concatenate(([-1], np.where(is_sentence_end, idx, -1)[:-1]))
+    first = np.maximum.accumulate(previous_end) + 1
+    last = np.minimum.accumulate(np.where(is_sentence_end, idx, n - 1)[::-1])[::-1]
+    return first, last
+
+
+def get_realigned_ws_mapping_arrays(mapping, max_words_in_sentence=50):
+    """
+    Give every sentence split between speakers to its majority speaker, in linear time.
+
+    Same rules as the original scan: at a speaker change that is not a sentence
+    end, the enclosing sentence is relabelled when the words before the change
+    all belong to one speaker back to the sentence start, the sentence has at
+    most `max_words_in_sentence` words and the majority speaker holds at least
+    half of them. Sentence bounds and speaker-run starts are precomputed, and the
+    vote uses per-speaker prefix counts, so each candidate costs O(speakers).
+    Relabelling never touches words a later candidate looks at, because every
+    candidate's left edge stops at the previous sentence end.
+
+    Parameters:
+      mapping: `WordSpeakerMapping`
+      max_words_in_sentence: longest sentence that may be relabelled
+    Returns:
+      mapping: new `WordSpeakerMapping` sharing words and times, with realigned speakers
+    """
+    n = len(mapping.words)
+    if n < 2:
+        return mapping
+    speakers = mapping.speaker
+    is_end = sentence_end_flags(mapping.words)
+    first, last = sentence_bounds(is_end)
+
+    idx = np.arange(n)
+    run_change = np.concatenate(([True], speakers[1:] != speakers[:-1]))
+    run_start = np.maximum.accumulate(np.where(run_change, idx, 0))
+    candidates = np.flatnonzero((speakers[:-1] != speakers[1:]) & ~is_end[:-1])
+
+    labels, codes = np.unique(speakers, return_inverse=True)
+    prefix = np.zeros((n + 1, len(labels)), dtype=np.int32)
+    prefix[idx + 1, codes] = 1
+    np.cumsum(prefix, axis=0, out=prefix)
+
+    realigned = speakers.copy()
+    next_free = 0
+    for k in candidates.tolist():
+        if k < next_free:
+            continue
+        left, right = first[k], last[k]
+        if run_start[k] > left or k - left > max_words_in_sentence or right - left + 1 > max_words_in_sentence:
+            continue
+        counts = prefix[right + 1] - prefix[left]
+        majority = counts.argmax()
+        if counts[majority] < (right - left + 1) // 2:
+            continue
+        realigned[left:right + 1] = labels[majority]
+        next_free = right + 1
+
+    return WordSpeakerMapping(mapping.words, mapping.start, mapping.end, realigned, mapping.word_index)
+
+
+def get_realigned_ws_mapping_with_punctuation(word_speaker_mapping, max_words_in_sentence=50):
+    """
+    Realign speakers by punctuation for either a `WordSpeakerMapping` or a list of dicts,
+    returning the same type it was given.
+    """
+    if isinstance(word_speaker_mapping, WordSpeakerMapping):
+        return get_realigned_ws_mapping_arrays(word_speaker_mapping, max_words_in_sentence)
+    mapping = WordSpeakerMapping.from_dicts(word_speaker_mapping)
+    return get_realigned_ws_mapping_arrays(mapping, max_words_in_sentence).to_dicts()
+
+
+def iter_sentences_speaker_mapping(word_speaker_mapping, spk_ts, sentence_checker=None):
+    """
+    Group consecutive words into sentences, starting a new one on a speaker change or sentence break.
+    Sentences are yielded as soon as they are complete.
+
+    Punkt decides whether a token ends a sentence from that token and the one
+    after it, and every earlier token was already checked when the previous word
+    was added. Checking the previous word together with the new one therefore
+    gives the same answer as `text_contains_sentbreak` on the whole sentence, at
+    constant cost per word. Words are collected in lists and joined once per sentence.
+
+    Parameters:
+      word_speaker_mapping: `WordSpeakerMapping` or list of word/speaker dictionaries
+      spk_ts: `SpeakerTurns` or list of [start_ms, end_ms, speaker] speaker turns
+      sentence_checker: `text_contains_sentbreak` of a Punkt tokenizer; defaults to an untrained one
+    Yields:
+      sentence: {"speaker", "start_time", "end_time", "text"} dictionary
+    """
+    if sentence_checker is None:
+        import nltk
+
+        sentence_checker = nltk.tokenize.PunktSentenceTokenizer().text_contains_sentbreak
+    if not isinstance(word_speaker_mapping, WordSpeakerMapping):
+        word_speaker_mapping = WordSpeakerMapping.from_dicts(word_speaker_mapping)
+
+    turns = as_speaker_turns(spk_ts)
+    s, e, spk = turns.start[0].item(), turns.end[0].item(), turns.speaker[0].item()
+    prev_spk = spk
+    snt = {"speaker": f"Speaker {spk}", "start_time": s, "end_time": e}
+    snt_words, tail = [], ""
+
+    for wrd, s, e, spk in zip(
+        word_speaker_mapping.words,
+        word_speaker_mapping.start.tolist(),
+        word_speaker_mapping.end.tolist(),
+        word_speaker_mapping.speaker.tolist(),
+    ):
+        # The sentence text so far ends with a space, hence the double space before the new word
+        if spk != prev_spk or sentence_checker(f"{tail}  {wrd}"):
+            snt["text"] = " ".join(snt_words) + " " if snt_words else ""
+            yield snt
+            snt = {"speaker": f"Speaker {spk}", "start_time": s, "end_time": e}
+            snt_words, tail = [], ""
+        else:
+            snt["end_time"] = e
+        snt_words.append(wrd)
+        if wrd.strip():
+            tail = wrd
+        prev_spk = spk
+
+    snt["text"] = " ".join(snt_words) + " " if snt_words else ""
+    yield snt
+
+
+def get_sentences_speaker_mapping(word_speaker_mapping, spk_ts, sentence_checker=None):
+    """
+    List of the sentences of `iter_sentences_speaker_mapping`.
+    """
+    return list(iter_sentences_speaker_mapping(word_speaker_mapping, spk_ts, sentence_checker))
+
+
+def format_timestamp(
+    milliseconds: float, always_include_hours: bool = False, decimal_marker: str = "."
+):
+    assert milliseconds >= 0, "non-negative timestamp expected"
+
+    hours = milliseconds // 3_600_000
+    milliseconds -= hours * 3_600_000
+
+    minutes = milliseconds // 60_000
+    milliseconds -= minutes * 60_000
+
+    seconds = milliseconds // 1_000
+    milliseconds -= seconds * 1_000
+
+    hours_marker = f"{hours:02d}:" if always_include_hours or hours > 0 else ""
+    return (
+        f"{hours_marker}{minutes:02d}:{seconds:02d}{decimal_marker}{milliseconds:03d}"
+    )
+
+
+def write_transcripts(sentences, txt_file=None, srt_file=None, json_file=None, speaker_names=None):
+    """
+    Write the speaker-aware transcript, SRT subtitles and JSON of a stream of sentences in one pass.
+
+    Each sentence is written to every given file as it arrives, so `sentences`
+    can be a generator such as `iter_sentences_speaker_mapping`. Nothing is
+    flushed per line; the files' own buffers batch the writes.
+
+    Parameters:
+      sentences: iterable of {"speaker", "start_time", "end_time", "text"} dictionaries
+      txt_file, srt_file, json_file: open text files, or None to skip a format
+      speaker_names: dict of speaker id to name, replacing the "Speaker <id>" labels
+    Returns:
+      count: number of sentences written
+    """
+    labels = {f"Speaker {speaker}": name for speaker, name in (speaker_names or {}).items()}
+    previous_speaker = None
+    count = 0
+    if json_file is not None:
+        json_file.write("[")
+    for count, sentence in enumerate(sentences, start=1):
+        speaker = labels.get(sentence["speaker"], sentence["speaker"])
+        if txt_file is not None:
+            # A new paragraph whenever the speaker changes
+            if speaker != previous_speaker:
+                txt_file.write(f"{speaker}: " if previous_speaker is None else f"\n\n{speaker}: ")
+            txt_file.write(sentence["text"] + " ")
+        previous_speaker = speaker
+        if srt_file is not None:
+            srt_file.write(
+                f"{count}\n"
+                f"{format_timestamp(sentence['start_time'], always_include_hours=True, decimal_marker=',')} --> "
+                f"{format_timestamp(sentence['end_time'], always_include_hours=True, decimal_marker=',')}\n"
+                f"{speaker}: {sentence['text'].strip().replace('-->', '->')}\n\n"
+            )
+        if json_file is not None:
+            record = json.dumps({**sentence, "speaker": speaker}, ensure_ascii=False)
+            json_file.write(("," if count > 1 else "") + "\n  " + record)
+    if json_file is not None:
+        json_file.write("\n]\n")
+    return count
+
+
+def get_speaker_aware_transcript(sentences_speaker_mapping, f, speaker_names=None):
+    write_transcripts(sentences_speaker_mapping, txt_file=f, speaker_names=speaker_names)
+
+
+def write_srt(transcript, file, speaker_names=None):
+    """
+    Write a transcript to a file in SRT format.
+
+    """
+    write_transcripts(transcript, srt_file=file, speaker_names=speaker_names)
+
+
+# Keyed by the vocabulary digest, so no tokenizer is kept alive and equal vocabularies share one entry
+_numeral_symbol_tokens = {}
+
+
+def _vocab_digest(tokens, token_ids):
+    """
+    SHA-256 of a vocabulary in id order, independent of the order `get_vocab` returns it in.
+    """
+    order = np.argsort(token_ids, kind="stable")
+    digest = hashlib.sha256(token_ids[order].tobytes())
+    digest.update("\0".join(tokens[i] for i in order.tolist()).encode("utf-8", "surrogatepass"))
+    return digest.hexdigest()
+
+
+def find_numeral_symbol_tokens(tokenizer, cache_path=None):
+    """
+    Ids of the vocabulary tokens containing a digit, "%", "$" or "£", to suppress while decoding.
+
+    The vocabulary is joined into one string and decoded into an array of code
+    points, so a single `np.isin` tests every character and the hits are mapped
+    back to their tokens without a Python loop over the vocabulary. The result
+    is memoized per vocabulary digest and, with `cache_path`, stored as JSON, so
+    later runs and new worker processes skip the scan. A cached file is only
+    used while its digest matches the tokenizer's vocabulary.
+
+    Returns:
+      numeral_symbol_tokens: [-1] (Whisper's default suppressions) followed by
+        the token ids, in vocabulary order
+    """
+    vocab = tokenizer.get_vocab()
+    tokens = list(vocab)
+    token_ids = np.fromiter(vocab.values(), dtype=np.int64, count=len(vocab))
+    vocab_digest = _vocab_digest(tokens, token_ids)
+    memo = _numeral_symbol_tokens.get(vocab_digest)
+    if memo is not None:
+        return list(memo)
+
+    numeral_symbol_tokens = None
+    if cache_path is not None and os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("vocab_digest") == vocab_digest:
+            numeral_symbol_tokens = cached["tokens"]
+
+    if numeral_symbol_tokens is None:
+        lengths = np.fromiter(map(len, tokens), dtype=np.int64, count=len(tokens))
+        code_points = np.frombuffer("".join(tokens).encode("utf-32-le"), dtype=np.uint32)
+        symbols = np.frombuffer(NUMERAL_SYMBOLS.encode("utf-32-le"), dtype=np.uint32)
+        token_of_char = np.repeat(np.arange(len(tokens)), lengths)
+        hits = np.unique(token_of_char[np.isin(code_points, symbols)])
+        numeral_symbol_tokens = [-1] + token_ids[hits].tolist()
+        if cache_path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+            with open(cache_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"vocab_digest": vocab_digest, "tokens": numeral_symbol_tokens}, f)
+            os.replace(cache_path + ".tmp", cache_path)
+
+    _numeral_symbol_tokens[vocab_digest] = numeral_symbol_tokens
+    return list(numeral_symbol_tokens)
+
+
+def float_wav_header(n_frames, sampling_rate=SAMPLING_RATE, channels=1):
+    block_align = 4 * channels
+    data_bytes = n_frames * block_align
+    return FLOAT_WAV_HEADER.pack(
+        b"RIFF", 36 + data_bytes, b"WAVE", b"fmt ", 16, 3, channels,
+        sampling_rate, sampling_rate * block_align, block_align, 32, b"data", data_bytes,
+    )
+
+
+def decode_audio(path, wav_path, sampling_rate=SAMPLING_RATE, channels=1, chunk_size=1 << 20):
+    """
+    Decode any file ffmpeg can read, once, into a float32 WAV at `sampling_rate`.
+
+    ffmpeg streams raw samples straight into the file behind a fixed 44-byte
+    header, so the result can be read with `load_audio_memmap` without decoding
+    again and handed to NeMo, which reads float WAV files, as is.
+
+    Returns:
+      n_frames: number of samples written per channel
+    """
+    cmd = [
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-threads", "0", "-i", path,
+        "-f", "f32le", "-ac", str(channels), "-acodec", "pcm_f32le", "-ar", str(sampling_rate), "-",
+    ]
+    data_bytes = 0
+    with open(wav_path, "wb") as f:
+        f.write(float_wav_header(0, sampling_rate, channels))
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        for block in iter(lambda: process.stdout.read(chunk_size), b""):
+            f.write(block)
+            data_bytes += len(block)
+        error = process.stderr.read().decode(errors="replace")
+        if process.wait() != 0:
+            raise RuntimeError(f"Failed to decode {path}: {error}")
+        f.seek(0)
+        f.write(float_wav_header(data_bytes // (4 * channels), sampling_rate, channels))
+    return data_bytes // (4 * channels)
+
+
+def load_audio_memmap(wav_path):
+    """
+    Memory-map a WAV written by `decode_audio` as a float32 array, shaped
+    (n_samples,) for mono and (n_frames, channels) otherwise.
+
+    Pages are shared between processes reading the same file and only loaded
+    when touched. The map is copy-on-write, so libraries that modify their input
+    in place never write back to the file.
+    """
+    with open(wav_path, "rb") as f:
+        header = FLOAT_WAV_HEADER.unpack(f.read(FLOAT_WAV_HEADER.size))
+    if header[0] != b"RIFF" or header[5] != 3 or header[11] != b"data":
+        raise ValueError(f"{wav_path} is not a float WAV written by decode_audio")
+    channels = header[6]
+    n_frames = header[12] // (4 * channels)
+    shape = (n_frames,) if channels == 1 else (n_frames, channels)
+    return np.memmap(wav_path, dtype="<f4", mode="c", offset=FLOAT_WAV_HEADER.size, shape=shape)
@@ -36,6 +36,8 @@ The notebook is organized into key sections, each addressing a specific aspect o
 
 9. **Finalizing the diarization process**: : Cleanup, result export, and speaker name mapping.
 
+10. **Processing a queue of recordings with a persistent model pool**: Diarize many files in one long-lived worker that loads every model only once.
+
 This notebook provides a comprehensive resource for researchers, developers, and practitioners interested in exploring advanced diarization techniques within ASR systems. By integrating Whisper's transcription capabilities with NeMo's diarization framework, it offers a powerful solution for analyzing speech in audio recordings.
 
 # Setting up the environment
@@ -47,7 +49,7 @@ This section focuses on installing the necessary Python libraries and tools for
 - **demucs**: A library for music source separation, enabling the isolation of speech from background music during audio preprocessing.
 - **dora-search, lameenc, and openunmix**: Tools and libraries for audio processing, improving the quality and compatibility of audio data for diarization tasks.
 - **deepmultilingualpunctuation**: A library for adding punctuation to transcriptions, enhancing readability and structure.
-- **wget and pydub**: Utilities for downloading and manipulating audio files, simplifying audio data handling within the Python environment.
+- **wget**: A utility for downloading files, such as the sample audio and helper modules, within the Python environment.
 
 These libraries work together to form a comprehensive toolset for processing audio files, transcribing speech, and performing speaker diarization. Each tool contributes to a specific aspect of the process, from audio data preparation to accurate transcription and speaker identification.
 """
@@ -57,28 +59,65 @@ These libraries work together to form a comprehensive toolset for processing aud
 !pip install -q --no-deps git+https://github.com/facebookresearch/demucs#egg=demucs
 !pip install -q dora-search "lameenc>=1.2" openunmix
 !pip install -q deepmultilingualpunctuation
-!pip install -q wget pydub
+!pip install -q wget
 
 """# RESTART
 ![Restart_the_runtime_600x102.png](https://github.com/PacktPublishing/Learn-OpenAI-Whisper/raw/main/Chapter08/Restart_the_runtime_600x102.png)
 """
 
+# Download the helper modules: array-based diarization utilities, stage cache, vocal separation, model pool,
+# punctuation, speaker registry and batched alignment
+!wget -nv https://github.com/PacktPublishing/Learn-OpenAI-Whisper/raw/main/Chapter08/helpers.py -O helpers.py
+!wget -nv https://github.com/PacktPublishing/Learn-OpenAI-Whisper/raw/main/Chapter08/stagecache.py -O stagecache.py
+!wget -nv https://github.com/PacktPublishing/Learn-OpenAI-Whisper/raw/main/Chapter08/separation.py -O separation.py
+!wget -nv https://github.com/PacktPublishing/Learn-OpenAI-Whisper/raw/main/Chapter08/modelpool.py -O modelpool.py
+!wget -nv https://github.com/PacktPublishing/Learn-OpenAI-Whisper/raw/main/Chapter08/punctuation.py -O punctuation.py
+!wget -nv https://github.com/PacktPublishing/Learn-OpenAI-Whisper/raw/main/Chapter08/speakers.py -O speakers.py
+!wget -nv https://github.com/PacktPublishing/Learn-OpenAI-Whisper/raw/main/Chapter08/alignment.py -O alignment.py
+!wget -nv https://github.com/PacktPublishing/Learn-OpenAI-Whisper/raw/main/Chapter08/diarconfig.py -O diarconfig.py
+!mkdir -p diar_configs/v1.22.0
+!wget -nv https://github.com/PacktPublishing/Learn-OpenAI-Whisper/raw/main/Chapter08/diar_configs/v1.22.0/diar_infer_telephonic.yaml -O diar_configs/v1.22.0/diar_infer_telephonic.yaml
+
 import os
-import wget
-from omegaconf import OmegaConf
+
+# Answer torch.cuda.is_available() from NVML, so checking for a GPU does not create a CUDA
+# context in this process before the pipeline branches are forked in section 6
+os.environ["PYTORCH_NVML_BASED_CUDA_CHECK"] = "1"
+
 import json
 import shutil
 from faster_whisper import WhisperModel
 import whisperx
 import torch
-from pydub import AudioSegment
 from nemo.collections.asr.models.msdd_models import NeuralDiarizer
 from deepmultilingualpunctuation import PunctuationModel
 import re
 import logging
 import nltk
+from importlib.metadata import version as package_version
+from omegaconf import OmegaConf
 from whisperx.alignment import DEFAULT_ALIGN_MODELS_HF, DEFAULT_ALIGN_MODELS_TORCH
 from whisperx.utils import LANGUAGES, TO_LANGUAGE_CODE
+from alignment import align
+from diarconfig import (
+    NEMO_CONFIG_VERSION,
+    config_template_path,
+    create_diarization_config,
+    list_audio_files,
+    recording_ids,
+)
+from modelpool import FileQueue, ModelPool, serve
+from punctuation import apply_punctuation, predict_punctuation
+from separation import extract_vocals
+from speakers import (
+    SpeakerRegistry,
+    load_speaker_embeddings,
+    load_subsegment_embeddings,
+    name_speakers,
+    save_speaker_embeddings,
+    speaker_centroids,
+)
+from stagecache import StagePipeline, canonical_device, file_digest, split_device
 
 # Download sample multi-speaker audio file
 # Source: www.youtube.com/@Channel4News
@@ -100,29 +139,54 @@ batch_size = 8
 
 language = None  # autodetect language
 
-device = "cuda" if torch.cuda.is_available() else "cpu"
+# Always with an index, as run_parallel passes it to the stages, so every model
+# pool key names the device the same way
+device = canonical_device("cuda" if torch.cuda.is_available() else "cpu")
+
+# Every stage result (vocals, 16 kHz audio, segments, word timestamps, RTTM, punctuated words) is cached here,
+# keyed by a hash of its inputs and of every setting and package version that affects it, so a rerun only
+# recomputes what changed
+cache_dir = "diarization_cache"
+pipeline = StagePipeline(cache_dir)
+pipeline.source("audio", audio_path)
+
+# Transcription + alignment and diarization run side by side, in two worker processes or, once CUDA is in use, two threads.
+# None puts them on separate GPUs when there are two, otherwise shares the GPU or splits the CPU cores
+branch_devices = None  # e.g. {"word_timestamps": "cuda:0", "rttm": "cuda:1"}
+
+# Models are loaded once per process and kept until this budget is exceeded, least recently used first
+model_pool = ModelPool(memory_budget_gb=24)
+
+# Punctuation is restored on overlapping windows of this many words, several windows per forward pass
+punctuation_window_words = 230
+punctuation_overlap_words = 16
+punctuation_batch_size = 8
+
+# Segments per Wav2Vec2 forward pass during alignment; None uses 16 on GPU and 1 (in a thread pool) on CPU.
+# Group-norm models such as the default English aligner always run one segment per pass
+alignment_batch_size = None
 
 """# 2. Streamlining the diarization workflow with helper functions
 
 This section introduces a set of helper functions designed to streamline the process of diarizing speech using Whisper and NeMo. These functions play a crucial role in managing audio data, aligning transcriptions with speaker identities, and enhancing the overall workflow. Here's a brief overview of the key functions:
 
-- **`create_config()`**: Sets up essential parameters for the diarization process by initializing and returning a configuration object.
+- **`create_config()`**: Sets up essential parameters for the diarization process by initializing and returning a configuration object. The NeMo inference template is loaded from `diar_configs/`, which bundles it for the pinned NeMo version instead of downloading it at runtime, and the input manifest built by `diarconfig.py` can list many recordings for one `diarize()` call. The VAD, TitaNet and MSDD settings applied on top of the template are kept in `diarization_overrides`, so the cache key of the diarization stage changes with them. Data loader workers are only disabled inside notebooks, where they hang with IPython.
 
 - **`get_word_ts_anchor()`**: Determines the anchor timestamp for words, enabling accurate alignment between spoken words and their timestamps in the audio.
 
-- **`get_words_speaker_mapping()`**: Maps each word in the transcription to the corresponding speaker based on the diarization results, ensuring accurate speaker attribution.
-
-- **`get_first_word_idx_of_sentence()`** and **`get_last_word_idx_of_sentence()`**: Identifies the indices of the first and last words in a sentence, facilitating sentence-level processing for speaker attribution and alignment.
+- **`get_words_speaker_mapping()`**: Maps each word in the transcription to the corresponding speaker based on the diarization results, ensuring accurate speaker attribution. It is imported from our `helpers.py` module, which stores word anchors and speaker turn boundaries as NumPy arrays and assigns all words to their turns with a single `searchsorted` call, so even a 3-hour meeting with 30k words is mapped in milliseconds.
 
-- **`get_realigned_ws_mapping_with_punctuation()`**: Enhances the accuracy of speaker attribution by adjusting the word-to-speaker mapping considering punctuation, particularly in complex conversational scenarios.
+- **`get_realigned_ws_mapping_with_punctuation()`**: Enhances the accuracy of speaker attribution by adjusting the word-to-speaker mapping considering punctuation, particularly in complex conversational scenarios. It is also imported from `helpers.py`, which precomputes the first and last word of every sentence once and takes the majority speaker of a sentence from per-speaker running counts, so the realignment runs in linear time instead of rescanning and recounting each sentence.
 
-- **`get_sentences_speaker_mapping()`**: Generates a mapping of entire sentences to speakers, providing a higher-level view of speaker contributions throughout the audio.
+- **`get_sentences_speaker_mapping()`**: Generates a mapping of entire sentences to speakers, providing a higher-level view of speaker contributions throughout the audio. The `helpers.py` version asks the Punkt tokenizer about the newest word boundary only, instead of re-checking the whole sentence for every word, and joins each sentence's words once.
 
 - **`get_speaker_aware_transcript()`**: Produces a transcript that integrates textual content with speaker information, creating a cohesive and speaker-aware format.
 
 - **`format_timestamp()`** and **`write_srt()`**: Converts timestamps into a human-readable format and outputs the diarization results in SubRip Text (SRT) format for subtitles or detailed analysis.
 
-- **`find_numeral_symbol_tokens()`**, **`_get_next_start_timestamp()`**, and **`filter_missing_timestamps()`**: Assist in processing numerical data, ensuring continuity in timestamp sequences, and maintaining the integrity of temporal information.
+- **`write_transcripts()`**: Writes the speaker-aware transcript, the SRT subtitles and a JSON list of sentences in a single pass over the sentences, applying speaker names as it goes. It lives in `helpers.py` together with the two functions above, which are thin wrappers around it.
+
+- **`find_numeral_symbol_tokens()`** and **`filter_missing_timestamps()`**: Assist in processing numerical data, ensuring continuity in timestamp sequences, and maintaining the integrity of temporal information. Both are imported from `helpers.py`. `find_numeral_symbol_tokens()` tests the whole vocabulary with one vectorized NumPy pass, remembers the result per vocabulary and saves it to disk, so later runs and new worker processes do not scan the 50k+ tokens again. `filter_missing_timestamps()` merges every run of words the aligner could not place, such as numbers or foreign words, into one entry spanning the gap between its aligned neighbours. It finds those neighbours for all words at once with a forward and a backward fill over NumPy arrays, so long unaligned spans cost linear time, and it returns new dictionaries instead of modifying the alignment output.
 
 - **`cleanup()`**, **`process_language_arg()`**, **`transcribe()`**, and **`transcribe_batched()`**: Handle temporary file cleanup, language argument processing, audio transcription using Whisper, and batch processing for efficient transcription.
 
@@ -152,55 +216,35 @@ whisper_langs = sorted(LANGUAGES.keys()) + sorted(
 )
 
 
-def create_config(output_dir):
-    DOMAIN_TYPE = "telephonic"  # Can be meeting, telephonic, or general based on domain type of the audio file
-    CONFIG_FILE_NAME = f"diar_infer_{DOMAIN_TYPE}.yaml"
-    CONFIG_URL = f"https://raw.githubusercontent.com/NVIDIA/NeMo/main/examples/speaker_tasks/diarization/conf/inference/{CONFIG_FILE_NAME}"
-    MODEL_CONFIG = os.path.join(output_dir, CONFIG_FILE_NAME)
-    if not os.path.exists(MODEL_CONFIG):
-        MODEL_CONFIG = wget.download(CONFIG_URL, output_dir)
-
-    config = OmegaConf.load(MODEL_CONFIG)
-
-    data_dir = os.path.join(output_dir, "data")
-    os.makedirs(data_dir, exist_ok=True)
-
-    meta = {
-        "audio_filepath": os.path.join(output_dir, "mono_file.wav"),
-        "offset": 0,
-        "duration": None,
-        "label": "infer",
-        "text": "-",
-        "rttm_filepath": None,
-        "uem_filepath": None,
-    }
-    with open(os.path.join(data_dir, "input_manifest.json"), "w") as fp:
-        json.dump(meta, fp)
-        fp.write("\n")
-
-    pretrained_vad = "vad_multilingual_marblenet"
-    pretrained_speaker_model = "titanet_large"
-    config.num_workers = 0  # Workaround for multiprocessing hanging with ipython issue
-    config.diarizer.manifest_filepath = os.path.join(data_dir, "input_manifest.json")
-    config.diarizer.out_dir = (
-        output_dir  # Directory to store intermediate files and prediction outputs
-    )
-
-    config.diarizer.speaker_embeddings.model_path = pretrained_speaker_model
-    config.diarizer.oracle_vad = (
-        False  # compute VAD provided with model_path to vad config
-    )
-    config.diarizer.clustering.parameters.oracle_num_speakers = False
+DOMAIN_TYPE = "telephonic"  # Can be meeting, telephonic, or general based on domain type of the audio file
 
+# Settings that create_config applies on top of the bundled template. Together with the
+# template they decide the diarization output, so the "rttm" stage is keyed by them
+diarization_overrides = {
+    "diarizer.speaker_embeddings.model_path": "titanet_large",
+    # Keep the TitaNet embeddings of every subsegment for the speaker registry
+    "diarizer.speaker_embeddings.parameters.save_embeddings": True,
+    "diarizer.oracle_vad": False,  # compute VAD provided with model_path to vad config
     # Here, we use our in-house pretrained NeMo VAD model
-    config.diarizer.vad.model_path = pretrained_vad
-    config.diarizer.vad.parameters.onset = 0.8
-    config.diarizer.vad.parameters.offset = 0.6
-    config.diarizer.vad.parameters.pad_offset = -0.05
-    config.diarizer.msdd_model.model_path = (
-        "diar_msdd_telephonic"  # Telephonic speaker diarization model
+    "diarizer.vad.model_path": "vad_multilingual_marblenet",
+    "diarizer.vad.parameters.onset": 0.8,
+    "diarizer.vad.parameters.offset": 0.6,
+    "diarizer.vad.parameters.pad_offset": -0.05,
+    "diarizer.msdd_model.model_path": "diar_msdd_telephonic",  # Telephonic speaker diarization model
+}
+
+
+def create_config(output_dir, audio_filepaths=None, num_workers=None):
+    # The template is bundled in diar_configs/ for the pinned NeMo version, all
+    # recordings go into one manifest so a single diarize() call handles them
+    config = create_diarization_config(
+        output_dir,
+        audio_filepaths or os.path.join(output_dir, "mono_file.wav"),
+        domain=DOMAIN_TYPE,
+        num_workers=num_workers,  # 0 in notebooks, workaround for multiprocessing hanging with ipython
     )
-
+    for key, value in diarization_overrides.items():
+        OmegaConf.update(config, key, value)
     return config
 
 
@@ -212,269 +256,19 @@ def get_word_ts_anchor(s, e, option="start"):
     return s
 
 
-def get_words_speaker_mapping(wrd_ts, spk_ts, word_anchor_option="start"):
-    s, e, sp = spk_ts[0]
-    wrd_pos, turn_idx = 0, 0
-    wrd_spk_mapping = []
-    for wrd_dict in wrd_ts:
-        ws, we, wrd = (
-            int(wrd_dict["start"] * 1000),
-            int(wrd_dict["end"] * 1000),
-            wrd_dict["word"],
-        )
-        wrd_pos = get_word_ts_anchor(ws, we, word_anchor_option)
-        while wrd_pos > float(e):
-            turn_idx += 1
-            turn_idx = min(turn_idx, len(spk_ts) - 1)
-            s, e, sp = spk_ts[turn_idx]
-            if turn_idx == len(spk_ts) - 1:
-                e = get_word_ts_anchor(ws, we, option="end")
-        wrd_spk_mapping.append(
-            {"word": wrd, "start_time": ws, "end_time": we, "speaker": sp}
-        )
-    return wrd_spk_mapping
-
-
-sentence_ending_punctuations = ".?!"
-
-
-def get_first_word_idx_of_sentence(word_idx, word_list, speaker_list, max_words):
-    is_word_sentence_end = (
-        lambda x: x >= 0 and word_list[x][-1] in sentence_ending_punctuations
-    )
-    left_idx = word_idx
-    while (
-        left_idx > 0
-        and word_idx - left_idx < max_words
-        and speaker_list[left_idx - 1] == speaker_list[left_idx]
-        and not is_word_sentence_end(left_idx - 1)
-    ):
-        left_idx -= 1
-
-    return left_idx if left_idx == 0 or is_word_sentence_end(left_idx - 1) else -1
-
-
-def get_last_word_idx_of_sentence(word_idx, word_list, max_words):
-    is_word_sentence_end = (
-        lambda x: x >= 0 and word_list[x][-1] in sentence_ending_punctuations
-    )
-    right_idx = word_idx
-    while (
-        right_idx < len(word_list)
-        and right_idx - word_idx < max_words
-        and not is_word_sentence_end(right_idx)
-    ):
-        right_idx += 1
-
-    return (
-        right_idx
-        if right_idx == len(word_list) - 1 or is_word_sentence_end(right_idx)
-        else -1
-    )
-
-
-def get_realigned_ws_mapping_with_punctuation(
-    word_speaker_mapping, max_words_in_sentence=50
-):
-    is_word_sentence_end = (
-        lambda x: x >= 0
-        and word_speaker_mapping[x]["word"][-1] in sentence_ending_punctuations
-    )
-    wsp_len = len(word_speaker_mapping)
-
-    words_list, speaker_list = [], []
-    for k, line_dict in enumerate(word_speaker_mapping):
-        word, speaker = line_dict["word"], line_dict["speaker"]
-        words_list.append(word)
-        speaker_list.append(speaker)
-
-    k = 0
-    while k < len(word_speaker_mapping):
-        line_dict = word_speaker_mapping[k]
-        if (
-            k < wsp_len - 1
-            and speaker_list[k] != speaker_list[k + 1]
-            and not is_word_sentence_end(k)
-        ):
-            left_idx = get_first_word_idx_of_sentence(
-                k, words_list, speaker_list, max_words_in_sentence
-            )
-            right_idx = (
-                get_last_word_idx_of_sentence(
-                    k, words_list, max_words_in_sentence - k + left_idx - 1
-                )
-                if left_idx > -1
-                else -1
-            )
-            if min(left_idx, right_idx) == -1:
-                k += 1
-                continue
-
-            spk_labels = speaker_list[left_idx : right_idx + 1]
-            mod_speaker = max(set(spk_labels), key=spk_labels.count)
-            if spk_labels.count(mod_speaker) < len(spk_labels) // 2:
-                k += 1
-                continue
-
-            speaker_list[left_idx : right_idx + 1] = [mod_speaker] * (
-                right_idx - left_idx + 1
-            )
-            k = right_idx
-
-        k += 1
-
-    k, realigned_list = 0, []
-    while k < len(word_speaker_mapping):
-        line_dict = word_speaker_mapping[k].copy()
-        line_dict["speaker"] = speaker_list[k]
-        realigned_list.append(line_dict)
-        k += 1
-
-    return realigned_list
-
-
-def get_sentences_speaker_mapping(word_speaker_mapping, spk_ts):
-    sentence_checker = nltk.tokenize.PunktSentenceTokenizer().text_contains_sentbreak
-    s, e, spk = spk_ts[0]
-    prev_spk = spk
-
-    snts = []
-    snt = {"speaker": f"Speaker {spk}", "start_time": s, "end_time": e, "text": ""}
-
-    for wrd_dict in word_speaker_mapping:
-        wrd, spk = wrd_dict["word"], wrd_dict["speaker"]
-        s, e = wrd_dict["start_time"], wrd_dict["end_time"]
-        if spk != prev_spk or sentence_checker(snt["text"] + " " + wrd):
-            snts.append(snt)
-            snt = {
-                "speaker": f"Speaker {spk}",
-                "start_time": s,
-                "end_time": e,
-                "text": "",
-            }
-        else:
-            snt["end_time"] = e
-        snt["text"] += wrd + " "
-        prev_spk = spk
-
-    snts.append(snt)
-    return snts
-
-
-def get_speaker_aware_transcript(sentences_speaker_mapping, f):
-    previous_speaker = sentences_speaker_mapping[0]["speaker"]
-    f.write(f"{previous_speaker}: ")
-
-    for sentence_dict in sentences_speaker_mapping:
-        speaker = sentence_dict["speaker"]
-        sentence = sentence_dict["text"]
-
-        # If this speaker doesn't match the previous one, start a new paragraph
-        if speaker != previous_speaker:
-            f.write(f"\n\n{speaker}: ")
-            previous_speaker = speaker
-
-        # No matter what, write the current sentence
-        f.write(sentence + " ")
-
-
-def format_timestamp(
-    milliseconds: float, always_include_hours: bool = False, decimal_marker: str = "."
-):
-    assert milliseconds >= 0, "non-negative timestamp expected"
-
-    hours = milliseconds // 3_600_000
-    milliseconds -= hours * 3_600_000
-
-    minutes = milliseconds // 60_000
-    milliseconds -= minutes * 60_000
-
-    seconds = milliseconds // 1_000
-    milliseconds -= seconds * 1_000
-
-    hours_marker = f"{hours:02d}:" if always_include_hours or hours > 0 else ""
-    return (
-        f"{hours_marker}{minutes:02d}:{seconds:02d}{decimal_marker}{milliseconds:03d}"
-    )
-
-
-def write_srt(transcript, file):
-    """
-    Write a transcript to a file in SRT format.
-
-    """
-    for i, segment in enumerate(transcript, start=1):
-        # write srt lines
-        print(
-            f"{i}\n"
-            f"{format_timestamp(segment['start_time'], always_include_hours=True, decimal_marker=',')} --> "
-            f"{format_timestamp(segment['end_time'], always_include_hours=True, decimal_marker=',')}\n"
-            f"{segment['speaker']}: {segment['text'].strip().replace('-->', '->')}\n",
-            file=file,
-            flush=True,
-        )
-
-
-def find_numeral_symbol_tokens(tokenizer):
-    numeral_symbol_tokens = [
-        -1,
-    ]
-    for token, token_id in tokenizer.get_vocab().items():
-        has_numeral_symbol = any(c in "0123456789%$£" for c in token)
-        if has_numeral_symbol:
-            numeral_symbol_tokens.append(token_id)
-    return numeral_symbol_tokens
-
-
-def _get_next_start_timestamp(word_timestamps, current_word_index, final_timestamp):
-    # if current word is the last word
-    if current_word_index == len(word_timestamps) - 1:
-        return word_timestamps[current_word_index]["start"]
-
-    next_word_index = current_word_index + 1
-    while current_word_index < len(word_timestamps) - 1:
-        if word_timestamps[next_word_index].get("start") is None:
-            # if next word doesn't have a start timestamp
-            # merge it with the current word and delete it
-            word_timestamps[current_word_index]["word"] += (
-                " " + word_timestamps[next_word_index]["word"]
-            )
-
-            word_timestamps[next_word_index]["word"] = None
-            next_word_index += 1
-            if next_word_index == len(word_timestamps):
-                return final_timestamp
-
-        else:
-            return word_timestamps[next_word_index]["start"]
-
-
-def filter_missing_timestamps(
-    word_timestamps, initial_timestamp=0, final_timestamp=None
-):
-    # handle the first and last word
-    if word_timestamps[0].get("start") is None:
-        word_timestamps[0]["start"] = (
-            initial_timestamp if initial_timestamp is not None else 0
-        )
-        word_timestamps[0]["end"] = _get_next_start_timestamp(
-            word_timestamps, 0, final_timestamp
-        )
-
-    result = [
-        word_timestamps[0],
-    ]
-
-    for i, ws in enumerate(word_timestamps[1:], start=1):
-        # if ws doesn't have a start and end
-        # use the previous end as start and next start as end
-        if ws.get("start") is None and ws.get("word") is not None:
-            ws["start"] = word_timestamps[i - 1]["end"]
-            ws["end"] = _get_next_start_timestamp(word_timestamps, i, final_timestamp)
-
-        if ws["word"] is not None:
-            result.append(ws)
-    return result
+from helpers import (
+    decode_audio,
+    filter_missing_timestamps,
+    find_numeral_symbol_tokens,
+    get_realigned_ws_mapping_with_punctuation,
+    get_sentences_speaker_mapping,
+    get_words_speaker_mapping,
+    iter_sentences_speaker_mapping,
+    load_audio_memmap,
+    read_rttm,
+    SpeakerTurnIndex,
+    write_transcripts,
+)
 
 
 def cleanup(path: str):
@@ -520,11 +314,15 @@ def transcribe(
     device: str,
 ):
     from faster_whisper import WhisperModel
-    from helpers import find_numeral_symbol_tokens, wav2vec2_langs
 
-    # Faster Whisper non-batched
-    # Run on GPU with FP16
-    whisper_model = WhisperModel(model_name, device=device, compute_type=compute_dtype)
+    # Faster Whisper non-batched, loaded once and kept in the model pool
+    # Run on GPU with FP16. CTranslate2 takes "cuda" and the GPU index separately
+    model_key = ("faster-whisper", model_name, device, compute_dtype)
+    device_type, device_index = split_device(device)
+    whisper_model = model_pool.get(
+        model_key,
+        lambda: WhisperModel(model_name, device=device_type, device_index=device_index, compute_type=compute_dtype),
+    )
 
     # or run on GPU with INT8
     # model = WhisperModel(model_size, device="cuda", compute_type="int8_float16")
@@ -532,7 +330,10 @@ def transcribe(
     # model = WhisperModel(model_size, device="cpu", compute_type="int8")
 
     if suppress_numerals:
-        numeral_symbol_tokens = find_numeral_symbol_tokens(whisper_model.hf_tokenizer)
+        # Scanned once per tokenizer, then read from the cache next to the stage results
+        numeral_symbol_tokens = find_numeral_symbol_tokens(
+            whisper_model.hf_tokenizer, os.path.join(cache_dir, "tokenizers", f"{model_name}-numeral-tokens.json")
+        )
     else:
         numeral_symbol_tokens = None
 
@@ -541,20 +342,18 @@ def transcribe(
     else:
         word_timestamps = True
 
-    segments, info = whisper_model.transcribe(
-        audio_file,
-        language=language,
-        beam_size=5,
-        word_timestamps=word_timestamps,  # TODO: disable this if the language is supported by wav2vec2
-        suppress_tokens=numeral_symbol_tokens,
-        vad_filter=True,
-    )
-    whisper_results = []
-    for segment in segments:
-        whisper_results.append(segment._asdict())
-    # clear gpu vram
-    del whisper_model
-    torch.cuda.empty_cache()
+    # segments is a generator, the decoding happens while iterating over it
+    with model_pool.inference(model_key):
+        segments, info = whisper_model.transcribe(
+            audio_file,
+            language=language,
+            word_timestamps=word_timestamps,  # TODO: disable this if the language is supported by wav2vec2
+            suppress_tokens=numeral_symbol_tokens,
+            **faster_whisper_options,
+        )
+        whisper_results = []
+        for segment in segments:
+            whisper_results.append(segment._asdict())
     return whisper_results, language
 
 
@@ -569,17 +368,22 @@ def transcribe_batched(
 ):
     import whisperx
 
-    # Faster Whisper batched
-    whisper_model = whisperx.load_model(
-        model_name,
-        device,
-        compute_type=compute_dtype,
-        asr_options={"suppress_numerals": suppress_numerals},
+    # Faster Whisper batched, loaded once and kept in the model pool
+    model_key = ("whisperx", model_name, device, compute_dtype, suppress_numerals)
+    device_type, device_index = split_device(device)
+    whisper_model = model_pool.get(
+        model_key,
+        lambda: whisperx.load_model(
+            model_name,
+            device_type,
+            device_index=device_index,
+            compute_type=compute_dtype,
+            asr_options={"suppress_numerals": suppress_numerals},
+        ),
     )
-    audio = whisperx.load_audio(audio_file)
-    result = whisper_model.transcribe(audio, language=language, batch_size=batch_size)
-    del whisper_model
-    torch.cuda.empty_cache()
+    audio = whisperx.load_audio(audio_file) if isinstance(audio_file, str) else audio_file
+    with model_pool.inference(model_key):
+        result = whisper_model.transcribe(audio, language=language, batch_size=batch_size)
     return result["segments"], result["language"]
 
 """# 3. Separating music from speech using Demucs
@@ -590,28 +394,52 @@ Separating music from speech is essential when dealing with recordings containin
 
 Demucs employs a neural network trained to distinguish between different audio sources within a mixture. When applied to an audio file, it separates the vocal track from the instrumental, allowing subsequent tools like Whisper and NeMo to process the speech without interference from background music.
 
-This separation step not only benefits the accuracy of speaker diarization but also improves the performance of downstream tasks that require clean speech input, such as transcription and speech recognition. By incorporating Demucs into the preprocessing pipeline, the notebook ensures that the input to the diarization system is optimized for the best possible results.
+This separation step not only benefits the accuracy of speaker diarization but also improves the performance of downstream tasks that require clean speech input, such as transcription and speech recognition.
+
+Instead of launching `python3 -m demucs.separate` as a separate program, `extract_vocals` from our `separation.py` module runs Demucs inside the notebook process. The model is kept in `model_pool`, so it counts against the memory budget, is loaded only once across runs and files, and sees the recording in overlapping 30-second chunks, which are cross-faded and written to disk as they are produced, so memory use does not grow with the length of the file. Before loading the model, a cheap detector checks how much of the recording keeps the steady energy floor of background music; speech-only recordings skip separation entirely. By incorporating Demucs into the preprocessing pipeline, the notebook ensures that the input to the diarization system is optimized for the best possible results.
+
+The separated vocals are then decoded exactly once into a 16 kHz mono float WAV file. WhisperX, the Wav2Vec2 aligner and NeMo all read that file, memory-mapped, so it is neither decoded again nor re-encoded to a separate mono file for NeMo.
 """
 
-if enable_stemming:
-    # Isolate vocals from the rest of the audio
+# Everything extract_vocals is called with, so changing any of it separates the vocals again
+demucs_options = {"model_name": "htdemucs", "chunk_seconds": 30.0, "overlap_seconds": 2.0, "music_threshold": 0.1}
 
-    return_code = os.system(
-        f'python3 -m demucs.separate -n htdemucs --two-stems=vocals "{audio_path}" -o "temp_outputs"'
-    )
 
-    if return_code != 0:
-        logging.warning("Source splitting failed, using original audio file.")
-        vocal_target = audio_path
-    else:
-        vocal_target = os.path.join(
-            "temp_outputs",
-            "htdemucs",
-            os.path.splitext(os.path.basename(audio_path))[0],
-            "vocals.wav",
+@pipeline.stage(
+    "vocals",
+    inputs=["audio"],
+    params={"enable_stemming": enable_stemming, **demucs_options, "demucs": package_version("demucs")},
+)
+def separate_vocals(out_dir, audio, device=device):
+    if not enable_stemming:
+        return audio
+
+    # Isolate vocals from the rest of the audio, chunk by chunk, unless there is no music to remove
+    try:
+        vocals_path, presence = extract_vocals(
+            audio, os.path.join(out_dir, "vocals.wav"), device=device, model_pool=model_pool, **demucs_options
+        )
+    except Exception:
+        logging.exception(
+            "Source splitting failed, using original audio file. Call pipeline.invalidate('vocals') to retry."
         )
-else:
-    vocal_target = audio_path
+        return audio
+    print(f"Music presence: {presence:.2f}")
+    return vocals_path or audio
+
+
+# Demucs runs in this process, so its model stays in model_pool for the next run. On a GPU
+# this initializes CUDA here, and section 6 then runs its two branches in threads
+vocal_target = pipeline.run("vocals")
+
+
+# Decode the vocals once into a 16 kHz mono float WAV. Transcription, alignment
+# and diarization all read this one file, memory-mapped, instead of decoding again
+@pipeline.stage("audio16k", inputs=["vocals"], params={"sampling_rate": 16000, "channels": 1})
+def decode_vocals(out_dir, vocals):
+    wav_path = os.path.join(out_dir, "audio16k.wav")
+    decode_audio(vocals, wav_path, sampling_rate=16000, channels=1)
+    return wav_path
 
 """# 4. Transcribing audio using WhisperX
 
@@ -619,6 +447,7 @@ This section focuses on leveraging WhisperX to accurately transcribe audio conte
 
 The transcription process involves processing the audio file through WhisperX to generate a set of text segments, each accompanied by timestamps indicating when the segment was spoken. This step lays the foundation for speaker diarization and further analysis by providing the necessary textual content..
 
+The transcription and the alignment in the next section are only declared as pipeline stages here. They run in section 6, at the same time as the diarization.
 """
 
 compute_type = "float16"
@@ -627,25 +456,49 @@ compute_type = "float16"
 # or run on CPU with INT8
 # compute_type = "int8"
 
-if batch_size != 0:
-    whisper_results, language = transcribe_batched(
-        vocal_target,
-        language,
-        batch_size,
-        whisper_model_name,
-        compute_type,
-        suppress_numerals,
-        device,
-    )
-else:
-    whisper_results, language = transcribe(
-        vocal_target,
-        language,
-        whisper_model_name,
-        compute_type,
-        suppress_numerals,
-        device,
-    )
+# Decoding options of the non-batched Faster Whisper path (batch_size = 0); the batched
+# WhisperX path uses the defaults of the installed whisperx, which is part of the key
+faster_whisper_options = {"beam_size": 5, "vad_filter": True}
+
+
+@pipeline.stage(
+    "segments",
+    inputs=["audio16k"],
+    params={
+        "model": whisper_model_name,
+        "language": language,
+        "batch_size": batch_size,
+        "compute_type": compute_type,
+        "cpu_compute_type": "int8",
+        "suppress_numerals": suppress_numerals,
+        "faster_whisper": {**faster_whisper_options, "version": package_version("faster-whisper")},
+        "whisperx": package_version("whisperx"),
+    },
+)
+def transcribe_vocals(out_dir, audio16k, device=device):
+    # float16 is GPU only, a branch scheduled on the CPU falls back to INT8
+    compute_dtype = compute_type if device.startswith("cuda") else "int8"
+    audio = load_audio_memmap(audio16k)
+    if batch_size != 0:
+        segments, detected_language = transcribe_batched(
+            audio,
+            language,
+            batch_size,
+            whisper_model_name,
+            compute_dtype,
+            suppress_numerals,
+            device,
+        )
+    else:
+        segments, detected_language = transcribe(
+            audio,
+            language,
+            whisper_model_name,
+            compute_dtype,
+            suppress_numerals,
+            device,
+        )
+    return {"segments": segments, "language": detected_language}
 
 """# 5. Aligning the transcription with the original audio using Wav2Vec2
 
@@ -655,76 +508,124 @@ The code loads the Wav2Vec2 alignment model and uses it to align the transcripti
 
 By combining the outputs of Whisper and Wav2Vec2, the code produces a fully aligned transcription of the speech contained in the `vocal_target` file. This aligned transcription is valuable for downstream tasks such as speaker diarization, sentiment analysis, and language identification.
 
+The alignment reads the shared 16 kHz buffer instead of loading the audio again, and `align` from `alignment.py` computes the Wav2Vec2 outputs of all segments before WhisperX aligns the text. On a GPU, segments of similar length are batched together, so the model runs a few large forward passes instead of one per segment, with little padding and a bounded amount of audio per batch. This only applies to models with a layer-norm feature extractor: the base Wav2Vec2 models, including WhisperX's default English aligner, use group norm, which normalizes over the padding too, so they still run one segment per forward pass. On a CPU, the segments are spread over a thread pool. WhisperX then turns these outputs into word timestamps.
+
 If no Wav2Vec2 model is available for the specified language, word timestamps generated by Whisper will be used instead.
 """
 
-if language in wav2vec2_langs:
-    device = "cuda"
-    alignment_model, metadata = whisperx.load_align_model(
-        language_code=language, device=device
-    )
-    result_aligned = whisperx.align(
-        whisper_results, alignment_model, metadata, vocal_target, device
-    )
-    word_timestamps = filter_missing_timestamps(
-        result_aligned["word_segments"],
-        initial_timestamp=whisper_results[0].get("start"),
-        final_timestamp=whisper_results[-1].get("end"),
-    )
-
-    # clear gpu vram
-    del alignment_model
-    torch.cuda.empty_cache()
-else:
-    assert batch_size == 0, (  # TODO: add a better check for word timestamps existence
-        f"Unsupported language: {language}, use --batch_size to 0"
-        " to generate word timestamps using whisper directly and fix this error."
-    )
-    word_timestamps = []
-    for segment in whisper_results:
-        for word in segment["words"]:
-            word_timestamps.append({"word": word[2], "start": word[0], "end": word[1]})
+# The alignment model of each language is the default of the installed whisperx
+@pipeline.stage(
+    "word_timestamps",
+    inputs=["audio16k", "segments"],
+    params={"whisperx": package_version("whisperx"), "batch_size": alignment_batch_size},
+    version=2,
+)
+def align_words(out_dir, audio16k, segments, device=device):
+    whisper_results, language = segments["segments"], segments["language"]
+    if language in wav2vec2_langs:
+        model_key = ("wav2vec2-align", language, device)
+        alignment_model, metadata = model_pool.get(
+            model_key, lambda: whisperx.load_align_model(language_code=language, device=device)
+        )
+        # Emissions are computed for all segments first, in length-bucketed batches on
+        # a GPU or in a thread pool on the CPU, straight from the memory-mapped buffer
+        with model_pool.inference(model_key):
+            result_aligned = align(
+                whisper_results, alignment_model, metadata, load_audio_memmap(audio16k), device,
+                batch_size=alignment_batch_size,
+            )
+        word_timestamps = filter_missing_timestamps(
+            result_aligned["word_segments"],
+            initial_timestamp=whisper_results[0].get("start"),
+            final_timestamp=whisper_results[-1].get("end"),
+        )
+    else:
+        assert batch_size == 0, (  # TODO: add a better check for word timestamps existence
+            f"Unsupported language: {language}, use --batch_size to 0"
+            " to generate word timestamps using whisper directly and fix this error."
+        )
+        word_timestamps = []
+        for segment in whisper_results:
+            for word in segment["words"]:
+                word_timestamps.append({"word": word[2], "start": word[0], "end": word[1]})
+    return word_timestamps
 
 """# 6. Using NeMo's MSDD model for speaker diarization
 This code employs the NVIDIA NeMo MSDD (Multi-scale Diarization Decoder) model to perform speaker diarization on an audio signal. Speaker diarization is the process of separating an audio signal into different segments based on who is speaking at any given time.
+
+Diarization does not need the transcript: the two branches only meet when words are mapped to speakers. `pipeline.run_parallel` therefore runs the transcription + alignment branch and the VAD + speaker embedding + MSDD branch in two worker processes, each on its assigned device (set `branch_devices` in the first section), and joins them. With two GPUs each branch gets its own; on a CPU-only machine the cores are split between them. Either way the end-to-end time approaches the longer branch instead of the sum of both. A CUDA context cannot be inherited through a fork, so if the notebook has already used the GPU itself, as Demucs does in section 3, `run_parallel` runs the two branches in threads of the notebook process instead. They still overlap, since the models release the GIL while they compute, and the models they load stay in `model_pool`.
 """
 
-# Convert audio to mono for NeMo combatibility
-sound = AudioSegment.from_file(vocal_target).set_channels(1)
 ROOT = os.getcwd()
 temp_path = os.path.join(ROOT, "temp_outputs")
-os.makedirs(temp_path, exist_ok=True)
-sound.export(os.path.join(temp_path, "mono_file.wav"), format="wav")
 
-# Initialize NeMo MSDD diarization model
-msdd_model = NeuralDiarizer(cfg=create_config(temp_path)).to("cuda")
-msdd_model.diarize()
 
-del msdd_model
-torch.cuda.empty_cache()
+@pipeline.stage(
+    "rttm",
+    inputs=["audio16k"],
+    params={
+        "domain": DOMAIN_TYPE,
+        "config_version": NEMO_CONFIG_VERSION,
+        "template": file_digest(config_template_path(DOMAIN_TYPE, NEMO_CONFIG_VERSION)),
+        "overrides": diarization_overrides,
+        "nemo_toolkit": package_version("nemo_toolkit"),
+    },
+    version=2,
+)
+def diarize(out_dir, audio16k, device=device):
+    # The shared 16 kHz mono file is already what NeMo expects, the manifest points straight at it
+    os.makedirs(temp_path, exist_ok=True)
+
+    # The manifest and output paths are the same for every file, so a pooled
+    # MSDD model picks up the new manifest written by create_config
+    config = create_config(temp_path, audio16k)
+    model_key = ("msdd", f"diar_infer_{DOMAIN_TYPE}", device)
+    msdd_model = model_pool.get(model_key, lambda: NeuralDiarizer(cfg=config).to(device))
+    with model_pool.inference(model_key):
+        msdd_model.diarize()
+
+    # Keep the RTTM in the cache, temp_path is removed at the end of the notebook
+    uniq_id = os.path.splitext(os.path.basename(audio16k))[0]
+    rttm_path = os.path.join(out_dir, uniq_id + ".rttm")
+    shutil.copyfile(os.path.join(temp_path, "pred_rttms", uniq_id + ".rttm"), rttm_path)
+
+    # Average the TitaNet embeddings NeMo already computed into one vector per speaker
+    embeddings, start_ms, end_ms = load_subsegment_embeddings(os.path.join(temp_path, "speaker_outputs"), uniq_id)
+    speakers, centroids = speaker_centroids(embeddings, start_ms, end_ms, read_rttm(rttm_path))
+    embeddings_path = os.path.join(out_dir, "speaker_embeddings.npz")
+    save_speaker_embeddings(embeddings_path, speakers, centroids)
+    return {"rttm": rttm_path, "speaker_embeddings": embeddings_path}
+
+
+# The transcription + alignment branch and the diarization branch only meet in
+# get_words_speaker_mapping, so both run at the same time
+branch_outputs = pipeline.run_parallel(["word_timestamps", "rttm"], devices=branch_devices)
+word_timestamps, rttm_path = branch_outputs["word_timestamps"], branch_outputs["rttm"]["rttm"]
+speaker_embeddings_path = branch_outputs["rttm"]["speaker_embeddings"]
+
+transcription = pipeline.run("segments")
+whisper_results, language = transcription["segments"], transcription["language"]
+print(pipeline.report())
 
 """# 7. Mapping speakers to sentences according to timestamps
 
-The code in this section reads the speaker labels and their corresponding timestamps from the output file generated by the NeMo MSDD model. It then uses the `get_words_speaker_mapping` function to map each word in the transcription to its respective speaker based on the timestamp information.
+The code in this section reads the speaker labels and their corresponding timestamps from the output file generated by the NeMo MSDD model with `read_rttm`, which loads them into NumPy arrays of start times, end times and speaker ids. A `SpeakerTurnIndex` built on these arrays answers "who is speaking at t" and "which turns overlap a time range" in logarithmic time, which is useful for analyzing overlapping speech in long recordings. The code then uses the `get_words_speaker_mapping` function to map each word in the transcription to its respective speaker based on the timestamp information.
 
 This mapping process ensures that each word is attributed to the correct speaker, creating a comprehensive representation of who spoke what and when. The resulting `wsm` (Word-Speaker Mapping) variable contains a list of dictionaries, where each dictionary represents a word and its associated speaker, start time, and end time.
 
 By mapping speakers to sentences according to timestamps, the code lays the foundation for further analysis and processing of the diarized transcription.
 """
 
-# Reading timestamps <> Speaker Labels mapping
-
-speaker_ts = []
-with open(os.path.join(temp_path, "pred_rttms", "mono_file.rttm"), "r") as f:
-    lines = f.readlines()
-    for line in lines:
-        line_list = line.split(" ")
-        s = int(float(line_list[5]) * 1000)
-        e = s + int(float(line_list[8]) * 1000)
-        speaker_ts.append([s, e, int(line_list[11].split("_")[-1])])
+# Reading timestamps <> Speaker Labels mapping, as NumPy arrays of start ms, end ms and speaker id
+speaker_ts = read_rttm(rttm_path)
 
 wsm = get_words_speaker_mapping(word_timestamps, speaker_ts, "start")
 
+# The interval index answers "who is speaking at t" and "which turns overlap [a, b)" with binary searches
+turn_index = SpeakerTurnIndex(speaker_ts)
+print(f"{len(turn_index)} speaker turns, {turn_index.overlap_ms() / 1000:.1f}s of overlapping speech")
+print("Speakers at 60s:", turn_index.speakers_at(60_000))
+
 """# 8. Enhancing speaker attribution with punctuation-based realignment
 
 This section introduces a method for disambiguating speaker labels in cases where a sentence is split between two different speakers. By leveraging punctuation marks, the code determines the dominant speaker for each sentence in the transcription.
@@ -740,75 +641,179 @@ If a sentence is split between two speakers, the code identifies the most freque
 
 Additionally, the code handles situations where one speaker is delivering a monologue while other speakers make occasional comments in the background. In such cases, it ignores the comments and assigns the entire monologue to the speaker who is speaking the majority of the time.
 
+The punctuation itself is restored by the `kredor/punctuate-all` model with `predict_punctuation` from `punctuation.py`. It cuts the transcript into overlapping windows of `punctuation_window_words` words and sends `punctuation_batch_size` windows through the model at a time. Each word keeps the label predicted in the window where it has the most context around it, so long transcripts use a constant amount of memory and a larger batch size processes them faster on a GPU.
+
 By realigning speech segments based on punctuation, the code provides a robust and reliable method for enhancing speaker attribution in the transcription.
 """
 
-if language in punct_model_langs:
-    # restoring punctuation in the transcript to help realign the sentences
-    punct_model = PunctuationModel(model="kredor/punctuate-all")
-
-    words_list = list(map(lambda x: x["word"], wsm))
-
-    labled_words = punct_model.predict(words_list)
-
-    ending_puncts = ".?!"
-    model_puncts = ".,;:!?"
-
-    # We don't want to punctuate U.S.A. with a period. Right?
-    is_acronym = lambda x: re.fullmatch(r"\b(?:[a-zA-Z]\.){2,}", x)
+@pipeline.stage(
+    "punctuated_words",
+    inputs=["segments", "word_timestamps"],
+    params={
+        "model": "kredor/punctuate-all",
+        "window_words": punctuation_window_words,
+        "overlap_words": punctuation_overlap_words,
+        "batch_size": punctuation_batch_size,
+    },
+    version=2,
+)
+def restore_punctuation(out_dir, segments, word_timestamps):
+    words_list = [word_dict["word"] for word_dict in word_timestamps]
+    language = segments["language"]
+    if language not in punct_model_langs:
+        logging.warning(
+            f"Punctuation restoration is not available for {language} language. Using the original punctuation."
+        )
+        return words_list
+
+    # restoring punctuation in the transcript to help realign the sentences,
+    # batching overlapping word windows through the model
+    model_key = ("punctuation", "kredor/punctuate-all")
+    punct_model = model_pool.get(model_key, lambda: PunctuationModel(model="kredor/punctuate-all"))
+
+    with model_pool.inference(model_key):
+        labels = predict_punctuation(
+            punct_model.pipe,
+            words_list,
+            window_words=punctuation_window_words,
+            overlap_words=punctuation_overlap_words,
+            batch_size=punctuation_batch_size,
+        )
+    return apply_punctuation(words_list, labels)
 
-    for word_dict, labeled_tuple in zip(wsm, labled_words):
-        word = word_dict["word"]
-        if (
-            word
-            and labeled_tuple[1] in ending_puncts
-            and (word[-1] not in model_puncts or is_acronym(word))
-        ):
-            word += labeled_tuple[1]
-            if word.endswith(".."):
-                word = word.rstrip(".")
-            word_dict["word"] = word
 
-else:
-    logging.warning(
-        f"Punctuation restoration is not available for {language} language. Using the original punctuation."
-    )
+for word_dict, word in zip(wsm, pipeline.run("punctuated_words")):
+    word_dict["word"] = word
 
 wsm = get_realigned_ws_mapping_with_punctuation(wsm)
 ssm = get_sentences_speaker_mapping(wsm, speaker_ts)
 
 """# 9. Finalizing the diarization process
 
-In this final section, the code performs essential cleanup tasks, exports the diarization results for further use, and replaces speaker IDs with their corresponding names. The main steps include:
+In this final section, the code names the speakers, exports the diarization results for further use, and performs essential cleanup tasks. The main steps include:
 
-1. **Saving the Speaker-Aware Transcript**: The `get_speaker_aware_transcript` function is used to generate a transcript that incorporates both the textual content and the corresponding speaker information. This transcript is then saved to a file with the same name as the input audio file, but with a ".txt" extension.
+1. **Mapping Speaker IDs to Speaker Names**: The generic speaker IDs (e.g., "Speaker 0", "Speaker 1", "Speaker 2") are replaced with the actual names of the speakers, using a speaker registry. The diarization stage keeps one TitaNet embedding per speaker, the average of the embeddings NeMo computed while clustering. `SpeakerRegistry` stores named embeddings in `speaker_registry.npz` and matches the speakers of a new recording to them by cosine similarity. Speakers that are not recognized yet keep their "Speaker <id>" label. To name them, add the audio file to `manual_speaker_names` with the IDs you checked in this recording's transcript; only those names are enrolled, and in later recordings, such as the next episode of a weekly show, the speakers are labelled automatically.
 
-2. **Exporting the Diarization Results in SRT Format**: The `write_srt` function is employed to export the diarization results in the SubRip Text (SRT) format. This format is commonly used for subtitles and includes speaker labels and precise timestamps for each utterance. The SRT file is saved with the same name as the input audio file, but with a ".srt" extension.
+2. **Saving the Speaker-Aware Transcript, SRT and JSON**: The `write_transcripts` function from `helpers.py` goes over the sentences once and writes each of them to a speaker-aware transcript (".txt"), SubRip Text subtitles (".srt") with precise timestamps for each utterance, and a JSON list of sentences, all named after the input audio file. The speaker names are set on the sentences with `name_speakers` from `speakers.py`, or passed to `write_transcripts` as `speaker_names` to apply them while writing, so no file has to be read back and rewritten, and the sentences can come from a generator such as `iter_sentences_speaker_mapping`. The files' buffers batch the writes instead of flushing every subtitle. `get_speaker_aware_transcript` and `write_srt` remain available for writing a single format.
 
-3. **Cleaning Up Temporary Files**: The `cleanup` function is called to remove any temporary files or directories created during the diarization process. This step ensures a clean and organized working environment, freeing up storage space and maintaining system efficiency.
+3. **Cleaning Up Temporary Files**: The `cleanup` function is called to remove any temporary files or directories created during the diarization process. This step ensures a clean and organized working environment, freeing up storage space and maintaining system efficiency. The stage results in `diarization_cache` are kept, so running the notebook again, for example to change the speaker names, reuses the vocals, transcription, word timestamps, RTTM and punctuation instead of recomputing them. Only the stages whose inputs or parameters changed are executed again, as `pipeline.report()` shows.
 
-4. **Mapping Speaker IDs to Speaker Names**: The code reads the content of the previously saved speaker-aware transcript file and replaces the generic speaker IDs (e.g., "Speaker 0", "Speaker 1", "Speaker 2") with the actual names of the speakers.
+By completing these final steps, the diarization process is concluded, and the results are made available for further analysis, post-processing, or integration with other tools and workflows. The exported speaker-aware transcript, SRT file and JSON provide valuable insights into the content and structure of the audio recording, enabling a wide range of applications, such as content analysis, speaker identification, and subtitle generation.
+"""
 
-By completing these final steps, the diarization process is concluded, and the results are made available for further analysis, post-processing, or integration with other tools and workflows. The exported speaker-aware transcript, SRT file, and the transcript with mapped speaker names provide valuable insights into the content and structure of the audio recording, enabling a wide range of applications, such as content analysis, speaker identification, and subtitle generation.
+# Match the speakers of this recording to the ones named in earlier recordings
+speaker_registry = SpeakerRegistry("speaker_registry.npz", threshold=0.7)
+speakers, centroids = load_speaker_embeddings(speaker_embeddings_path)
+speaker_names = speaker_registry.match(speakers, centroids)
+print("Recognized speakers:", speaker_names)
+
+# Names for speakers the registry does not know yet, per audio file. Speaker IDs depend on the
+# recording, so only add an entry after checking the IDs in that file's transcript, e.g.
+# "20150415-Fracking_the_debate.mp4": {0: "Ewa Jasiewicz", 1: "Chris Faulkner", 2: "Matt Frei"}
+manual_speaker_names = {}
+for speaker, name in manual_speaker_names.get(os.path.basename(audio_path), {}).items():
+    if speaker not in speaker_names and name not in speaker_names.values():
+        speaker_names[speaker] = name
+speaker_registry.update(speaker_names, speakers, centroids)
+speaker_registry.save()
+
+# Replace the speaker IDs with the names; unnamed speakers keep their "Speaker <id>" label
+ssm = name_speakers(ssm, speaker_names)
+
+# Write the transcript, subtitles and JSON in one pass
+base_path = os.path.splitext(audio_path)[0]
+with open(f"{base_path}.txt", "w", encoding="utf-8-sig") as txt, \
+        open(f"{base_path}.srt", "w", encoding="utf-8-sig") as srt, \
+        open(f"{base_path}.json", "w", encoding="utf-8") as js:
+    write_transcripts(ssm, txt_file=txt, srt_file=srt, json_file=js)
+
+# temp_path only exists when the diarization stage actually ran
+if os.path.exists(temp_path):
+    cleanup(temp_path)
+print(pipeline.report())
+
+"""# 10. Processing a queue of recordings with a persistent model pool
+
+Loading Whisper, the Wav2Vec2 alignment model, MSDD and the punctuation model takes longer than processing a short recording with them. To diarize many files, the notebook can run as a long-lived worker instead: audio files dropped into `diarization_queue/inbox` are claimed one at a time, run through the same stages and written to `diarization_queue/done` together with a JSON report.
+
+All stages run in this process with `pipeline.run`, so every model stays in `model_pool` between files and is only loaded for the first one. The forked branch workers of section 6 would each load their own copies, which is why they are not used here. The report of every file separates the time spent loading models from the time spent on inference, and `model_pool.report()` shows the totals per model.
 """
 
-with open(f"{os.path.splitext(audio_path)[0]}.txt", "w", encoding="utf-8-sig") as f:
-    get_speaker_aware_transcript(ssm, f)
+def diarize_file(path, output_dir):
+    pipeline.source("audio", path)
+    word_timestamps = pipeline.run("word_timestamps")
+    diarization = pipeline.run("rttm")
+
+    speaker_ts = read_rttm(diarization["rttm"])
+    wsm = get_words_speaker_mapping(word_timestamps, speaker_ts, "start")
+    for word_dict, word in zip(wsm, pipeline.run("punctuated_words")):
+        word_dict["word"] = word
+    wsm = get_realigned_ws_mapping_with_punctuation(wsm)
+
+    # Known speakers are named automatically, the others keep their "Speaker <id>" label
+    speakers, centroids = load_speaker_embeddings(diarization["speaker_embeddings"])
+    speaker_names = speaker_registry.match(speakers, centroids)
+    speaker_registry.update(speaker_names, speakers, centroids)
+    speaker_registry.save()
+
+    # Sentences are written as they are formed, the full list is never built
+    base_path = os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0])
+    with open(f"{base_path}.txt", "w", encoding="utf-8-sig") as txt, \
+            open(f"{base_path}.srt", "w", encoding="utf-8-sig") as srt, \
+            open(f"{base_path}.json", "w", encoding="utf-8") as js:
+        write_transcripts(
+            iter_sentences_speaker_mapping(wsm, speaker_ts),
+            txt_file=txt, srt_file=srt, json_file=js, speaker_names=speaker_names,
+        )
+
+    if os.path.exists(temp_path):
+        cleanup(temp_path)
+    return {"txt": f"{base_path}.txt", "srt": f"{base_path}.srt", "json": f"{base_path}.json", "speakers": speaker_names}
 
-with open(f"{os.path.splitext(audio_path)[0]}.srt", "w", encoding="utf-8-sig") as srt:
-    write_srt(ssm, srt)
 
-cleanup(temp_path)
+queue = FileQueue("diarization_queue")
+shutil.copy(audio_path, queue.inbox)
 
-# Open the file
-with open(f"{os.path.splitext(audio_path)[0]}.txt", 'r') as f:
-    text = f.read()
+# Stops after the inbox has been empty for a minute; None keeps the worker running
+reports = serve(queue, diarize_file, model_pool, idle_timeout=60)
+for report in reports:
+    print(f"{report['file']}: {report['status']} in {report['wall_seconds']:.1f}s "
+          f"(model loading {report['model_load_seconds']:.1f}s, inference {report['inference_seconds']:.1f}s)")
+print(json.dumps(model_pool.report(), indent=2))
 
-# Replace the speaker IDs with names
-text = text.replace('Speaker 0','Ewa Jasiewicz')
-text = text.replace('Speaker 1','Chris Faulkner')
-text = text.replace('Speaker 2','Matt Frei')
+"""When only the speaker turns are needed, a whole directory can be diarized with one MSDD invocation. Every file is decoded to 16 kHz mono once, and a single manifest lists all of them, so NeMo runs VAD, the TitaNet embeddings and MSDD over the batch in one `diarize()` call and writes one RTTM per recording, instead of starting the pipeline again for every file.
+"""
 
-# Write the file to disk
-with open(audio_path[:-4] + '-with-speakers-names.txt', 'w') as f:
-    f.write(text)
\ No newline at end of file
+def diarize_directory(input_dir, output_dir):
+    audio_dir = os.path.join(temp_path, "batch_audio")
+    os.makedirs(audio_dir, exist_ok=True)
+    os.makedirs(output_dir, exist_ok=True)
+
+    # NeMo names its outputs after the file, so duplicate names are rejected
+    # before any of them is decoded over another's WAV
+    audio_paths = list_audio_files(input_dir)
+    wav_paths = {}
+    for path, uniq_id in zip(audio_paths, recording_ids(audio_paths)):
+        wav_paths[path] = os.path.join(audio_dir, uniq_id + ".wav")
+        decode_audio(path, wav_paths[path])
+
+    # Same manifest and output paths as the single-file stage, so the pooled MSDD model is reused
+    config = create_config(temp_path, list(wav_paths.values()))
+    model_key = ("msdd", f"diar_infer_{DOMAIN_TYPE}", device)
+    msdd_model = model_pool.get(model_key, lambda: NeuralDiarizer(cfg=config).to(device))
+    with model_pool.inference(model_key):
+        msdd_model.diarize()
+
+    rttm_paths = {}
+    for path, wav_path in wav_paths.items():
+        uniq_id = os.path.splitext(os.path.basename(wav_path))[0]
+        rttm_paths[path] = os.path.join(output_dir, uniq_id + ".rttm")
+        shutil.copyfile(os.path.join(temp_path, "pred_rttms", uniq_id + ".rttm"), rttm_paths[path])
+    cleanup(temp_path)
+    return rttm_paths
+
+
+rttm_paths = diarize_directory(queue.done, "diarization_rttms")
+for path, rttm in rttm_paths.items():
+    turns = SpeakerTurnIndex(read_rttm(rttm))
+    print(f"{os.path.basename(path)}: {len(turns)} speaker turns")
@@ -0,0 +1,318 @@
+"""
+Persistent model pool and file-queue worker for the diarization pipeline.
+
+Instead of loading Whisper, the alignment model, MSDD and the punctuation model
+inside every call and deleting them afterwards, stages ask a `ModelPool` for
+them. A model is loaded on first use and kept until the pool's memory budget
+is exceeded, then the least recently used models are evicted. The pool times
+model loading and inference separately. Different models load concurrently,
+e.g. from the thread branches of `StagePipeline.run_parallel`, while callers
+asking for a model that is still loading wait for that load.
+
+`serve` turns a process into a long-lived worker: it claims audio files from
+a `FileQueue` directory one at a time, processes them with the pooled models
+and records how much of each file's time went into loading versus inference.
+
+Usage:
+  pool = ModelPool(memory_budget_gb=20)
+  model = pool.get(("whisper", "large-v2"), lambda: WhisperModel("large-v2"))
+  with pool.inference(("whisper", "large-v2")):
+      segments = model.transcribe(audio)
+"""
+import gc
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+def used_memory():
+    """
+    Bytes in use by this process plus the GPU memory in use, if CUDA is initialized.
+
+    Used to estimate the size of models without tensors to count from the
+    difference before and after loading.
+    """
+    gpu = 0
+    try:
+        import torch
+
+        if torch.cuda.is_initialized():
+            free, total = torch.cuda.mem_get_info()
+            gpu = total - free
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        rss = 0
+    return gpu + rss
+
+
+class _Unmeasurable(Exception):
+    pass
+
+
+def _model_bytes(model, depth):
+    if type(model).__module__.partition(".")[0] == "ctranslate2":
+        raise _Unmeasurable  # the weights live in C++
+    if callable(getattr(model, "parameters", None)) and callable(getattr(model, "buffers", None)):
+        tensors = {id(tensor): tensor for tensor in list(model.parameters()) + list(model.buffers())}
+        return sum(tensor.numel() * tensor.element_size() for tensor in tensors.values())
+    if depth < 0 or isinstance(model, (str, bytes, int, float, dict)):
+        return 0
+    if isinstance(model, (tuple, list)):
+        children = model
+    elif hasattr(model, "__dict__"):
+        children = vars(model).values()
+    else:
+        return 0
+    return sum(_model_bytes(child, depth - 1) for child in children)
+
+
+def model_size(model, depth: int = 2):
+    """
+    Bytes of the parameters and buffers of a loaded model, or None if they cannot be counted.
+
+    Counts the torch modules found in the object itself, in the items of a
+    tuple or list, e.g. (model, metadata), and up to `depth` levels into the
+    attributes of wrappers such as a Transformers pipeline. Objects holding a
+    CTranslate2 model, whose weights are not visible from Python, return None.
+    """
+    try:
+        size = _model_bytes(model, depth)
+    except _Unmeasurable:
+        return None
+    return size or None
+
+
+class ModelPool:
+    """
+    Keeps loaded models across calls, evicting the least recently used ones to stay within a memory budget.
+
+    Parameters:
+      memory_budget_gb: combined size of the pooled models; None never evicts.
+        A model's size is the bytes of its parameters and buffers (`model_size`),
+        or passed to `get`; only models without countable tensors are measured
+        as the memory growth while loading, which other threads can inflate.
+    """
+
+    def __init__(self, memory_budget_gb: float = None):
+        self.memory_budget = None if memory_budget_gb is None else int(memory_budget_gb * 1024**3)
+        self._models = OrderedDict()
+        self.stats = {}
+        # Pipeline branches may share the pool from threads, see StagePipeline.run_parallel.
+        # Loading happens outside the lock; _loading marks the keys being loaded
+        self._lock = threading.RLock()
+        self._loading = {}
+
+    def _stats(self, key):
+        return self.stats.setdefault(key, {"loads": 0, "load_seconds": 0.0, "calls": 0, "inference_seconds": 0.0})
+
+    def get(self, key, loader, size_bytes: int = None):
+        """
+        Return the model stored under `key`, calling `loader()` if it is not loaded yet.
+
+        Parameters:
+          key: hashable identity of the model, including everything that changes
+            the loaded object (name, device, compute type, options)
+          loader: zero-argument callable that loads the model
+          size_bytes: known size of the model, overrides the measurement
+        """
+        while True:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    return self._models[key][0]
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = threading.Event()
+                    break
+            # Another thread loads this model; if that load fails, this one retries it
+            loading.wait()
+
+        try:
+            before = used_memory()
+            start = time.perf_counter()
+            model = loader()
+            seconds = time.perf_counter() - start
+            size = size_bytes if size_bytes is not None else model_size(model)
+            if size is None:
+                size = max(0, used_memory() - before)
+            with self._lock:
+                stats = self._stats(key)
+                stats["loads"] += 1
+                stats["load_seconds"] += seconds
+                self._models[key] = (model, size)
+                logging.info(f"Loaded {key} ({size / 1024**2:.0f} MB) in {seconds:.1f}s")
+                self._evict_to_budget(keep=key)
+            return model
+        finally:
+            with self._lock:
+                del self._loading[key]
+            loading.set()
+
+    @contextmanager
+    def inference(self, key):
+        """
+        Time a block of work done with the model under `key`.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                stats = self._stats(key)
+                stats["calls"] += 1
+                stats["inference_seconds"] += time.perf_counter() - start
+
+    @property
+    def memory_used(self):
+        return sum(size for _, size in self._models.values())
+
+    def _evict_to_budget(self, keep):
+        if self.memory_budget is None:
+            return
+        for key in list(self._models):
+            if self.memory_used <= self.memory_budget:
+                break
+            if key != keep:
+                self.evict(key)
+
+    def evict(self, key=None):
+        """
+        Drop one model, or every model when `key` is None, and release cached GPU memory.
+        """
+        with self._lock:
+            keys = list(self._models) if key is None else [key]
+            for k in keys:
+                if self._models.pop(k, None) is not None:
+                    logging.info(f"Evicted {k}")
+        gc.collect()
+        try:
+            import torch
+
+            if torch.cuda.is_initialized():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+    def totals(self):
+        """
+        Total (load_seconds, inference_seconds) over all models so far.
+        """
+        return (
+            sum(stats["load_seconds"] for stats in self.stats.values()),
+            sum(stats["inference_seconds"] for stats in self.stats.values()),
+        )
+
+    def report(self):
+        """
+        Per-model load and inference statistics, and the models currently loaded.
+        """
+        return {
+            "loaded": [str(key) for key in self._models],
+            "memory_used_mb": self.memory_used / 1024**2,
+            "models": {str(key): dict(stats) for key, stats in self.stats.items()},
+        }
+
+
+class FileQueue:
+    """
+    Directory-based job queue.
+
+    Drop audio files into `<root>/inbox`. A worker claims a file by renaming it
+    into `processing/`, which is atomic, so several workers can share a queue.
+    Finished files move to `done/` next to their outputs and a JSON report,
+    failed ones to `failed/` with the traceback.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.inbox, self.processing, self.done, self.failed = (
+            os.path.join(self.root, name) for name in ("inbox", "processing", "done", "failed")
+        )
+        for directory in (self.inbox, self.processing, self.done, self.failed):
+            os.makedirs(directory, exist_ok=True)
+
+    def claim(self):
+        """
+        Move the oldest file in the inbox to `processing/` and return its new path, or None.
+        """
+        entries = [entry for entry in os.scandir(self.inbox) if entry.is_file() and not entry.name.startswith(".")]
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            path = os.path.join(self.processing, entry.name)
+            try:
+                os.rename(entry.path, path)
+            except FileNotFoundError:
+                continue  # claimed by another worker
+            return path
+        return None
+
+    def _finish(self, path, directory, report_name, report_text):
+        shutil.move(path, os.path.join(directory, os.path.basename(path)))
+        with open(os.path.join(directory, report_name), "w", encoding="utf-8") as f:
+            f.write(report_text)
+
+    def complete(self, path: str, report: dict):
+        self._finish(path, self.done, os.path.basename(path) + ".json", json.dumps(report, indent=2))
+
+    def fail(self, path: str, error: str):
+        self._finish(path, self.failed, os.path.basename(path) + ".error.txt", error)
+
+
+def serve(queue: FileQueue, process_file, pool: ModelPool = None, poll_seconds: float = 2.0,
+          idle_timeout: float = None, max_files: int = None):
+    """
+    Process files from `queue` until it stays empty for `idle_timeout` seconds
+    (forever when None) or `max_files` files were handled.
+
+    Parameters:
+      queue: the `FileQueue` to work on
+      process_file: callable `(path, output_dir)` returning a JSON-serializable dict
+        of outputs; it should get its models from `pool`
+      pool: the model pool shared by all files, used for the timing report
+    Returns:
+      reports: one dict per processed file with wall, load and inference seconds
+    """
+    reports = []
+    idle_since = time.monotonic()
+    while max_files is None or len(reports) < max_files:
+        path = queue.claim()
+        if path is None:
+            if idle_timeout is not None and time.monotonic() - idle_since >= idle_timeout:
+                break
+            time.sleep(poll_seconds)
+            continue
+
+        load_before, inference_before = pool.totals() if pool else (0.0, 0.0)
+        start = time.perf_counter()
+        report = {"file": os.path.basename(path)}
+        try:
+            report["outputs"] = process_file(path, queue.done)
+            report["status"] = "done"
+        except Exception:
+            report["status"] = "failed"
+            report["error"] = traceback.format_exc()
+        load_after, inference_after = pool.totals() if pool else (0.0, 0.0)
+        report["wall_seconds"] = time.perf_counter() - start
+        report["model_load_seconds"] = load_after - load_before
+        report["inference_seconds"] = inference_after - inference_before
+
+        if report["status"] == "done":
+            queue.complete(path, report)
+        else:
+            queue.fail(path, report["error"])
+        logging.info(
+            f"{report['file']}: {report['status']} in {report['wall_seconds']:.1f}s "
+            f"(load {report['model_load_seconds']:.1f}s, inference {report['inference_seconds']:.1f}s)"
+        )
+        reports.append(report)
+        idle_since = time.monotonic()
+    return reports
@@ -0,0 +1,115 @@
+"""
+Batched, windowed punctuation restoration for the diarization pipeline.
+
+`PunctuationModel.predict` from deepmultilingualpunctuation feeds its chunks to
+the token classification pipeline one at a time and keeps only the first words
+of every chunk. `predict_punctuation` instead streams fixed-size, overlapping
+word windows through the same pipeline in batches, and every word takes its
+label from the window where it is furthest from an edge, i.e. where the model
+saw the most context on both sides. Windows are generated lazily and the
+pipeline yields its results as it goes, so memory stays flat however long the
+transcript is.
+
+Usage:
+  model = PunctuationModel(model="kredor/punctuate-all")
+  labels = predict_punctuation(model.pipe, words, batch_size=16)
+  words = apply_punctuation(words, labels)
+"""
+import re
+
+import numpy as np
+
+ENDING_PUNCTUATIONS = ".?!"
+MODEL_PUNCTUATIONS = ".,;:!?"
+# We don't want to punctuate U.S.A. with a period. Right?
+ACRONYM_PATTERN = re.compile(r"\b(?:[a-zA-Z]\.){2,}")
+
+
+def word_windows(n_words: int, window_words: int = 230, overlap_words: int = 16):
+    """
+    (start, stop, keep_start, keep_stop) word ranges of the windows covering `n_words` words.
+
+    Consecutive windows share `overlap_words` words; each window keeps the labels
+    of [keep_start, keep_stop), split in the middle of the overlaps, so the
+    kept ranges tile the words exactly once.
+    """
+    if n_words <= window_words:
+        if n_words:
+            yield 0, n_words, 0, n_words
+        return
+    overlap_words = min(overlap_words, window_words // 2)
+    hop = window_words - overlap_words
+    keep_start = 0
+    for start in range(0, n_words - overlap_words, hop):
+        stop = min(start + window_words, n_words)
+        keep_stop = n_words if stop == n_words else stop - overlap_words // 2
+        yield start, stop, keep_start, keep_stop
+        keep_start = keep_stop
+        if stop == n_words:
+            return
+
+
+def word_labels(words, tokens):
+    """
+    Label of every word from the token classification output of `" ".join(words)`.
+
+    As in `PunctuationModel.predict`, a word takes the label of its last
+    subtoken, and words without tokens are labelled "0" (no punctuation).
+    """
+    word_ends = np.cumsum([len(word) + 1 for word in words]) - 1
+    labels = np.full(len(words), "0", dtype=object)
+    if not tokens:
+        return labels
+    token_ends = np.array([token["end"] for token in tokens])
+    if token_ends[-1] < len(" ".join(words).rstrip()):
+        raise ValueError("Punctuation window too large, the text got clipped; reduce window_words")
+    token_word = np.searchsorted(word_ends, token_ends, side="left")
+    last_token = np.flatnonzero(np.diff(token_word, append=len(words)))
+    labels[token_word[last_token]] = [tokens[i]["entity"] for i in last_token]
+    return labels
+
+
+def predict_punctuation(token_classifier, words, window_words: int = 230, overlap_words: int = 16,
+                        batch_size: int = 8):
+    """
+    Punctuation label of every word, predicted in batches of overlapping windows.
+
+    Parameters:
+      token_classifier: the Transformers "ner" pipeline, `PunctuationModel(...).pipe`
+      words: list of words, e.g. from the word timestamps
+      window_words: words per window; 230 keeps the text within the model's 512 tokens
+      overlap_words: words shared by consecutive windows
+      batch_size: windows per forward pass
+    Returns:
+      labels: list with one label per word, e.g. "0", ".", ",", "?"
+    """
+    windows = list(word_windows(len(words), window_words, overlap_words))
+    texts = (" ".join(words[start:stop]) for start, stop, _, _ in windows)
+    labels = []
+    for (start, stop, keep_start, keep_stop), tokens in zip(
+        windows, token_classifier(texts, batch_size=batch_size)
+    ):
+        window_labels = word_labels(words[start:stop], tokens)
+        labels.extend(window_labels[keep_start - start:keep_stop - start].tolist())
+    return labels
+
+
+def apply_punctuation(words, labels):
+    """
+    Append the predicted sentence-ending punctuation to the words that lack it.
+
+    Words already ending in punctuation keep it, except acronyms like U.S.A.,
+    and doubled periods are collapsed.
+    """
+    punctuated = list(words)
+    for i, (word, label) in enumerate(zip(words, labels)):
+        if (
+            word
+            and label in ENDING_PUNCTUATIONS
+            and (word[-1] not in MODEL_PUNCTUATIONS or ACRONYM_PATTERN.fullmatch(word))
+        ):
+            word += label
+            if word.endswith(".."):
+                word = word.rstrip(".")
+            punctuated[i] = word
+    return punctuated
@@ -0,0 +1,189 @@
+"""
+In-process, chunked vocal separation with Demucs.
+
+`extract_vocals` replaces the `python3 -m demucs.separate` subprocess: the
+model is kept in the caller's `ModelPool`, the input is decoded once into a
+memory-mapped float WAV, and Demucs only ever sees one chunk at a time.
+Consecutive chunks overlap and are cross-faded, and the vocals are streamed to
+disk as they are produced, so memory stays bounded for files of any length.
+
+Separation is skipped when `music_presence` finds (almost) no music, which
+saves the whole model pass on speech-only recordings.
+"""
+import logging
+import os
+from contextlib import nullcontext
+
+import numpy as np
+
+from helpers import decode_audio, float_wav_header, load_audio_memmap
+
+# Every Demucs model works on 44.1 kHz stereo
+DEMUCS_SAMPLING_RATE = 44100
+DEMUCS_CHANNELS = 2
+
+
+def load_separator(model_name: str = "htdemucs", device: str = None):
+    """
+    Load a Demucs model for inference on `device`.
+    """
+    import torch
+    from demucs.pretrained import get_model
+
+    device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+    model = get_model(model_name)
+    model.to(device)
+    model.eval()
+    return model
+
+
+def music_presence(
+    audio,
+    sampling_rate: int,
+    window_seconds: float = 1.0,
+    frame_seconds: float = 0.05,
+    floor_percentile: float = 10.0,
+    music_floor_db: float = -20.0,
+    silence_db: float = -60.0,
+    chunk_seconds: float = 60.0,
+):
+    """
+    Fraction of the non-silent windows that look like music.
+
+    Speech stops between words and syllables, so the quietest frames of a
+    window are far below its mean energy. Music, and speech over a music bed,
+    keeps a floor: a window whose `floor_percentile` frame energy is within
+    `music_floor_db` of the window mean counts as music. The audio is read in
+    chunks, so a memory-mapped file is never loaded whole.
+
+    Parameters:
+      audio: samples, (n,) or (n, channels), e.g. from `load_audio_memmap`
+      sampling_rate: sampling rate of `audio`
+    Returns:
+      presence: value between 0 (speech only) and 1 (music throughout)
+    """
+    frame = int(frame_seconds * sampling_rate)
+    frames_per_window = int(round(window_seconds / frame_seconds))
+    window = frame * frames_per_window
+    chunk = max(1, int(chunk_seconds / window_seconds)) * window
+    floor_index = int(floor_percentile / 100 * (frames_per_window - 1))
+    silence = 10 ** (silence_db / 10)
+    music_floor = 10 ** (music_floor_db / 10)
+
+    music_windows = voiced_windows = 0
+    for start in range(0, len(audio) - window + 1, chunk):
+        block = np.asarray(audio[start:start + chunk], dtype=np.float32)
+        if block.ndim == 2:
+            block = block.mean(axis=1)
+        n_windows = len(block) // window
+        energy = np.square(block[:n_windows * window].reshape(n_windows, frames_per_window, frame)).mean(axis=2)
+        window_energy = energy.mean(axis=1)
+        floor = np.partition(energy, floor_index, axis=1)[:, floor_index]
+        voiced = window_energy > silence
+        music_windows += np.count_nonzero(voiced & (floor > music_floor * window_energy))
+        voiced_windows += np.count_nonzero(voiced)
+    return music_windows / voiced_windows if voiced_windows else 0.0
+
+
+def mix_statistics(audio, chunk_frames: int = 1 << 20):
+    """
+    Mean and standard deviation of the mono mixture, the normalization `demucs.separate` applies.
+    """
+    total = total_sq = 0.0
+    for start in range(0, len(audio), chunk_frames):
+        block = np.asarray(audio[start:start + chunk_frames], dtype=np.float64)
+        if block.ndim == 2:
+            block = block.mean(axis=1)
+        total += block.sum()
+        total_sq += np.square(block).sum()
+    n = max(1, len(audio))
+    mean = total / n
+    std = np.sqrt(max(total_sq / n - mean * mean, 0.0))
+    return float(mean), float(std) or 1.0
+
+
+def iter_separated_vocals(model, audio, mean: float, std: float, device: str = None,
+                          chunk_seconds: float = 30.0, overlap_seconds: float = 2.0):
+    """
+    Separate `audio` chunk by chunk and yield the vocals as (channels, n) float32 arrays.
+
+    Each chunk overlaps the previous one by `overlap_seconds`; the overlap is
+    cross-faded linearly, so the yielded pieces concatenate to a seamless track
+    with the same length as the input.
+
+    Parameters:
+      model: Demucs model from `load_separator`
+      audio: (n, channels) samples at the model's sampling rate
+      mean, std: normalization from `mix_statistics`, shared by all chunks
+    """
+    import torch
+    from demucs.apply import apply_model
+
+    if len(audio) == 0:
+        return
+    chunk = int(chunk_seconds * model.samplerate)
+    overlap = min(int(overlap_seconds * model.samplerate), chunk // 2)
+    hop = chunk - overlap
+    vocals_index = model.sources.index("vocals")
+    fade_in = np.linspace(0.0, 1.0, overlap, dtype=np.float32)[None, :]
+
+    tail = None
+    for start in range(0, len(audio), hop):
+        block = np.asarray(audio[start:start + chunk], dtype=np.float32).T
+        mix = torch.from_numpy((block - mean) / std)[None]
+        with torch.no_grad():
+            separated = apply_model(model, mix, device=device, split=True, overlap=0.25, progress=False)
+        vocals = separated[0, vocals_index].cpu().numpy() * std + mean
+        if tail is not None:
+            vocals[:, :overlap] = tail * (1.0 - fade_in) + vocals[:, :overlap] * fade_in
+        if start + chunk >= len(audio):
+            yield vocals
+            return
+        tail = vocals[:, hop:]
+        yield vocals[:, :hop]
+
+
+def extract_vocals(path: str, vocals_path: str, model_name: str = "htdemucs", device: str = None,
+                   chunk_seconds: float = 30.0, overlap_seconds: float = 2.0, music_threshold: float = 0.1,
+                   model_pool=None):
+    """
+    Write the vocals of `path` to `vocals_path`, unless the input has no music to remove.
+
+    Parameters:
+      path: any file ffmpeg can decode
+      vocals_path: float WAV to write, 44.1 kHz stereo
+      music_threshold: minimum `music_presence` for separation to run
+      model_pool: `ModelPool` that keeps the Demucs model under ("demucs", model_name, device);
+        without one the model is loaded for this call only
+    Returns:
+      vocals_path: `vocals_path`, or None when separation was skipped
+      presence: the measured music presence
+    """
+    mix_path = os.path.splitext(vocals_path)[0] + ".mix.wav"
+    decode_audio(path, mix_path, DEMUCS_SAMPLING_RATE, DEMUCS_CHANNELS)
+    try:
+        mix = load_audio_memmap(mix_path)
+        presence = music_presence(mix, DEMUCS_SAMPLING_RATE)
+        if presence < music_threshold:
+            logging.info(f"Music presence {presence:.2f} is below {music_threshold}, skipping vocal separation")
+            return None, presence
+
+        key = ("demucs", model_name, device)
+        if model_pool is None:
+            model, inference = load_separator(model_name, device), nullcontext()
+        else:
+            model = model_pool.get(key, lambda: load_separator(model_name, device))
+            inference = model_pool.inference(key)
+        mean, std = mix_statistics(mix)
+        n_frames = 0
+        with inference, open(vocals_path, "wb") as f:
+            f.write(float_wav_header(0, DEMUCS_SAMPLING_RATE, DEMUCS_CHANNELS))
+            for vocals in iter_separated_vocals(model, mix, mean, std, device, chunk_seconds, overlap_seconds):
+                f.write(np.ascontiguousarray(vocals.T, dtype="<f4").tobytes())
+                n_frames += vocals.shape[1]
+            f.seek(0)
+            f.write(float_wav_header(n_frames, DEMUCS_SAMPLING_RATE, DEMUCS_CHANNELS))
+        return vocals_path, presence
+    finally:
+        mix = None
+        os.remove(mix_path)
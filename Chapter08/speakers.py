@@ -0,0 +1,201 @@
+"""
+Speaker registry: recognize recurring speakers across recordings.
+
+While diarizing, NeMo computes a TitaNet embedding for every short subsegment
+of speech and clusters them into speakers. `speaker_centroids` averages the
+embeddings of each speaker found in a recording into one unit vector, and a
+`SpeakerRegistry` keeps named centroids in a flat NumPy index on disk. New
+speakers are matched to the registry by cosine similarity, so a speaker who
+was named once is labelled automatically in every later recording.
+
+Usage:
+  registry = SpeakerRegistry("speaker_registry.npz")
+  speakers, centroids = load_speaker_embeddings("speaker_embeddings.npz")
+  names = registry.match(speakers, centroids)  # e.g. {0: "Matt Frei"}
+  ssm = name_speakers(ssm, names)
+"""
+import json
+import os
+import pickle
+
+import numpy as np
+
+from helpers import SpeakerTurnIndex
+
+
+def normalize(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def load_subsegment_embeddings(speaker_outputs_dir: str, uniq_id: str, scale_index: int = 0):
+    """
+    TitaNet embeddings and times of the subsegments NeMo clustered, for one recording.
+
+    Requires `diarizer.speaker_embeddings.parameters.save_embeddings`. Scale 0
+    has the longest windows and therefore the most reliable embeddings.
+
+    Parameters:
+      speaker_outputs_dir: the `speaker_outputs` directory in the diarizer's `out_dir`
+      uniq_id: name of the audio file without extension
+    Returns:
+      embeddings: float32 array (n_subsegments, dim)
+      start_ms, end_ms: int64 arrays with the subsegment times
+    """
+    name = f"subsegments_scale{scale_index}"
+    with open(os.path.join(speaker_outputs_dir, "embeddings", f"{name}_embeddings.pkl"), "rb") as f:
+        embeddings = pickle.load(f)[uniq_id]
+    embeddings = embeddings.cpu().numpy() if hasattr(embeddings, "cpu") else np.asarray(embeddings)
+
+    offsets, durations = [], []
+    with open(os.path.join(speaker_outputs_dir, f"{name}.json"), "r", encoding="utf-8") as f:
+        for line in f:
+            meta = json.loads(line)
+            meta_id = meta.get("uniq_id") or os.path.splitext(os.path.basename(meta["audio_filepath"]))[0]
+            if meta_id == uniq_id:
+                offsets.append(meta["offset"])
+                durations.append(meta["duration"])
+    if len(offsets) != len(embeddings):
+        raise ValueError(f"{len(embeddings)} embeddings but {len(offsets)} subsegments for {uniq_id}")
+    start = np.asarray(offsets, dtype=np.float64)
+    end = start + np.asarray(durations, dtype=np.float64)
+    return embeddings.astype(np.float32), (start * 1000).astype(np.int64), (end * 1000).astype(np.int64)
+
+
+def speaker_centroids(embeddings, start_ms, end_ms, speaker_turns):
+    """
+    One normalized mean embedding per speaker of the diarization output.
+
+    A subsegment counts for a speaker when its midpoint falls into turns of
+    that speaker only; subsegments in overlapping speech are left out.
+
+    Returns:
+      speakers: int64 array of speaker ids, sorted
+      centroids: float32 array (n_speakers, dim) of unit vectors
+    """
+    index = SpeakerTurnIndex(speaker_turns)
+    owner = np.full(len(embeddings), -1, dtype=np.int64)
+    for i, midpoint in enumerate(((np.asarray(start_ms) + np.asarray(end_ms)) // 2).tolist()):
+        active = index.speakers_at(midpoint)
+        if len(active) == 1:
+            owner[i] = active[0]
+    speakers = np.unique(owner[owner >= 0])
+    embeddings = normalize(embeddings)
+    centroids = np.stack([embeddings[owner == speaker].mean(axis=0) for speaker in speakers]) if len(speakers) else (
+        np.zeros((0, embeddings.shape[1]), dtype=np.float32)
+    )
+    return speakers, normalize(centroids)
+
+
+def save_speaker_embeddings(path: str, speakers, centroids):
+    np.savez(path, speakers=np.asarray(speakers, dtype=np.int64), centroids=np.asarray(centroids, dtype=np.float32))
+
+
+def load_speaker_embeddings(path: str):
+    with np.load(path) as data:
+        return data["speakers"], data["centroids"]
+
+
+class SpeakerRegistry:
+    """
+    Named speaker embeddings in a flat cosine-similarity index, persisted as an `.npz` file.
+
+    Every known speaker is a unit vector, the running mean of the recordings it
+    was enrolled or matched in. A search is one matrix product, which stays in
+    the microseconds for the few thousand speakers of a show archive.
+
+    Parameters:
+      path: registry file, created on the first `save`
+      threshold: minimum cosine similarity for a match
+    """
+
+    def __init__(self, path: str = "speaker_registry.npz", threshold: float = 0.7):
+        self.path = path
+        self.threshold = threshold
+        self.names = []
+        self.embeddings = np.zeros((0, 0), dtype=np.float32)
+        self.counts = np.zeros(0, dtype=np.int64)
+        if os.path.exists(path):
+            with np.load(path) as data:
+                self.names = data["names"].tolist()
+                self.embeddings = data["embeddings"]
+                self.counts = data["counts"]
+
+    def __len__(self):
+        return len(self.names)
+
+    def save(self):
+        # np.savez appends .npz to paths without it, write through a file object instead
+        with open(self.path + ".tmp", "wb") as f:
+            np.savez(f, names=np.array(self.names, dtype=str), embeddings=self.embeddings, counts=self.counts)
+        os.replace(self.path + ".tmp", self.path)
+
+    def enroll(self, name: str, embedding):
+        """
+        Add a named speaker, or fold the embedding into the running mean of an existing one.
+        """
+        embedding = normalize(embedding).reshape(-1)
+        if name in self.names:
+            i = self.names.index(name)
+            count = self.counts[i]
+            self.embeddings[i] = normalize(self.embeddings[i] * count + embedding)
+            self.counts[i] = count + 1
+            return
+        if len(self.names) == 0:
+            self.embeddings = np.zeros((0, len(embedding)), dtype=np.float32)
+        self.names.append(name)
+        self.embeddings = np.vstack([self.embeddings, embedding[None]])
+        self.counts = np.append(self.counts, 1)
+
+    def similarities(self, embeddings):
+        """
+        Cosine similarity of every query embedding to every known speaker, shape (n_queries, n_known).
+        """
+        if len(self.names) == 0:
+            return np.zeros((len(embeddings), 0), dtype=np.float32)
+        return normalize(embeddings) @ self.embeddings.T
+
+    def match(self, speakers, centroids):
+        """
+        Names of the speakers of one recording that resemble known speakers.
+
+        Pairs are assigned greedily from the most similar down, so two speakers
+        of the same recording never get the same name.
+
+        Returns:
+          names: dict of speaker id to name, only for the matched speakers
+        """
+        scores = self.similarities(centroids)
+        names = {}
+        taken = set()
+        for flat in np.argsort(scores, axis=None)[::-1]:
+            row, column = np.unravel_index(flat, scores.shape)
+            if scores[row, column] < self.threshold:
+                break
+            speaker = int(speakers[row])
+            if speaker in names or column in taken:
+                continue
+            names[speaker] = self.names[column]
+            taken.add(column)
+        return names
+
+    def update(self, names: dict, speakers, centroids):
+        """
+        Enroll the named speakers of a recording, e.g. the output of `match` or a manual mapping.
+        """
+        position = {int(speaker): i for i, speaker in enumerate(speakers)}
+        for speaker, name in names.items():
+            if int(speaker) in position:
+                self.enroll(name, centroids[position[int(speaker)]])
+
+
+def name_speakers(sentences_speaker_mapping, names: dict):
+    """
+    Replace the "Speaker <id>" labels of a sentence-speaker mapping with the names known for those ids.
+    """
+    labels = {f"Speaker {speaker}": name for speaker, name in names.items()}
+    return [
+        {**sentence, "speaker": labels.get(sentence["speaker"], sentence["speaker"])}
+        for sentence in sentences_speaker_mapping
+    ]
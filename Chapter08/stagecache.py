@@ -0,0 +1,409 @@
+"""
+Content-addressed stage cache for the diarization pipeline.
+
+Every stage (vocal separation, transcription, alignment, diarization,
+punctuation) is registered with the names of the stages or source files it
+reads and the parameters that affect its output. Its result is stored under
+`<cache_dir>/<stage>/<key>/`, where the key is a SHA-256 over the stage name,
+version, parameters and the content digests of its inputs. Rerunning the
+notebook only executes the stages whose inputs or parameters changed, and a
+stage that reproduces the same content does not invalidate the stages after it.
+
+Branches of the DAG that only meet at the end, such as transcription plus
+alignment and speaker diarization, can be resolved concurrently with
+`run_parallel`, one forked worker process per branch, each on its own device.
+A CUDA context does not survive a fork, so GPUs are counted through NVML and
+the branches run in threads instead once this process has initialized CUDA.
+
+Usage:
+  pipeline = StagePipeline("diarization_cache")
+  pipeline.source("audio", "/content/interview.mp4")
+
+  @pipeline.stage("vocals", inputs=["audio"], params={"model": "htdemucs"})
+  def separate_vocals(out_dir, audio):
+      ...  # write vocals.wav into out_dir
+      return os.path.join(out_dir, "vocals.wav")
+
+  vocal_target = pipeline.run("vocals")
+"""
+import hashlib
+import inspect
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+import traceback
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import wait
+
+RESULT_FILE = "result.json"
+
+Stage = namedtuple("Stage", ["name", "func", "inputs", "params", "version"])
+Artifact = namedtuple("Artifact", ["value", "digest", "key"])
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20):
+    """
+    SHA-256 of a file's content, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def stage_key(name: str, version, params: dict, input_digests: dict):
+    """
+    Cache key of a stage run: its identity, parameters and the digests of its inputs.
+    """
+    payload = json.dumps(
+        {"stage": name, "version": version, "params": params, "inputs": input_digests}, sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()[:24]
+
+
+def gpu_count():
+    """
+    Number of visible GPUs, queried through NVML so that CUDA is not initialized in this process.
+    """
+    try:
+        import pynvml
+
+        pynvml.nvmlInit()
+        try:
+            count = pynvml.nvmlDeviceGetCount()
+        finally:
+            pynvml.nvmlShutdown()
+        visible = os.environ.get("CUDA_VISIBLE_DEVICES")
+        if visible is not None:
+            count = min(count, len([index for index in visible.split(",") if index.strip()]))
+        return count
+    except Exception:
+        pass
+    try:
+        import torch
+    except ImportError:
+        return 0
+    # With this set, torch answers availability and device count from NVML as well
+    os.environ.setdefault("PYTORCH_NVML_BASED_CUDA_CHECK", "1")
+    return torch.cuda.device_count() if torch.cuda.is_available() else 0
+
+
+def cuda_initialized():
+    """
+    Whether this process already holds a CUDA context, which forked children cannot use.
+    """
+    torch = sys.modules.get("torch")
+    return torch is not None and torch.cuda.is_initialized()
+
+
+def split_device(device: str):
+    """
+    Device type and index, e.g. ("cuda", 1) for "cuda:1", the form CTranslate2 expects.
+
+    A device without index, such as "cpu" or a bare "cuda", has index 0.
+    """
+    kind, _, index = device.partition(":")
+    return kind, int(index or 0)
+
+
+def canonical_device(device: str):
+    """
+    "cpu" or "cuda:N", so that "cuda" and "cuda:0" name the same device, e.g. in model pool keys.
+    """
+    kind, index = split_device(device)
+    return kind if kind == "cpu" else f"{kind}:{index}"
+
+
+def assign_devices(targets):
+    """
+    Default device per target: round-robin over the visible GPUs, or the CPU when there are none.
+    """
+    count = gpu_count()
+    if count == 0:
+        return {target: "cpu" for target in targets}
+    return {target: f"cuda:{i % count}" for i, target in enumerate(targets)}
+
+
+def limit_cpu_threads(threads: int):
+    """
+    Cap the intra-op thread pools of the current process, so concurrent workers share the cores.
+    """
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[variable] = str(threads)
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+class StagePipeline:
+    """
+    Runs registered stages on demand and caches their JSON-serializable results on disk.
+
+    A stage function is called as `func(out_dir, **inputs)`, where `out_dir` is
+    the stage's cache directory for files such as WAV or RTTM outputs and
+    `inputs` maps every input name to its value (a path for sources). A stage
+    that also takes a `device` argument receives the device its branch was
+    assigned by `run_parallel`; the device is not part of the cache key. The
+    result must be JSON-serializable. Absolute file paths in a result are hashed
+    by the content of the file they point to, so downstream keys follow the data
+    rather than the location.
+    """
+
+    def __init__(self, cache_dir: str = "stage_cache"):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.sources = {}
+        self.stages = {}
+        self.artifacts = {}
+        self.history = []
+        self._file_digests = {}
+
+    def source(self, name: str, path: str):
+        """
+        Register an input file, identified by its content.
+        """
+        self.sources[name] = os.path.abspath(path)
+        self.artifacts.pop(name, None)
+
+    def stage(self, name: str, inputs=(), params: dict = None, version=1):
+        """
+        Decorator registering `func` as the stage `name`.
+
+        Parameters:
+          name: stage name, also the cache subdirectory
+          inputs: names of sources or previously registered stages passed to `func`
+          params: every setting that changes the output, e.g. model name or language
+          version: bump to invalidate cached results after changing `func` itself
+        """
+        for input_name in inputs:
+            if input_name not in self.sources and input_name not in self.stages:
+                raise ValueError(f"Stage {name} depends on unknown input {input_name}")
+
+        def register(func):
+            self.stages[name] = Stage(name, func, tuple(inputs), dict(params or {}), version)
+            return func
+
+        return register
+
+    def run(self, target: str):
+        """
+        Return the value of `target`, executing it and its inputs only when their cache is stale.
+        """
+        return self._resolve(target).value
+
+    def run_parallel(self, targets, devices: dict = None):
+        """
+        Resolve several independent targets concurrently, one worker process per target.
+
+        Stages needed by more than one target (e.g. the audio both branches
+        read) are resolved first in this process, then every target is resolved
+        with its remaining inputs in a forked worker. A single target has
+        nothing to run alongside, so it is resolved in this process, where the
+        models it loads stay in the caller's model pool. A worker assigned "cuda:N"
+        only sees that GPU, through CUDA_VISIBLE_DEVICES, and its stages receive
+        "cuda:0". Workers on the CPU split the cores between them.
+
+        A forked child cannot use a CUDA context created by its parent, so once
+        this process has initialized CUDA, or where fork is unavailable, the
+        branches run in threads of this process instead. Their stages receive
+        "cuda:N" and the thread's current CUDA device is set to N, for libraries
+        that place tensors on a bare "cuda". Libraries that take the device type
+        and index separately, such as CTranslate2, need `split_device`. Setting
+        PYTORCH_NVML_BASED_CUDA_CHECK=1 before importing torch keeps
+        `torch.cuda.is_available()` from initializing it.
+
+        Parameters:
+          targets: stage names to resolve
+          devices: device per target, e.g. {"word_timestamps": "cuda:0", "rttm": "cuda:1"};
+            defaults to `assign_devices(targets)`
+        Returns:
+          values: dict of target name to value
+        """
+        targets = list(targets)
+        devices = {**assign_devices(targets), **(devices or {})}
+        needed_by = {}
+        for target in targets:
+            for name in self._ancestors(target):
+                needed_by[name] = needed_by.get(name, 0) + 1
+        shared = {name for name, count in needed_by.items() if count > 1}
+        for name in self.stages:
+            if name in shared:
+                self._resolve(name)
+
+        pending = [target for target in targets if target not in shared]
+        if len(pending) == 1:
+            self._resolve(pending[0], devices[pending[0]])
+            return {target: self.artifacts[target].value for target in targets}
+        on_gpu = any(devices[target].startswith("cuda") for target in pending)
+        if "fork" not in multiprocessing.get_all_start_methods() or (on_gpu and cuda_initialized()):
+            if on_gpu and cuda_initialized():
+                logging.info("CUDA is already initialized in this process, running the branches in threads")
+            with ThreadPoolExecutor(max_workers=max(1, len(pending))) as executor:
+                futures = {target: executor.submit(self._thread_worker, target, devices[target]) for target in pending}
+                for future in futures.values():
+                    future.result()
+            return {target: self.artifacts[target].value for target in targets}
+
+        context = multiprocessing.get_context("fork")
+        cpu_workers = sum(1 for target in pending if devices[target] == "cpu")
+        threads = max(1, (os.cpu_count() or 1) // max(1, cpu_workers))
+        workers = {}
+        for target in pending:
+            reader, writer = context.Pipe(duplex=False)
+            process = context.Process(target=self._worker, args=(writer, target, devices[target], threads))
+            process.start()
+            writer.close()
+            workers[reader] = workers[process.sentinel] = (target, reader, process)
+
+        errors = []
+        while workers:
+            for ready in wait(list(workers)):
+                if ready not in workers:
+                    continue
+                target, reader, process = workers[ready]
+                try:
+                    if ready is not reader and not reader.poll():
+                        raise EOFError
+                    status, payload = reader.recv()
+                except EOFError:
+                    # Exited without sending a result (killed, out of memory, ...)
+                    process.join()
+                    status, payload = "error", f"worker exited with code {process.exitcode}"
+                if status == "ok":
+                    artifacts, history = payload
+                    self.artifacts.update(artifacts)
+                    self.history.extend(history)
+                else:
+                    errors.append(f"{target}:\n{payload}")
+                process.join()
+                reader.close()
+                del workers[reader], workers[process.sentinel]
+        if errors:
+            raise RuntimeError("Pipeline branches failed:\n" + "\n".join(errors))
+        return {target: self.artifacts[target].value for target in targets}
+
+    def _thread_worker(self, target: str, device: str):
+        kind, index = split_device(device)
+        if kind == "cuda":
+            # The current device is per thread, so each branch keeps its own GPU
+            import torch
+
+            torch.cuda.set_device(index)
+        return self._resolve(target, canonical_device(device))
+
+    def _worker(self, connection, target: str, device: str, threads: int):
+        try:
+            if device == "cpu":
+                limit_cpu_threads(threads)
+            elif device.startswith("cuda"):
+                _, index = split_device(device)
+                visible = os.environ.get("CUDA_VISIBLE_DEVICES")
+                os.environ["CUDA_VISIBLE_DEVICES"] = visible.split(",")[index] if visible else str(index)
+                device = "cuda:0"
+            history_start = len(self.history)
+            self._resolve(target, device)
+            artifacts = {name: self.artifacts[name] for name in self._ancestors(target)}
+            connection.send(("ok", (artifacts, self.history[history_start:])))
+        except BaseException:
+            connection.send(("error", traceback.format_exc()))
+        finally:
+            connection.close()
+
+    def _ancestors(self, name: str):
+        """
+        Names of the stages `name` depends on, including itself.
+        """
+        if name in self.sources:
+            return set()
+        names = {name}
+        for input_name in self.stages[name].inputs:
+            names |= self._ancestors(input_name)
+        return names
+
+    def invalidate(self, name: str):
+        """
+        Delete every cached result of a stage, e.g. after a transient failure was cached.
+        """
+        self.artifacts.pop(name, None)
+        shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+
+    def report(self):
+        """
+        One line per stage resolution: status, key and seconds spent.
+        """
+        return "\n".join(f"{name:<18} {status:<8} {key}  {seconds:8.2f}s" for name, status, key, seconds in self.history)
+
+    def _source_digest(self, path: str):
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        cached = self._file_digests.get(path)
+        if cached is None or cached[0] != signature:
+            cached = self._file_digests[path] = (signature, file_digest(path))
+        return cached[1]
+
+    def _canonical(self, value):
+        # Replace absolute file paths by their content digest so the cache location does not leak into keys
+        if isinstance(value, str):
+            if os.path.isabs(value) and os.path.isfile(value):
+                return "file:" + self._source_digest(value)
+            return value
+        if isinstance(value, dict):
+            return {str(k): self._canonical(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._canonical(v) for v in value]
+        return value
+
+    def _value_digest(self, value):
+        payload = json.dumps(self._canonical(value), sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _resolve(self, name: str, device: str = None):
+        if name in self.sources:
+            path = self.sources[name]
+            return Artifact(path, "file:" + self._source_digest(path), None)
+        if name not in self.stages:
+            raise KeyError(f"Unknown stage {name}")
+
+        stage = self.stages[name]
+        inputs = {input_name: self._resolve(input_name, device) for input_name in stage.inputs}
+        key = stage_key(name, stage.version, stage.params, {n: a.digest for n, a in inputs.items()})
+        memo = self.artifacts.get(name)
+        if memo is not None and memo.key == key:
+            return memo
+
+        start = time.perf_counter()
+        out_dir = os.path.join(self.cache_dir, name, key)
+        result_path = os.path.join(out_dir, RESULT_FILE)
+        if os.path.isfile(result_path):
+            with open(result_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            status = "cached"
+        else:
+            # A directory without result.json is left over from an interrupted run
+            shutil.rmtree(out_dir, ignore_errors=True)
+            os.makedirs(out_dir)
+            kwargs = {n: a.value for n, a in inputs.items()}
+            if device is not None and "device" in inspect.signature(stage.func).parameters:
+                kwargs["device"] = device
+            value = stage.func(out_dir, **kwargs)
+            text = json.dumps({"value": value, "digest": self._value_digest(value), "params": stage.params})
+            with open(result_path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(result_path + ".tmp", result_path)
+            # Fresh and cached runs hand the same JSON types (lists, not tuples) downstream
+            manifest = json.loads(text)
+            status = "executed"
+
+        seconds = time.perf_counter() - start
+        self.history.append((name, status, key, seconds))
+        logging.info(f"Stage {name} {status} ({key}) in {seconds:.2f}s")
+        artifact = self.artifacts[name] = Artifact(manifest["value"], manifest["digest"], key)
+        return artifact
@@ -0,0 +1,21 @@
+import json
+
+import pytest
+
+from diarconfig import recording_ids, write_manifest
+
+
+def test_recording_ids_reject_duplicate_names():
+    assert recording_ids(["in/a.wav", "in/b.mp3"]) == ["a", "b"]
+    with pytest.raises(ValueError, match="show"):
+        recording_ids(["in/show.mp3", "in/show.wav"])
+
+
+def test_write_manifest_lists_every_recording(tmp_path):
+    manifest_path = str(tmp_path / "data" / "input_manifest.json")
+
+    assert write_manifest(["a.wav", "b.wav"], manifest_path, num_speakers=[2, None]) == ["a", "b"]
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert [line["num_speakers"] for line in lines] == [2, None]
+    assert all(line["audio_filepath"].startswith("/") for line in lines)
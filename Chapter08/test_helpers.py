@@ -0,0 +1,95 @@
+import gc
+import json
+import weakref
+
+import numpy as np
+
+from helpers import fill_missing_timestamps_arrays, filter_missing_timestamps, find_numeral_symbol_tokens
+
+
+def word(text, start=None, end=None):
+    return {"word": text, "start": start, "end": end}
+
+
+def test_long_unaligned_run_spans_the_gap():
+    numbers = [word(str(i)) for i in range(5000)]
+    word_timestamps = [word("from", 0.0, 0.5)] + numbers + [word("to", 9.0, 9.5)]
+
+    result = filter_missing_timestamps(word_timestamps)
+
+    assert [entry["word"] for entry in result] == ["from", " ".join(str(i) for i in range(5000)), "to"]
+    assert (result[1]["start"], result[1]["end"]) == (0.5, 9.0)
+    assert word_timestamps[1] == word("0")  # the input is not modified
+
+
+def test_runs_between_aligned_words_keep_word_index():
+    word_timestamps = [word("a", 0.0, 1.0), word("1"), word("2"), word("b", 2.0, 3.0), word("3"), word("c", 4.0, 5.0)]
+
+    timestamps = fill_missing_timestamps_arrays(word_timestamps)
+
+    assert timestamps.words == ["a", "1 2", "b", "3", "c"]
+    np.testing.assert_array_equal(timestamps.word_index, [0, 1, 3, 4, 5])
+    np.testing.assert_allclose(timestamps.start, [0.0, 1.0, 2.0, 3.0, 4.0])
+    np.testing.assert_allclose(timestamps.end, [1.0, 2.0, 3.0, 4.0, 5.0])
+
+
+def test_leading_and_trailing_runs():
+    word_timestamps = [word("1"), word("2"), word("a", 1.0, 1.5), word("3")]
+
+    result = filter_missing_timestamps(word_timestamps, initial_timestamp=0.2, final_timestamp=4.0)
+
+    assert result == [word("1 2", 0.2, 1.0), word("a", 1.0, 1.5), word("3", 1.5, 4.0)]
+
+
+def test_trailing_single_word_gets_final_timestamp():
+    word_timestamps = [word("a", 1.0, 1.5), word("3")]
+
+    assert filter_missing_timestamps(word_timestamps, final_timestamp=2.0)[-1] == word("3", 1.5, 2.0)
+    # Without a final timestamp the trailing run has zero duration
+    assert filter_missing_timestamps(word_timestamps)[-1] == word("3", 1.5, 1.5)
+
+
+def test_empty_input():
+    assert filter_missing_timestamps([]) == []
+    assert len(fill_missing_timestamps_arrays([])) == 0
+
+
+def test_all_words_unaligned():
+    word_timestamps = [word("1"), word("2"), word("3")]
+
+    assert filter_missing_timestamps(word_timestamps, initial_timestamp=0.5, final_timestamp=3.0) == [
+        word("1 2 3", 0.5, 3.0)
+    ]
+    assert filter_missing_timestamps(word_timestamps, initial_timestamp=None) == [word("1 2 3", 0.0, 0.0)]
+
+
+class FakeTokenizer:
+    def __init__(self, vocab):
+        self.vocab = vocab
+
+    def get_vocab(self):
+        return dict(self.vocab)
+
+
+def test_numeral_symbol_tokens_follow_the_vocabulary(tmp_path):
+    tokenizer = FakeTokenizer({"hello": 0, " 42": 1, "$": 2, "world": 3, "x%": 4})
+    cache_path = str(tmp_path / "tokens.json")
+
+    assert find_numeral_symbol_tokens(tokenizer, cache_path) == [-1, 1, 2, 4]
+    # Another tokenizer object with the same vocabulary, in another order, shares the result
+    same = FakeTokenizer({"x%": 4, "world": 3, "$": 2, " 42": 1, "hello": 0})
+    assert sorted(find_numeral_symbol_tokens(same, cache_path)) == [-1, 1, 2, 4]
+    # A different vocabulary is scanned again, even with the same size, and replaces the stale file
+    other = FakeTokenizer({"a": 0, "b": 1, "c": 2, "d": 3, "7": 4})
+    assert find_numeral_symbol_tokens(other, cache_path) == [-1, 4]
+    with open(cache_path, "r", encoding="utf-8") as f:
+        assert json.load(f)["tokens"] == [-1, 4]
+
+
+def test_numeral_symbol_tokens_memo_does_not_keep_the_tokenizer_alive():
+    tokenizer = FakeTokenizer({"one": 0, "1": 1})
+    assert find_numeral_symbol_tokens(tokenizer) == [-1, 1]
+    reference = weakref.ref(tokenizer)
+    del tokenizer
+    gc.collect()
+    assert reference() is None
@@ -0,0 +1,128 @@
+import threading
+
+import pytest
+
+from modelpool import ModelPool, model_size
+
+
+class FakeTensor:
+    def __init__(self, numel, element_size=4):
+        self._numel = numel
+        self._element_size = element_size
+
+    def numel(self):
+        return self._numel
+
+    def element_size(self):
+        return self._element_size
+
+
+class FakeModule:
+    """
+    Duck-typed stand-in for a torch module.
+    """
+
+    def __init__(self, *parameters, buffers=()):
+        self._parameters = list(parameters)
+        self._buffers = list(buffers)
+
+    def parameters(self):
+        return iter(self._parameters)
+
+    def buffers(self):
+        return iter(self._buffers)
+
+
+class Wrapper:
+    def __init__(self, model):
+        self.model = model
+        self.name = "wrapper"
+
+
+def test_model_size_counts_parameters_and_buffers():
+    shared = FakeTensor(10)
+    module = FakeModule(shared, shared, FakeTensor(5, 2), buffers=[FakeTensor(3)])
+
+    assert model_size(module) == 10 * 4 + 5 * 2 + 3 * 4
+    assert model_size((module, {"language": "en"})) == 62
+    assert model_size(Wrapper(module)) == 62
+    assert model_size({"not": "a model"}) is None
+
+
+def test_get_loads_each_key_once_and_measures_the_model():
+    pool = ModelPool()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return FakeModule(FakeTensor(256))
+
+    model = pool.get("a", loader)
+    assert pool.get("a", loader) is model
+    assert calls == [1]
+    assert pool.memory_used == 1024
+
+
+def test_different_models_load_concurrently():
+    pool = ModelPool()
+    # Each loader only returns once the other one has started
+    barrier = threading.Barrier(2, timeout=5)
+
+    def loader():
+        barrier.wait()
+        return FakeModule(FakeTensor(1))
+
+    threads = [threading.Thread(target=pool.get, args=(key, loader)) for key in ("whisper", "msdd")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not barrier.broken
+    assert set(pool.report()["loaded"]) == {"whisper", "msdd"}
+
+
+def test_same_model_waits_for_the_load_in_progress():
+    pool = ModelPool()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return FakeModule(FakeTensor(1))
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(pool.get("a", loader))) for _ in range(3)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(results) == 3 and all(result is results[0] for result in results)
+
+
+def test_failed_load_is_retried():
+    pool = ModelPool()
+
+    def failing_loader():
+        raise RuntimeError("out of memory")
+
+    with pytest.raises(RuntimeError):
+        pool.get("a", failing_loader)
+    assert pool.get("a", lambda: "model", size_bytes=1) == "model"
+
+
+def test_least_recently_used_model_is_evicted():
+    pool = ModelPool(memory_budget_gb=2048 / 1024**3)
+    pool.get("a", lambda: FakeModule(FakeTensor(256)))
+    pool.get("b", lambda: FakeModule(FakeTensor(256)))
+    pool.get("a", lambda: None)
+    pool.get("c", lambda: FakeModule(FakeTensor(256)))
+
+    assert pool.report()["loaded"] == ["a", "c"]